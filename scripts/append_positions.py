@@ -1,76 +1,71 @@
 #! python3
 import sys, os, argparse, logging, json
+from posdata import load_positions, is_pos_data, write_blocks, BINARY_EXT
+import numpy as np
 
 # Setting up argument parser
 parser = argparse.ArgumentParser(description="Append two position data files together")
 parser.add_argument("file1", help="The first file to be appended")
 parser.add_argument("file2", help="The second file to be appended")
+parser.add_argument("-b", "--binary", action="store_true", help="Save appended position data as binary (.npos), defaults to the format of file1")
 parser.add_argument("-d", "--debug", action="store_true", help="Display debug information")
 args = vars(parser.parse_args())
 
 # Starting logger for status info
 format = "%(levelname)s : %(message)s"
 logging.basicConfig(format=format, level=logging.INFO, datefmt="%H:%M:%S") 
-logging.info("Trimming position data...")
+logging.info("Appending position data...")
 if args.get("debug"):
     logging.getLogger().setLevel(logging.DEBUG)
 logging.debug("ARGS: {0}".format(args)) # DEBUG
 
-# Check that file1 path exists and ends in .json
+# Check that file1 path exists and is a position data file
 if not os.path.exists(args['file1']):
     logging.warning("Given path for file1 does not exist! Exiting...")
     sys.exit(1)
-if not os.path.split(args['file1'])[-1].endswith('.json'):
-    logging.warning("Given path for file1 does not point to a .json file! Exiting...")
+if not is_pos_data(args['file1']):
+    logging.warning("Given path for file1 does not point to a .json, .npos or .nrun file! Exiting...")
     sys.exit(1)
 
-# Check that file2 path exists and ends in .json
+# Check that file2 path exists and is a position data file
 if not os.path.exists(args['file2']):
     logging.warning("Given path for file2 does not exist! Exiting...")
     sys.exit(1)
-if not os.path.split(args['file2'])[-1].endswith('.json'):
-    logging.warning("Given path for file2 does not point to a .json file! Exiting...")
+if not is_pos_data(args['file2']):
+    logging.warning("Given path for file2 does not point to a .json, .npos or .nrun file! Exiting...")
     sys.exit(1)
 
-# Load position data from file1
-file1_objects = []
-file1_canvas = {}
-with open(args['file1']) as fp:
-    data = json.load(fp)
-    file1_objects = data['objects']
-    file1_canvas = data['canvas']
+# Open position data from both files, binary files are memory-mapped and nothing is read yet
+file1 = load_positions(args['file1'])
+file2 = load_positions(args['file2'])
 
-# Load position data from file2
-file2_objects = []
-file2_canvas = {}
-with open(args['file2']) as fp:
-    data = json.load(fp)
-    file2_objects = data['objects']
-    file2_canvas = data['canvas']
-
-# Check that dimensions and units for both file are the same
-if file1_canvas != file2_canvas:
-    logging.warning("Given position files have different dimensions or units! Exiting...")
-    sys.exit(1)
+# Check that dimensions, units and fps for both file are the same
+for key in ('width', 'height', 'units', 'fps'):
+    if file1['canvas'].get(key) != file2['canvas'].get(key):
+        logging.warning("Given position files have different canvas {0} ({1} and {2})! Exiting...".format(key, file1['canvas'].get(key), file2['canvas'].get(key)))
+        sys.exit(1)
 
 # Check that both position data files have the same number of objects
-if len(file1_objects) != len(file2_objects):
+if len(file1.lengths) != len(file2.lengths):
     logging.warning("Given position data files have different number of objects! Exiting...")
     sys.exit(1)
 
-# Append position data files together
-appended_objects = []
-for i in range(len(file1_objects)):
-    new_obj = file1_objects[i]
-    new_obj.extend(file2_objects[i])
-    appended_objects.append(new_obj)
+# Append position data files together, each object is the view of file1 followed by the view of file2. Pixel
+# position data stays in pixels if both files have the same scale, otherwise positions are appended in units
+canvas = file1['canvas']
+if file1.scale is not None and file1.scale == file2.scale:
+    appended_objects = [[file1.raw(i), file2.raw(i)] for i in range(len(file1.lengths))]
+    dtype = np.result_type(file1.positions.dtype, file2.positions.dtype)
+else:
+    appended_objects = [[file1.object(i), file2.object(i)] for i in range(len(file1.lengths))]
+    dtype = np.result_type(file1.positions.dtype, file2.positions.dtype) if file1.scale is None and file2.scale is None else np.float64
+    canvas = { k: v for k, v in canvas.items() if k != 'scale' }
 
-# Write appended position data to "pos_data_appended.json"
-appended_pos_data = { 'canvas': file1_canvas, 'objects': appended_objects }
+# Write appended position data to "pos_data_appended.json" (or .npos/.nrun, as file1), streamed one block at a time
+pos_name = "pos_data_appended" + (BINARY_EXT if args['binary'] else os.path.splitext(args['file1'])[1])
 pos_path = list(os.path.split(args['file1']))
-pos_path[-1] = "pos_data_appended.json"
+pos_path[-1] = pos_name
 pos_path = os.path.relpath(os.path.join(*pos_path))
-with open(pos_path, 'w+') as fp:
-    json.dump(appended_pos_data, fp)
-logging.info("Saved appended position data to 'pos_data_appended.json'")
+write_blocks(pos_path, appended_objects, canvas, dtype)
+logging.info("Saved appended position data to '{0}'".format(pos_name))
 logging.info("Exiting...")
\ No newline at end of file
@@ -0,0 +1,69 @@
+#! python3
+import os, json
+import numpy as np
+import cv2
+
+ARENAS_SUFFIX = ".arenas.json"
+ARENAS_FILENAME = "arenas.json"
+BACKGROUND = 255 # Fill value outside polygon arenas, matches the (white) canvas after thresholding
+
+# --------- UTILITY METHODS ---------
+
+# Returns path of arena sidecar file for a video file or image folder
+def arenas_sidecar(path):
+    if os.path.isdir(path):
+        return os.path.join(path, ARENAS_FILENAME)
+    return os.path.splitext(path)[0] + ARENAS_SUFFIX
+
+# Loads arena definitions from json file, a list of arenas or { "arenas": [...] }
+def load_arenas(path):
+    with open(path) as fp:
+        data = json.load(fp)
+    if isinstance(data, dict):
+        data = data['arenas']
+    arenas = []
+    for i, a in enumerate(data):
+        arenas.append(Arena(a.get('name', str(i)), rect=a.get('rect'), polygon=a.get('polygon'), real_width=a.get('width'), real_height=a.get('height'), units=a.get('units')))
+    names = [a.name for a in arenas]
+    if len(set(names)) != len(names):
+        raise ValueError("Arena names in '{0}' are not unique".format(path))
+    return arenas
+
+# -----------------------------------
+
+# Region of the frame tracked as its own canvas, either a rectangle [x, y, w, h] or a polygon [[x, y], ...]
+class Arena:
+    def __init__(self, name, rect=None, polygon=None, real_width=None, real_height=None, units=None):
+        if rect is None and polygon is None:
+            raise ValueError("Arena '{0}' needs a rect or polygon".format(name))
+        self.name = name
+        self.real_width = real_width
+        self.real_height = real_height
+        self.units = units
+        self.mask = None
+        if polygon is not None:
+            pts = np.array(polygon, np.int32).reshape((-1, 1, 2))
+            # Polygon vertices are edges of the region, like the corners of a rect
+            x, y = pts.min(axis=(0, 1))
+            w, h = pts.max(axis=(0, 1)) - (x, y)
+            x, y, w, h = int(x), int(y), int(w), int(h)
+            self.mask = np.zeros((h, w), np.uint8)
+            cv2.fillPoly(self.mask, [pts - np.array([x, y], np.int32)], 255)
+            self.polygon = pts
+        else:
+            x, y, w, h = [int(v) for v in rect]
+            self.polygon = np.array([[x, y], [x + w, y], [x + w, y + h], [x, y + h]], np.int32).reshape((-1, 1, 2))
+        self.x, self.y, self.w, self.h = x, y, w, h
+
+    # Returns arena region of frame, a view for rectangles and a masked copy for polygons
+    def crop(self, frame):
+        region = frame[self.y:self.y + self.h, self.x:self.x + self.w]
+        if self.mask is None:
+            return region
+        region = region.copy()
+        region[self.mask[:region.shape[0], :region.shape[1]] == 0] = BACKGROUND
+        return region
+
+    # Returns offset of arena in frame
+    def offset(self):
+        return (self.x, self.y)
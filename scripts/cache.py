@@ -0,0 +1,207 @@
+#! python3
+import os, json, hashlib, tempfile
+import numpy as np
+from posdata import file_hash, is_dataset, dataset_source, source_path, load_ahead, add_arrays
+
+CACHE_DIR = "../.cache/results" # Relative to the scripts folder, like the experiments folder
+CACHE_SIZE = 512 * 1024 * 1024 # Bytes kept on disk before least recently used results are evicted
+HASHES_FILE = "hashes.json"
+RESULT_EXT = ".npz"
+LISTS_KEY = "__lists__"
+FILES_KEY = "__files__"
+
+# Accumulated results of the files of one manifest set. Arrays (per-tau sums and counts, histogram counts) are added
+# up over files and lists (events) are joined in manifest order. The contribution of every file is kept, so files
+# can be added or retracted one at a time without going over the others again
+class SetAccumulator:
+    def __init__(self):
+        self.files = {}
+        self.totals = {}
+
+    # Adds result of a file, or of one more segment of it
+    def add(self, key, result):
+        contribution = self.files.setdefault(key, {})
+        for name, value in result.items():
+            if isinstance(value, list):
+                contribution[name] = contribution.get(name, []) + value
+            else:
+                contribution[name] = add_arrays(contribution.get(name), value)
+                self.totals[name] = add_arrays(self.totals.get(name), value)
+
+    # Retracts result of a file. Totals are summed again from the remaining files rather than subtracted, so
+    # rounding errors do not build up over updates
+    def remove(self, key):
+        self.files.pop(key)
+        self.totals = {}
+        for contribution in self.files.values():
+            for name, value in contribution.items():
+                if not isinstance(value, list):
+                    self.totals[name] = add_arrays(self.totals.get(name), value)
+
+    # Returns totals of arrays and lists joined in order of given keys
+    def result(self, keys):
+        result = dict(self.totals)
+        for key in keys:
+            for name, value in self.files[key].items():
+                if isinstance(value, list):
+                    result[name] = result.get(name, []) + value
+        return result
+
+# On-disk cache of results derived from position data, keyed on the content hash of the file they were computed
+# from (and the frame range of a segment), the name of the analysis and its parameters. Results are dicts of arrays
+# or lists, stored as .npz files, and the least recently used ones are evicted once the cache outgrows max_size.
+# Content hashes are remembered by file size and modification time, so unchanged files are not read again
+class ResultCache:
+    def __init__(self, path=CACHE_DIR, max_size=CACHE_SIZE, enabled=True):
+        self.path = path
+        self.max_size = max_size
+        self.enabled = enabled
+        self.hashes = None
+        self.hits = 0
+        self.misses = 0
+
+    # Returns content hash of file, hashing it only if it changed since it was last hashed
+    def hash(self, path):
+        if self.hashes is None:
+            hashes_path = os.path.join(self.path, HASHES_FILE)
+            self.hashes = {}
+            if os.path.exists(hashes_path):
+                with open(hashes_path) as fp:
+                    self.hashes = json.load(fp)
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        known = self.hashes.get(path)
+        if known is not None and known[0] == stat.st_size and known[1] == stat.st_mtime:
+            return known[2]
+        self.hashes[path] = [stat.st_size, stat.st_mtime, file_hash(path)]
+        self.write(HASHES_FILE, lambda fp: fp.write(json.dumps(self.hashes).encode()))
+        return self.hashes[path][2]
+
+    # Returns key of result of analysis with parameters of position data (or a segment of it)
+    def key(self, data, analysis, params):
+        source = data.source_data.source
+        desc = [self.hash(source), data.start, data.frames(), analysis, params]
+        return hashlib.sha1(json.dumps(desc, sort_keys=True).encode()).hexdigest()
+
+    # Returns cached result of analysis with parameters of position data, calling compute and storing what it
+    # returns if there is none
+    def get(self, data, analysis, params, compute):
+        if not self.enabled:
+            return compute()
+        key = self.key(data, analysis, params)
+        result = self.load(key)
+        if result is not None:
+            self.hits += 1
+            return result
+        self.misses += 1
+        result = compute()
+        self.save(key, result)
+        return result
+
+    # Returns key of manifest entry for analysis with parameters from the content hash of its file (and the source
+    # recording of a virtual dataset), so entries can be told apart without loading them
+    def entry_key(self, entry, analysis, params):
+        hashes = [self.hash(entry['path'])]
+        if is_dataset(entry['path']):
+            hashes.append(self.hash(source_path(dataset_source(entry['path']))))
+        return hashlib.sha1(json.dumps([hashes, analysis, params], sort_keys=True).encode()).hexdigest()
+
+    # Returns accumulated results of analysis with parameters of the files of a manifest set (see SetAccumulator).
+    # The accumulator of the set is kept in the cache between runs: files added to the set since the last run are
+    # processed with compute(entry, segment), which returns a dict of arrays and lists, and files no longer in the set
+    # (or changed) are retracted. Files that stayed the same are not read at all. Accumulators are stored by manifest
+    # path and set name, so sets of the same name in different manifests do not share one. With files set, the result
+    # of every entry on its own is returned as well, in order of entries
+    def update_set(self, manifest, entries, analysis, params, compute, files=False):
+        keys = []
+        for f in entries:
+            key = self.entry_key(f, analysis, params) if self.enabled else str(len(keys))
+            # The same file listed twice counts twice
+            while key in keys:
+                key += "+"
+            keys.append(key)
+        name = hashlib.sha1(json.dumps(["set", os.path.abspath(manifest), entries[0]['set'] if len(entries) > 0 else None, analysis, params], sort_keys=True).encode()).hexdigest()
+        acc = self.load_set(name) if self.enabled else None
+        acc = acc if acc is not None else SetAccumulator()
+        removed = [k for k in acc.files if k not in keys]
+        for key in removed:
+            acc.remove(key)
+        added = [i for i, k in enumerate(keys) if k not in acc.files]
+        for j, segment in load_ahead([entries[i]['path'] for i in added]):
+            f = entries[added[j]]
+            acc.add(keys[added[j]], self.get(segment, analysis, params, lambda: compute(f, segment)))
+        if self.enabled and (len(added) > 0 or len(removed) > 0):
+            self.save_set(name, acc)
+        if files:
+            return acc.result(keys), [acc.files[key] for key in keys]
+        return acc.result(keys)
+
+    # Returns accumulator stored under name, or None
+    def load_set(self, name):
+        result = self.load(name)
+        if result is None or FILES_KEY not in result:
+            return None
+        acc = SetAccumulator()
+        for i, file in enumerate(json.loads(str(result[FILES_KEY]))):
+            acc.add(file['key'], { n: result["{0}/{1}".format(i, n)].tolist() if n in file['lists'] else result["{0}/{1}".format(i, n)] for n in file['names'] })
+        return acc
+
+    # Stores contributions of every file of accumulator under name
+    def save_set(self, name, acc):
+        arrays = {}
+        files = []
+        for i, (key, contribution) in enumerate(acc.files.items()):
+            files.append({ 'key': key, 'names': list(contribution.keys()), 'lists': [n for n, v in contribution.items() if isinstance(v, list)] })
+            for n, v in contribution.items():
+                arrays["{0}/{1}".format(i, n)] = np.asarray(v)
+        arrays[FILES_KEY] = np.array(json.dumps(files))
+        self.write(name + RESULT_EXT, lambda fp: np.savez(fp, **arrays))
+        self.evict()
+
+    # Returns result stored under key, or None, marking it as recently used
+    def load(self, key):
+        path = os.path.join(self.path, key + RESULT_EXT)
+        try:
+            with np.load(path) as npz:
+                lists = npz[LISTS_KEY].tolist() if LISTS_KEY in npz.files else []
+                result = { k: npz[k].tolist() if k in lists else npz[k] for k in npz.files if k != LISTS_KEY }
+        except (OSError, ValueError):
+            return None
+        os.utime(path)
+        return result
+
+    # Stores result under key, lists are given back as lists when loaded
+    def save(self, key, result):
+        arrays = { k: np.asarray(v) for k, v in result.items() }
+        arrays[LISTS_KEY] = np.array([k for k, v in result.items() if isinstance(v, list)], dtype=str)
+        self.write(key + RESULT_EXT, lambda fp: np.savez(fp, **arrays))
+        self.evict()
+
+    # Writes file in cache folder through a temporary file, so other processes never read it half written
+    def write(self, name, write):
+        os.makedirs(self.path, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path)
+        with os.fdopen(fd, "wb") as fp:
+            write(fp)
+        os.replace(tmp_path, os.path.join(self.path, name))
+
+    # Removes least recently used results until cache fits in max_size
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.path):
+            if name.endswith(RESULT_EXT):
+                stat = os.stat(os.path.join(self.path, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        size = sum([e[1] for e in entries])
+        for mtime, entry_size, name in sorted(entries):
+            if size <= self.max_size:
+                break
+            os.remove(os.path.join(self.path, name))
+            size -= entry_size
+
+    # Drops every cached result and hash
+    def clear(self):
+        if os.path.isdir(self.path):
+            for name in os.listdir(self.path):
+                os.remove(os.path.join(self.path, name))
+        self.hashes = None
@@ -0,0 +1,133 @@
+#! python3
+import os, json, logging
+import numpy as np
+import cv2
+
+CORNERS_SUFFIX = ".corners.json"
+CORNERS_FILENAME = "corners.json"
+SCALE_SUFFIX = ".scale.json"
+SCALE_FILENAME = "scale.json"
+MIN_ARENA_AREA_PER = 0.1 # Percentage of frame area the detected arena must cover
+APPROX_EPSILON_PER = 0.02 # Percentage of contour perimeter used when approximating arena polygon
+
+# --------- UTILITY METHODS ---------
+
+# Orders coordinate points to top left, bottom left, top right, bottom right
+def order_points(coords, draw=False):
+    sortx = sorted([list(c) for c in coords])
+    left = sortx[:2]
+    right = sortx[2:]
+    tl, bl = sorted(left, key=lambda k: [k[1], k[0]])
+    tr, br = sorted(right, key=lambda k: [k[1], k[0]])
+    if draw:
+        return [tl, tr, br, bl]
+    else:
+        return [tl, bl, tr, br]
+
+# Returns path of corner sidecar file for a video file or image folder
+def corners_sidecar(path):
+    if os.path.isdir(path):
+        return os.path.join(path, CORNERS_FILENAME)
+    return os.path.splitext(path)[0] + CORNERS_SUFFIX
+
+# Loads four corner coordinates from json file, either a bare list or { "corners": [...] }
+def load_corners(path):
+    with open(path) as fp:
+        data = json.load(fp)
+    if isinstance(data, dict):
+        data = data['corners']
+    if len(data) != 4:
+        raise ValueError("Corner file '{0}' does not contain four coordinates".format(path))
+    return order_points([[int(round(c[0])), int(round(c[1]))] for c in data])
+
+# Saves four corner coordinates to json file
+def save_corners(path, coords, source="clicked"):
+    with open(path, "w+") as fp:
+        json.dump({ 'corners': order_points(coords), 'source': source }, fp)
+
+# Returns path of scale sidecar file for a video file or image folder
+def scale_sidecar(path):
+    if os.path.isdir(path):
+        return os.path.join(path, SCALE_FILENAME)
+    return os.path.splitext(path)[0] + SCALE_SUFFIX
+
+# Returns output size in pixels for a canvas of given real dimensions at given pixel density,
+# rounded to even numbers since video encoders drop odd rows/columns
+def output_size(real_width, real_height, pixels_per_unit):
+    return (max(2, 2 * int(round(real_width * pixels_per_unit / 2))), max(2, 2 * int(round(real_height * pixels_per_unit / 2))))
+
+# Saves real canvas dimensions alongside the pixel dimensions they were warped to
+def save_scale(path, real_width, real_height, units, width, height):
+    scale = {
+        'width': real_width,
+        'height': real_height,
+        'units': units,
+        'pixel_width': width,
+        'pixel_height': height,
+        'pixels_per_unit_x': width / real_width,
+        'pixels_per_unit_y': height / real_height
+    }
+    with open(path, "w+") as fp:
+        json.dump(scale, fp)
+
+# Loads canvas scale saved by save_scale
+def load_scale(path):
+    with open(path) as fp:
+        return json.load(fp)
+
+# Finds rectangular canvas in frame as the largest four-sided contour, returns None if nothing is found
+def detect_arena(frame, min_area_per=MIN_ARENA_AREA_PER):
+    height, width = frame.shape[:2]
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if len(frame.shape) == 3 else frame
+    gray = cv2.GaussianBlur(gray, (5, 5), 0)
+    # Canvas is the brightest large region, Otsu picks the split between canvas and surroundings
+    _, threshold = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    contours, _ = cv2.findContours(threshold, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    best = None
+    best_area = min_area_per * width * height
+    for c in contours:
+        area = cv2.contourArea(c)
+        if area < best_area:
+            continue
+        approx = cv2.approxPolyDP(c, APPROX_EPSILON_PER * cv2.arcLength(c, True), True)
+        if len(approx) == 4 and cv2.isContourConvex(approx):
+            best = approx
+            best_area = area
+    if best is None:
+        return None
+    return order_points(best.reshape(4, 2).tolist())
+
+# Reads a single frame from a video, sampled at given fraction of its length
+def sample_frame(path, at=0.5):
+    vs = cv2.VideoCapture(path)
+    frame_total = int(vs.get(cv2.CAP_PROP_FRAME_COUNT))
+    if frame_total > 0:
+        vs.set(cv2.CAP_PROP_POS_FRAMES, int(frame_total * at))
+    ret, frame = vs.read()
+    vs.release()
+    if not ret:
+        return None
+    return frame
+
+# Resolves corners for a source without user input: explicit corner file, then sidecar, then automatic detection
+def resolve_corners(path, frame, corners_path=None, auto=False):
+    if corners_path:
+        logging.info("Using corners from '{0}'".format(corners_path))
+        return load_corners(corners_path)
+    sidecar = corners_sidecar(path)
+    if os.path.exists(sidecar):
+        logging.info("Using corners from '{0}'".format(sidecar))
+        return load_corners(sidecar)
+    if auto and frame is not None:
+        coords = detect_arena(frame)
+        if coords is not None:
+            logging.info("Detected arena corners: {0}".format(coords))
+            save_corners(sidecar, coords, source="detected")
+        return coords
+    return None
+
+# Returns perspective transform matrix mapping given corners onto an output of given size
+def transform_matrix(coords, width, height):
+    image_coords = np.float32([[0, 0], [0, height], [width, 0], [width, height]])
+    transform_coords = np.float32(order_points(coords))
+    return cv2.getPerspectiveTransform(transform_coords, image_coords)
@@ -0,0 +1,271 @@
+#! python3
+import sys, os, argparse, logging, json, re, sqlite3, time, datetime
+from posdata import is_binary, is_runs, is_dataset, json_path, binary_path, load_segments, file_hash
+
+POS_NAME = re.compile(r"^pos_data.*\.(json|npos|nrun)$")
+TRIMMED_NAME = re.compile(r"^pos_data_(\d+)-(\d+)\.(json|npos|nrun)$")
+RECORDING = re.compile(r"(\d{4}-\d{2}-\d{2})/(video\d+)")
+SLOPE_LINE = re.compile(r"^\s*(\d{4}-\d{2}-\d{2})\s*/\s*(video\d+)\s*:.*:\s*(hot|cold)\s*$")
+MANIFEST_DIR = "manifests"
+SIMULATION_DIR = "simulations"
+# Labels of recordings listed in hand-written manifests, for properties that are not in the metadata sheet
+MANIFEST_LABELS = {
+    'paper': ('surface', "paper"),
+    'sandpaper': ('surface', "sandpaper"),
+    'hot-data': ('temperature', "hot"),
+    'cold-data': ('temperature', "cold")
+}
+# Metadata sheet columns by header
+SHEET_COLUMNS = {
+    'Date': 'date',
+    'Video #': 'video',
+    'Unlogged MSD slope': 'slope',
+    'Bean Size (cm)': 'bean_size',
+    'Pre-Recording Temperature (Celsius)': 'pre_temp',
+    'Post-Recording Temperature (Celsius)': 'post_temp',
+    'Alpha (MSD Fit) Values': 'alpha'
+}
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY, recording TEXT, date TEXT, video TEXT, format TEXT, source TEXT, size INTEGER, mtime REAL,
+    hash TEXT, fps REAL, units TEXT, frames INTEGER, objects INTEGER, missing INTEGER, ranges TEXT, trimmed INTEGER,
+    simulated INTEGER
+);
+CREATE INDEX IF NOT EXISTS files_recording ON files (recording);
+CREATE TABLE IF NOT EXISTS metadata (
+    date TEXT, video TEXT, slope REAL, bean_size REAL, pre_temp REAL, post_temp REAL, alpha REAL, temperature TEXT,
+    PRIMARY KEY (date, video)
+);
+CREATE TABLE IF NOT EXISTS labels (recording TEXT, key TEXT, value TEXT, manifest TEXT);
+CREATE INDEX IF NOT EXISTS labels_recording ON labels (recording, key);
+CREATE TABLE IF NOT EXISTS sources (path TEXT PRIMARY KEY, mtime REAL);
+DROP VIEW IF EXISTS recordings;
+CREATE VIEW recordings AS SELECT f.*,
+    m.slope, m.slope / 4 AS diffusion, m.bean_size, m.pre_temp, m.post_temp, m.alpha,
+    COALESCE(m.temperature, (SELECT l.value FROM labels l WHERE l.recording = f.recording AND l.key = 'temperature')) AS temperature,
+    (SELECT l.value FROM labels l WHERE l.recording = f.recording AND l.key = 'surface') AS surface,
+    (f.format = 'dataset' OR NOT EXISTS (SELECT 1 FROM files o WHERE o.recording = f.recording AND (o.format = 'dataset' OR (o.trimmed AND NOT f.trimmed)))) AS valid
+    FROM files f LEFT JOIN metadata m ON m.date = f.date AND m.video = f.video;
+"""
+
+# --------- UTILITY METHODS ---------
+
+# Returns path relative to experiments folder, with forward slashes
+def relative(path, root):
+    return os.path.relpath(os.path.abspath(path), os.path.abspath(root)).replace(os.sep, "/")
+
+# Returns (recording, date, video) of a file from its path relative to the experiments folder
+def recording_of(rel):
+    recording = os.path.dirname(rel)
+    match = RECORDING.search(rel)
+    return (recording, match[1], match[2]) if match else (recording, None, None)
+
+# Returns paths of position data files in experiments folder, skipping manifests. A binary or run-length encoded file
+# next to a json file of the same data is left out, it is read in place of the json file anyway
+def find_files(root):
+    paths = []
+    for dir, dirs, names in os.walk(root):
+        dirs[:] = sorted([d for d in dirs if d != MANIFEST_DIR])
+        names = [n for n in names if POS_NAME.match(n)]
+        for n in sorted(names):
+            if (is_binary(n) or is_runs(n)) and json_path(n) in names:
+                continue
+            if is_runs(n) and binary_path(n) in names:
+                continue
+            paths.append(os.path.join(dir, n))
+    return paths
+
+# Returns row of file properties read from position data file, with paths relative to experiments folder
+def index_file(path, root):
+    rel = relative(path, root)
+    stat = os.stat(path)
+    segments = load_segments(path)
+    data = segments[0]
+    frames = sum([s.frames() for s in segments])
+    missing = sum([int(s.frames() - s.mask().all(axis=0).sum()) for s in segments])
+    # Valid frame ranges of the recording as SEEK-TO, from the dataset or the name of a trimmed file
+    trimmed = TRIMMED_NAME.match(os.path.basename(path))
+    if is_dataset(path):
+        ranges = ["{0}-{1}".format(s.start + 1, s.start + s.frames() + 1) for s in segments]
+    elif trimmed:
+        ranges = ["{0}-{1}".format(trimmed[1], trimmed[2])]
+    else:
+        ranges = ["1-{0}".format(frames + 1)]
+    recording, date, video = recording_of(rel)
+    return {
+        'path': rel,
+        'recording': recording,
+        'date': date,
+        'video': video,
+        'format': "dataset" if is_dataset(path) else os.path.splitext(path)[1][1:],
+        'source': relative(data.source_data.source, root),
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'hash': file_hash(path),
+        'fps': data.canvas.get('fps'),
+        'units': data.canvas.get('units'),
+        'frames': frames,
+        'objects': len(data.lengths),
+        'missing': missing,
+        'ranges': " ".join(ranges),
+        'trimmed': int(trimmed is not None),
+        'simulated': int(rel.split("/")[0] == SIMULATION_DIR)
+    }
+
+# Returns true (and records the new modification time) if source file changed since it was last read
+def source_changed(db, path):
+    mtime = os.path.getmtime(path) if os.path.exists(path) else None
+    row = db.execute("SELECT mtime FROM sources WHERE path = ?", (path,)).fetchone()
+    if row is not None and row[0] == mtime:
+        return False
+    db.execute("INSERT OR REPLACE INTO sources VALUES (?, ?)", (path, mtime))
+    return True
+
+# Reads rows of metadata sheet, dates as YYYY-MM-DD and video names without spaces
+def read_metadata(path):
+    try:
+        import openpyxl
+    except ImportError:
+        logging.warning("openpyxl is not installed, skipping metadata sheet...")
+        return []
+    book = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    rows = list(book.active.iter_rows(values_only=True))
+    book.close()
+    columns = [SHEET_COLUMNS.get(str(h).strip()) for h in rows[0]]
+    metadata = []
+    for row in rows[1:]:
+        entry = { c: v for c, v in zip(columns, row) if c is not None }
+        if entry.get('date') is None or entry.get('video') is None:
+            continue
+        if isinstance(entry['date'], datetime.datetime):
+            entry['date'] = entry['date'].strftime("%Y-%m-%d")
+        entry['video'] = str(entry['video']).strip()
+        metadata.append(entry)
+    return metadata
+
+# Reads hot/cold label of recordings from list of MSD slopes, lines of "DATE / VIDEO : SLOPE : SIZE : hot|cold"
+def read_temperatures(path):
+    temperatures = {}
+    with open(path) as fp:
+        for line in fp:
+            match = SLOPE_LINE.match(line)
+            if match:
+                temperatures[(match[1], match[2])] = match[3]
+    return temperatures
+
+# Updates catalog with new, changed and removed files of the experiments folder and changed metadata sources (metadata
+# sheet and list of MSD slopes). Files are only read again if their size or modification time changed
+def refresh(db, root, metadata_path, slopes_path):
+    start = time.time()
+    known = { r[0]: (r[1], r[2]) for r in db.execute("SELECT path, size, mtime FROM files") }
+    found = set()
+    indexed = 0
+    for path in find_files(root):
+        rel = relative(path, root)
+        found.add(rel)
+        stat = os.stat(path)
+        if known.get(rel) == (stat.st_size, stat.st_mtime):
+            continue
+        try:
+            row = index_file(path, root)
+        except (ValueError, KeyError, OSError) as e:
+            logging.warning("Could not read '{0}' ({1}), skipping...".format(path, e))
+            continue
+        db.execute("INSERT OR REPLACE INTO files ({0}) VALUES ({1})".format(", ".join(row.keys()), ", ".join(["?"] * len(row))), list(row.values()))
+        logging.debug("Indexed '{0}'".format(rel))
+        indexed += 1
+    removed = [p for p in known if p not in found]
+    db.executemany("DELETE FROM files WHERE path = ?", [(p,) for p in removed])
+
+    # Metadata sheet and hot/cold labels, joined to files by date and video
+    changed = [source_changed(db, p) for p in (metadata_path, slopes_path)]
+    if any(changed):
+        metadata = read_metadata(metadata_path) if os.path.exists(metadata_path) else []
+        temperatures = read_temperatures(slopes_path) if os.path.exists(slopes_path) else {}
+        db.execute("DELETE FROM metadata")
+        for m in metadata:
+            m['temperature'] = temperatures.pop((m['date'], m['video']), None)
+        metadata += [{ 'date': d, 'video': v, 'temperature': t } for (d, v), t in temperatures.items()]
+        for m in metadata:
+            db.execute("INSERT OR REPLACE INTO metadata ({0}) VALUES ({1})".format(", ".join(m.keys()), ", ".join(["?"] * len(m))), list(m.values()))
+        logging.info("Loaded metadata of {0} recordings".format(len(metadata)))
+
+    # Labels of recordings in hand-written manifests, paths in manifests are relative to the scripts folder
+    for name, (key, value) in MANIFEST_LABELS.items():
+        path = os.path.join(root, MANIFEST_DIR, name + ".json")
+        if not source_changed(db, path):
+            continue
+        db.execute("DELETE FROM labels WHERE manifest = ?", (name,))
+        if not os.path.exists(path):
+            continue
+        with open(path) as fp:
+            recordings = set([recording_of(relative(f['path'], root))[0] for f in json.load(fp)])
+        db.executemany("INSERT INTO labels VALUES (?, ?, ?, ?)", [(r, key, value, name) for r in recordings])
+    db.commit()
+    logging.info("Indexed {0} files, removed {1} ({2} in catalog, {3:.2f}s)".format(indexed, len(removed), len(found), time.time() - start))
+
+# Opens catalog database at path with its tables created, dropping the catalog first if rebuild is set
+def open_catalog(db_path, rebuild=False):
+    if rebuild and os.path.exists(db_path):
+        os.remove(db_path)
+    db = sqlite3.connect(db_path)
+    db.executescript(SCHEMA)
+    return db
+
+# Returns manifest entries of files matching query, ordered by set and path
+def build_manifest(db, root, query, set_by, tau_limit, all):
+    conditions = [c for c in ["({0})".format(query) if query else None, None if all else "valid"] if c]
+    sql = "SELECT {0} AS set_name, path, fps FROM recordings{1} ORDER BY set_name, path".format(set_by, " WHERE " + " AND ".join(conditions) if conditions else "")
+    logging.debug("SQL: {0}".format(sql))
+    return [{ 'set': str(s), 'path': os.path.join(root, p), 'fps': fps, 'tau_limit': tau_limit } for s, p, fps in db.execute(sql)]
+
+# -----------------------------------
+
+# Setting up argument parser
+parser = argparse.ArgumentParser(description="Index position data files of the experiments folder in a catalog database, and build manifest files from queries of it")
+parser.add_argument("-r", "--root", default="../experiments", help="Path to experiments folder, defaults to ../experiments")
+parser.add_argument("-db", "--database", help="Path to catalog database, defaults to catalog.db in the experiments folder")
+parser.add_argument("-m", "--metadata", default="../misc/experiment-metadata.xlsx", help="Path to experiment metadata sheet, defaults to ../misc/experiment-metadata.xlsx")
+parser.add_argument("-s", "--slopes", default="../misc/msd-size-plot/msd-slopes-unlogged.txt", help="Path to list of MSD slopes with hot/cold labels, defaults to ../misc/msd-size-plot/msd-slopes-unlogged.txt")
+parser.add_argument("-q", "--query", help="SQL condition on the recordings view selecting files for a manifest (i.e., \"temperature = 'hot' AND NOT simulated\")")
+parser.add_argument("-o", "--output", help="Path to save manifest file to, prints it if not given")
+parser.add_argument("-sb", "--set-by", default="recording", help="SQL expression naming the set of each file, defaults to the recording (date/video folder)")
+parser.add_argument("-tl", "--tau-limit", type=float, default=0, help="Tau limit of manifest entries in seconds, defaults to 0 (no limit)")
+parser.add_argument("-a", "--all", action="store_true", help="Include every matching file, not only the ones holding the valid frames of each recording")
+parser.add_argument("-nr", "--no-refresh", action="store_true", help="Query the catalog as it is, without looking for changed files first")
+parser.add_argument("--rebuild", action="store_true", help="Drop the catalog and index every file again")
+parser.add_argument("-d", "--debug", action="store_true", help="Show debug information")
+args = vars(parser.parse_args())
+
+# Setting up logger
+format = "%(levelname)s : %(message)s"
+logging.basicConfig(format=format, level=logging.INFO, datefmt="%H:%M:%S")
+if args.get("debug"):
+    logging.getLogger().setLevel(logging.DEBUG)
+logging.debug("ARGS: {0}".format(args))
+
+# Check that experiments folder exists
+if not os.path.isdir(args['root']):
+    logging.warning("Given experiments folder does not exist! Exiting...")
+    sys.exit(1)
+
+db_path = args['database'] if args['database'] else os.path.join(args['root'], "catalog.db")
+db = open_catalog(db_path, args['rebuild'])
+if not args['no_refresh']:
+    refresh(db, args['root'], args['metadata'], args['slopes'])
+
+if args['query'] is not None or args['output']:
+    start = time.time()
+    try:
+        manifest = build_manifest(db, args['root'], args['query'], args['set_by'], args['tau_limit'], args['all'])
+    except sqlite3.Error as e:
+        logging.warning("Query failed ({0})! Exiting...".format(e))
+        sys.exit(1)
+    logging.info("Found {0} files in {1} sets ({2:.1f}ms)".format(len(manifest), len(set([f['set'] for f in manifest])), (time.time() - start) * 1000))
+    if args['output']:
+        with open(args['output'], "w+") as fp:
+            json.dump(manifest, fp, indent=4)
+        logging.info("Saved manifest to '{0}'.".format(args['output']))
+    else:
+        print(json.dumps(manifest, indent=4))
+db.close()
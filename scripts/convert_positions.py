@@ -0,0 +1,56 @@
+#! python3
+import sys, os, argparse, logging, json, time
+from posdata import BINARY_EXT, JSON_EXT, RUNS_EXT, FIXED_POINT_STEP, PositionData, binary_path, json_path, runs_path, is_binary, is_runs, read_pos_data, read_json_positions, write_positions, write_runs, to_fixed
+
+# Setting up argument parser
+parser = argparse.ArgumentParser(description="Convert position data files between json, binary (.npos) and run-length encoded (.nrun) formats")
+parser.add_argument("path", nargs='+', help="Path to position data files, json files are converted to binary and binary (or run-length encoded) files to json")
+parser.add_argument("-r", "--runs", action="store_true", help="Convert json or binary files to run-length encoded files instead")
+parser.add_argument("-dt", "--dtype", choices=["float32", "float64", "fixed"], default="float64", help="Data type of positions in units in binary files, 'fixed' stores them as integer steps of {0}, defaults to float64. Pixel position data is always stored as integers".format(FIXED_POINT_STEP))
+parser.add_argument("-d", "--debug", action="store_true", help="Show debug information")
+args = vars(parser.parse_args())
+
+# Setting up logger
+format = "%(levelname)s : %(message)s"
+logging.basicConfig(format=format, level=logging.INFO, datefmt="%H:%M:%S")
+if args.get("debug"):
+    logging.getLogger().setLevel(logging.DEBUG)
+logging.debug("ARGS: {0}".format(args))
+
+for path in args['path']:
+    # Check that file at path exists and is a position data file
+    if not os.path.exists(path):
+        logging.warning("Given path '{0}' does not exist! Exiting...".format(path))
+        sys.exit(1)
+    if not path.endswith(JSON_EXT) and not is_binary(path) and not is_runs(path):
+        logging.warning("Given path '{0}' does not point to a {1}, {2} or {3} file! Exiting...".format(path, JSON_EXT, BINARY_EXT, RUNS_EXT))
+        sys.exit(1)
+
+    start = time.time()
+    if args['runs'] and not is_runs(path):
+        # Runs of repeated positions are encoded one object at a time
+        data = PositionData(path)
+        objects = len(data.lengths)
+        out_path = runs_path(path)
+        runs = write_runs(out_path, data)
+        logging.info("Encoded {0} frames as {1} runs".format(sum(data.lengths), runs))
+    elif is_binary(path) or is_runs(path):
+        pos_data = read_pos_data(path)
+        objects = len(pos_data['objects'])
+        out_path = json_path(path)
+        with open(out_path, "w+") as fp:
+            json.dump(pos_data, fp)
+    else:
+        # Parsing json straight into an array, without building lists of floats
+        positions, lengths, canvas = read_json_positions(path, "float64" if args['dtype'] == "fixed" else args['dtype'])
+        objects = len(positions)
+        if args['dtype'] == "fixed" and 'scale' not in canvas:
+            fixed, scale = to_fixed(positions)
+            if fixed is None:
+                logging.warning("'{0}' has negative positions, keeping float64...".format(path))
+            else:
+                positions = fixed
+                canvas = dict(canvas, scale=scale)
+        out_path = binary_path(path)
+        write_positions(out_path, positions, canvas, lengths=lengths)
+    logging.info("Converted '{0}' to '{1}' ({2} objects, {3:.2f}s)".format(path, out_path, objects, time.time() - start))
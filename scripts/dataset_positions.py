@@ -0,0 +1,62 @@
+#! python3
+import sys, os, argparse, logging, re
+from posdata import is_pos_data, is_dataset, parse_range, load_positions, save_dataset, DATASET_SUFFIX
+
+TRIMMED_NAME = re.compile(r"^pos_data_(\d+)-(\d+)\.(json|npos|nrun)$")
+
+# Setting up argument parser
+parser = argparse.ArgumentParser(description="Create a virtual dataset over valid frame ranges of one recording, without copying position data")
+parser.add_argument("path", help="Path to position data file of the whole recording")
+parser.add_argument("-s", "--segments", nargs='+', help="Valid frame ranges as SEEK-TO (i.e., 1-600 750-1750)")
+parser.add_argument("-t", "--trimmed", action="store_true", help="Use frame ranges of trimmed files next to the given file (pos_data_SEEK-TO.json)")
+parser.add_argument("-o", "--output", help="Path to save dataset to, defaults to the given file with a .dataset.json extension")
+parser.add_argument("-d", "--debug", action="store_true", help="Show debug information")
+args = vars(parser.parse_args())
+
+# Setting up logger
+format = "%(levelname)s : %(message)s"
+logging.basicConfig(format=format, level=logging.INFO, datefmt="%H:%M:%S")
+if args.get("debug"):
+    logging.getLogger().setLevel(logging.DEBUG)
+logging.debug("ARGS: {0}".format(args))
+
+# Check that file at path exists and is a position data file
+if not os.path.exists(args['path']):
+    logging.warning("Given path does not exist! Exiting...")
+    sys.exit(1)
+if not is_pos_data(args['path']) or is_dataset(args['path']):
+    logging.warning("Given path does not point to a .json, .npos or .nrun file! Exiting...")
+    sys.exit(1)
+
+# Collect frame ranges, given or from names of trimmed files
+segments = args['segments'] if args['segments'] else []
+if args['trimmed']:
+    for name in os.listdir(os.path.dirname(args['path']) or "."):
+        match = TRIMMED_NAME.match(name)
+        if match and "{0}-{1}".format(match[1], match[2]) not in segments:
+            segments.append("{0}-{1}".format(match[1], match[2]))
+if len(segments) == 0:
+    logging.warning("No frame ranges given or found! Exiting...")
+    sys.exit(1)
+try:
+    segments.sort(key=lambda s: parse_range(s))
+except ValueError:
+    logging.warning("Frame ranges must be given as SEEK-TO! Exiting...")
+    sys.exit(1)
+
+# Check ranges lie within the recording and do not overlap
+frames = load_positions(args['path']).frames()
+last = 0
+for s in segments:
+    start, stop = parse_range(s)
+    if start < 0 or start >= stop or stop > frames:
+        logging.warning("Frame range {0} is outside of the {1} frames of the recording! Exiting...".format(s, frames))
+        sys.exit(1)
+    if start < last:
+        logging.warning("Frame range {0} overlaps the previous range! Exiting...".format(s))
+        sys.exit(1)
+    last = stop
+
+out_path = args['output'] if args['output'] else os.path.splitext(args['path'])[0] + DATASET_SUFFIX
+save_dataset(out_path, args['path'], segments)
+logging.info("Saved dataset of {0} segments ({1}) to '{2}'.".format(len(segments), ", ".join(segments), out_path))
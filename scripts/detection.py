@@ -0,0 +1,131 @@
+#! python3
+import math
+import numpy as np
+import cv2
+
+CENTROID_MAX_RADIUS_PER = 0.05 # Percentage of width two centroids must be within to be combined
+CENTROID_MAX_AREA = 1000000 # Centroids with larger area are ignored
+CENTROID_BORDER_PER = 0.05 # Centroids within this percentage of image borders are ignored
+
+# --------- UTILITY METHODS ---------
+
+# Returns scalar distance between centroid positions
+def centroid_dist(cp1, cp2):
+    return math.sqrt(math.pow(cp1['X'] - cp2['X'], 2) + math.pow(cp1['Y'] - cp2['Y'], 2))
+
+# Returns weighted centroid using area as weight of given centroids
+def centroid_avg(cntrds):
+    w_x = sum([i[0]['X']*i[1] for i in cntrds])
+    w_y = sum([i[0]['Y']*i[1] for i in cntrds])
+    areas = sum([i[1] for i in cntrds])
+    if areas > 0:
+        return ({'X': round(w_x / areas), 'Y': round(w_y / areas)}, areas)
+    else:
+        return ({'X': cntrds[0][0]['X'], 'Y': cntrds[0][0]['Y']}, 0)
+
+# Returns true if c is within factor percent of image borders
+def centroid_border(c, factor, shape):
+    height, width = shape[:2]
+    if c[0]['X'] <= factor*width or c[0]['X'] >= (1 - factor)*width:
+        return True
+    elif c[0]['Y'] <= factor*height or c[0]['Y'] >= (1 - factor)*height:
+        return True
+    return False
+
+# Returns centroids of contours as ({'X', 'Y'}, area), ignoring erroring centroids
+def contour_centroids(contours, offset=(0, 0)):
+    centroids = []
+    for c in contours:
+        M = cv2.moments(c)
+        if M["m00"] != 0: # Ignores erroring centroids, potentially worth tracking those
+            cX = int(M["m10"] / M["m00"]) + offset[0]
+            cY = int(M["m01"] / M["m00"]) + offset[1]
+            centroids.append(({'X': cX, 'Y': cY}, int(M['m00'])))
+    return centroids
+
+# -----------------------------------
+
+# Thresholds grayscale frame and returns centroids and contours of the resulting shapes
+def detect_centroids(framegray, threshold=128):
+    # Apply a threshold filter
+    #ret, threshold = cv2.threshold(framegray, 128, 255, 0)
+    #threshold = cv2.adaptiveThreshold(framegray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY, 11, 2)
+    #ret, threshold = cv2.threshold(framegray, 128, 255, cv2.THRESH_TRUNC+cv2.THRESH_OTSU)
+    ret, thresh = cv2.threshold(framegray, threshold, 255, cv2.THRESH_BINARY)
+    # Find contours using cv2 simple chain approximation
+    contours, hierarchy = cv2.findContours(thresh, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+    centroids = contour_centroids(contours)
+    # Removing first centroid, formed by borders of image
+    return centroids[1:], contours
+
+# Splits frame into a grid of tiles, returns (x0, y0, x1, y1) core regions and overlapping (x0, y0, x1, y1) read regions
+def tile_grid(shape, tiles, overlap):
+    height, width = shape[:2]
+    cols, rows = tiles
+    cores = []
+    regions = []
+    for r in range(rows):
+        for c in range(cols):
+            core = (int(c * width / cols), int(r * height / rows), int((c + 1) * width / cols), int((r + 1) * height / rows))
+            cores.append(core)
+            regions.append((max(0, core[0] - overlap), max(0, core[1] - overlap), min(width, core[2] + overlap), min(height, core[3] + overlap)))
+    return cores, regions
+
+# Detects centroids in one tile, keeping whole shapes whose centroid lies in the tile core
+def detect_tile(framegray, threshold, core, region):
+    x0, y0, x1, y1 = region
+    ret, thresh = cv2.threshold(framegray[y0:y1, x0:x1], threshold, 255, cv2.THRESH_BINARY)
+    contours, hierarchy = cv2.findContours(thresh, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+    centroids = []
+    owned_contours = []
+    for c in contours:
+        # Removing contours cut by tile edges, formed by borders of the tile or owned by a neighbouring tile
+        bx, by, bw, bh = cv2.boundingRect(c)
+        if bx <= 0 or by <= 0 or bx + bw >= x1 - x0 or by + bh >= y1 - y0:
+            continue
+        M = cv2.moments(c)
+        if M["m00"] == 0:
+            continue
+        cX = int(M["m10"] / M["m00"]) + x0
+        cY = int(M["m01"] / M["m00"]) + y0
+        # Keeping only centroids inside the tile core, so shapes in the overlap are counted once
+        if core[0] <= cX < core[2] and core[1] <= cY < core[3]:
+            centroids.append(({'X': cX, 'Y': cY}, int(M['m00'])))
+            owned_contours.append(c + np.array([x0, y0], dtype=c.dtype))
+    return centroids, owned_contours
+
+# Detects centroids by thresholding overlapping tiles of frame on a thread pool (OpenCV releases the GIL).
+# Overlap should be larger than the biggest shape, so every shape is whole in the tile owning its centroid
+def detect_centroids_tiled(framegray, threshold, tiles, overlap, pool):
+    cores, regions = tile_grid(framegray.shape, tiles, overlap)
+    results = pool.map(lambda t : detect_tile(framegray, threshold, t[0], t[1]), zip(cores, regions))
+    centroids = []
+    contours = []
+    for c, cnt in results:
+        centroids.extend(c)
+        contours.extend(cnt)
+    return centroids, contours
+
+# Removes oversized and border centroids, then combines centroids within radius into their area-weighted average
+def filter_centroids(centroids, shape, radius):
+    # Removing centroids over size threshold
+    centroids = [c for c in centroids if c[1] < CENTROID_MAX_AREA]
+
+    # Removing centroids within border of image
+    centroids = [c for c in centroids if not centroid_border(c, CENTROID_BORDER_PER, shape)]
+
+    # Pass over centroids, combine those within set radius into their weighted average centroid
+    filtered_centroids = []
+    while len(centroids) > 0:
+        # Average together all points within radius of selected point, update centroid list to all points not near selected point
+        near = [centroids[0]] + [i for i in centroids[1:] if centroid_dist(centroids[0][0], i[0]) <= radius]
+        centroids = [i for i in centroids[1:] if centroid_dist(centroids[0][0], i[0]) > radius]
+        filtered_centroids.append(centroid_avg(near))
+    return filtered_centroids
+
+# Parses tile grid string, either "N" for N x N tiles or "COLSxROWS"
+def parse_tiles(tstr):
+    parts = tstr.lower().split("x")
+    if len(parts) == 1:
+        return (int(parts[0]), int(parts[0]))
+    return (int(parts[0]), int(parts[1]))
@@ -2,6 +2,7 @@
 import sys, os, argparse, logging, json, math
 import numpy as np
 from matplotlib import pyplot as plt
+from posdata import load_positions, is_pos_data
 
 # --------- UTILITY METHODS --------- 
 
@@ -27,22 +28,21 @@ if args.get("debug"):
     logging.getLogger().setLevel(logging.DEBUG)
 logging.debug("ARGS: {0}".format(args))
 
-# Check that file at path exists and ends in .json
+# Check that file at path exists and is a position data file
 if not os.path.exists(args['path']):
     logging.warning("Given path does not exist! Exiting...")
     sys.exit(1)
-if not os.path.split(args['path'])[-1].endswith('.json'):
-    logging.warning("Given path does not point to a .json file! Exiting...")
+if not is_pos_data(args['path']):
+    logging.warning("Given path does not point to a .json, .npos or .nrun file! Exiting...")
     sys.exit(1)
 
 # Read position data from file
 logging.info("Reading position data...")
 objects = []
 canvas = {}
-with open(args['path']) as fp:
-    data = json.load(fp)
-    objects = data['objects']
-    canvas = data['canvas']
+data = load_positions(args['path'])
+objects = data['objects']
+canvas = data['canvas']
     
 # Calculate activity
 logging.info("Calculating activity...")
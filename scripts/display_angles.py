@@ -3,14 +3,8 @@ import sys, os, argparse, logging, json, math
 from random import random
 from matplotlib import pyplot as plt
 from matplotlib import rcParams as rcp
-
-# --------- UTILITY METHODS --------- 
-
-# Returns distance between points
-def dist(x1, y1, x2, y2):
-    return math.sqrt(math.pow(x2 - x1, 2) + math.pow(y2 - y1, 2))
-
-# -----------------------------------
+import numpy as np
+from posdata import is_pos_data, iter_segments
 
 # Setting up argument parser
 parser = argparse.ArgumentParser(description="Display angular displacement distribution of bean movements")
@@ -27,25 +21,25 @@ if args.get("debug"):
     logging.getLogger().setLevel(logging.DEBUG)
 logging.debug("ARGS: {0}".format(args)) # DEBUG
 
-total_disps = []
-for p_num, path in enumerate(args['path']):
-    
-    # Check that file at path exists and ends in .json
+# Check that every file exists and is a position data file
+for path in args['path']:
     if not os.path.exists(path):
         logging.warning("Given path does not exist! Exiting...")
         sys.exit(1)
-    if not os.path.split(path)[-1].endswith('.json'):
-        logging.warning("Given path does not point to a .json file! Exiting...")
+    if not is_pos_data(path):
+        logging.warning("Given path does not point to a .json, .npos or .nrun file! Exiting...")
         sys.exit(1)
+
+total_disps = []
+# Each segment of a virtual dataset is processed like a separate file
+for p_num, (path, data) in enumerate(iter_segments(args['path'])):
     
     # Loading position data from file
     logging.info("Loading position data for '{0}'...".format(path))
     objects = []
     canvas = {}
-    with open(path) as fp:
-        data = json.load(fp)
-        objects = data['objects']
-        canvas = data['canvas']
+    objects = data['objects']
+    canvas = data['canvas']
     
     # Filtering out specified objects
     obj_i = []
@@ -58,37 +52,29 @@ for p_num, path in enumerate(args['path']):
     logging.info("Calculating angular displacements...")
     obj_disps = []
     for o in obj_i:
-        x = objects[o]['X']
-        y = objects[o]['Y']
-        disps = []
-        for i in range(len(x) - 2):
-            # Calculating lengths of AB, BC, CA
-            a = dist(x[i], y[i], x[i+1], y[i+1])
-            b = dist(x[i+1], y[i+1], x[i+2], y[i+2])
-            c = dist(x[i+2], y[i+2], x[i], y[i])
-
-            if a > 0 and b > 0 and c > 0:
-                # Law of cosines: theta = acos( ( a^2 + b^2 - c^2 ) / ( 2ab ))
-                theta = math.acos(round((a**2 + b**2 - c**2) / (2 * a * b), 4))
-
-                # Checking slopes for displacement changes
-                sab = 0
-                sac = 0
-                # Set defined value for undefined slope
-                if x[i+1] - x[i] != 0:
-                    sab = (y[i+1] - y[i]) / (x[i+1] - x[i])
-                else:
-                    sab = 10000000
-                if x[i+2] - x[i+1] != 0:
-                    sbc = (y[i+2] - y[i+1]) / (x[i+2] - x[i+1])
-                else:
-                    sbc = 10000000
-
-                # If slope change is negative, angle should be reflected
-                if sbc < sab:
-                    theta = (2 * math.pi) - theta
-
-                disps.append(theta)
+        x = np.asarray(objects[o]['X'], dtype=float)
+        y = np.asarray(objects[o]['Y'], dtype=float)
+
+        # Calculating lengths of AB, BC, CA for every three consecutive frames at once
+        a = np.hypot(x[1:-1] - x[:-2], y[1:-1] - y[:-2])
+        b = np.hypot(x[2:] - x[1:-1], y[2:] - y[1:-1])
+        c = np.hypot(x[:-2] - x[2:], y[:-2] - y[2:])
+
+        # Only triangles of known points, comparisons with NaN of missing frames are False
+        valid = (a > 0) & (b > 0) & (c > 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # Law of cosines: theta = acos( ( a^2 + b^2 - c^2 ) / ( 2ab ))
+            theta = np.arccos(np.round((a**2 + b**2 - c**2) / (2 * a * b), 4))
+
+            # Checking slopes for displacement changes, set defined value for undefined slope
+            dx_ab = x[1:-1] - x[:-2]
+            dx_bc = x[2:] - x[1:-1]
+            sab = np.where(dx_ab != 0, (y[1:-1] - y[:-2]) / dx_ab, 10000000)
+            sbc = np.where(dx_bc != 0, (y[2:] - y[1:-1]) / dx_bc, 10000000)
+
+        # If slope change is negative, angle should be reflected
+        theta = np.where(sbc < sab, (2 * math.pi) - theta, theta)
+        disps = theta[valid].tolist()
         obj_disps.append(disps)
     
     for i, o in enumerate(obj_disps):
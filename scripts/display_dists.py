@@ -4,18 +4,12 @@ from random import random
 from matplotlib import pyplot as plt
 from scipy import stats as st
 import numpy as np
+from posdata import is_pos_data, iter_segments
+from events import find_jumps
 
 DEFAULT_THRESHOLD = 0.1
 MINIMUM_DELAY_FRAMES = 1.0
 
-# --------- UTILITY METHODS --------- 
-
-# Returns distance between points
-def dist(x1, y1, x2, y2):
-    return math.sqrt(math.pow(x2 - x1, 2) + math.pow(y2 - y1, 2))
-
-# -----------------------------------
-
 # Setting up argument parser
 parser = argparse.ArgumentParser(description="Display probability distribution of delays between jumps and relative displacement between frames from json position data files")
 parser.add_argument("path", nargs='+', help="Path to file containing position data")
@@ -38,27 +32,26 @@ mdf = MINIMUM_DELAY_FRAMES
 if args['min_delay_frames']:
     mdf = args['min_delay_frames']
 
-total_delays = []
-total_disps = []
-# Iterate through each given path
-for p_num, path in enumerate(args['path']):
-
-    # Check that file at path exists and ends in .json
+# Check that every file exists and is a position data file
+for path in args['path']:
     if not os.path.exists(path):
         logging.warning("Given path does not exist! Exiting...")
         sys.exit(1)
-    if not os.path.split(path)[-1].endswith(".json"):
-        logging.warning("Given path does not point to a .json file! Exiting...")
+    if not is_pos_data(path):
+        logging.warning("Given path does not point to a .json, .npos or .nrun file! Exiting...")
         sys.exit(1)
 
+total_delays = []
+total_disps = []
+# Iterate through each given path, each segment of a virtual dataset is processed like a separate file
+for p_num, (path, data) in enumerate(iter_segments(args['path'])):
+
     # Loading position data from file
     logging.info("Loading position data...")
     objects = []
     canvas = {}
-    with open(path) as fp:
-        data = json.load(fp)
-        objects = data['objects']
-        canvas = data['canvas']
+    objects = data['objects']
+    canvas = data['canvas']
     fps = canvas['fps']
     logging.info("Processing '{0}' at {1} fps...".format(path, canvas['fps']))
 
@@ -77,22 +70,10 @@ for p_num, path in enumerate(args['path']):
     obj_delays = []
     obj_disps = []
     for o in obj_i:
-        x = objects[o]['X']
-        y = objects[o]['Y']
-        d = 1
-        delays = []
-        disps = []
-        for i in range(len(x) - 1):
-            disp = dist(x[i], y[i], x[i+1], y[i+1])
-            if disp < threshold:
-                d += 1
-            else:
-                if d >= int(mdf * fps):
-                    delays.append(d)
-                    disps.append(disp)
-                    d = 1
-        obj_delays.append(delays)
-        obj_disps.append(disps)
+        # Jumps are found from runs of rest, without scanning every frame
+        jumps = find_jumps(data.runs(o), threshold, int(mdf * fps))
+        obj_delays.append(jumps['delay'])
+        obj_disps.append(jumps['disp'])
 
     logging.info("Found {0} delays...".format(max([len(o) for o in obj_delays])))
 
@@ -5,6 +5,8 @@ from matplotlib import pyplot as plt
 from matplotlib import rcParams as rcp
 from scipy import stats as st
 import numpy as np
+from posdata import is_pos_data, iter_manifest
+from events import find_jumps, jump_angles
 
 DEFAULT_THRESHOLD = 0.1
 MINIMUM_DELAY_FRAMES = 1.0
@@ -80,20 +82,20 @@ for set in datasets:
     set_disps = []
     set_ang_disps = []
     for f in set_files:
-        logging.info("    Processing file '{0}'...".format(os.path.split(f['path'])[-1]))
         if not os.path.exists(f['path']):
             logging.warning("Given path does not exist! Exiting...")
             sys.exit(1)
-        if not os.path.split(f['path'])[-1].endswith('.json'):
-            logging.warning("Given path does not point to a .json file! Exiting...")
+        if not is_pos_data(f['path']):
+            logging.warning("Given path does not point to a .json, .npos or .nrun file! Exiting...")
             sys.exit(1)
+    # Each segment of a virtual dataset is processed like a separate file, so delays never span a gap
+    for f, data in iter_manifest(set_files):
+        logging.info("    Processing file '{0}'...".format(os.path.split(f['path'])[-1]))
 
         objects = []
         canvas = {}
-        with open(f['path']) as fp:
-            data = json.load(fp)
-            objects = data['objects']
-            canvas = data['canvas']
+        objects = data['objects']
+        canvas = data['canvas']
         fps = canvas['fps']
         if units is None:
             units = canvas['units']
@@ -103,33 +105,11 @@ for set in datasets:
         threshold = args['threshold']
         if threshold is None:
             threshold = DEFAULT_THRESHOLD
-        delays = []
-        disps = []
-        ang_disps = []
-        x = objects[0]['X']
-        y = objects[0]['Y']
-        last_v = None
-        d = 1
-        for i in range(len(x) - 1):
-            disp = dist(x[i], y[i], x[i+1], y[i+1])
-            if disp < threshold:
-                d += 1
-            else:
-                if d >= int(mdf * fps):
-                    v = [x[i+1] - x[i], y[i+1] - y[i]]
-                    if last_v is None:
-                        last_v = v
-                    else:
-                        # Use dot product to calculate angular disp
-                        theta = math.acos(clamp(np.dot(last_v, v) / (mag(last_v)*mag(v)), -1, 1))
-                        # If dot(last_v, rot90CCW(v)) > 0, change is to the right and theta must be reflected
-                        if (last_v[0] * -v[1] + last_v[1] * v[0]) > 0:
-                            theta = (2 * math.pi) - theta
-                        ang_disps.append(theta)
-                        last_v = v
-                    delays.append(d)
-                    disps.append(disp)
-                    d = 1
+        # Jumps and the angles between them are found from runs of rest, without scanning every frame
+        jumps = find_jumps(data.runs(0), threshold, int(mdf * fps))
+        delays = jumps['delay']
+        disps = jumps['disp']
+        ang_disps = jump_angles(jumps)
         
         '''
         # Calculating angular displacements
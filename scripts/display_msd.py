@@ -3,14 +3,8 @@ import sys, os, argparse, logging, json, math
 import numpy as np
 from random import random
 from matplotlib import pyplot as plt
-
-# --------- UTILITY METHODS --------- 
-
-# Returns distance between points
-def dist(x1, y1, x2, y2):
-    return math.sqrt(math.pow(x2 - x1, 2) + math.pow(y2 - y1, 2))
-
-# -----------------------------------
+from posdata import is_pos_data, iter_segments
+from msd import MSDAccumulator, msd_sums, unit_positions, lag_schedule
 
 # Setting up argument parser
 parser = argparse.ArgumentParser(description="Display mean-squared displacement (MSD) plots from position data files")
@@ -19,6 +13,8 @@ parser.add_argument("-d", "--debug", action="store_true", help="Show debug infor
 parser.add_argument("-tl", "--tau-limit", type=float, help="Limits plots (and fitting) to looking at MSD up to given tau value")
 parser.add_argument("-f", "--fps", type=int, help="FPS value of clip, used to keep tau in seconds scale")
 parser.add_argument("-nl", "--no-log", action="store_true", help="Disables log scaling for graph")
+parser.add_argument("-lp", "--lags-per-decade", type=int, help="Computes MSD at given number of log-spaced tau values per decade instead of every tau")
+parser.add_argument("-lg", "--lags", type=int, nargs='+', help="Computes MSD at given tau values (in frames) only instead of every tau")
 args = vars(parser.parse_args())
 
 # Setting up logger
@@ -29,90 +25,38 @@ if args.get("debug"):
     logging.getLogger().setLevel(logging.DEBUG)
 logging.debug("ARGS: {0}".format(args))
 
-# Calculate MSD data for each object in each file
-objects_msd = []
+# Check that every file exists and is a position data file
 for path in args['path']:
-    # Check that file at path exists and ends in .json
+    # Check that file at path exists and is a position data file
     if not os.path.exists(path):
         logging.warning("Given path does not exist! Exiting...")
         sys.exit(1)
-    if not os.path.split(path)[-1].endswith(".json"):
-        logging.warning("Given path does not point to a .json file! Exiting...")
+    if not is_pos_data(path):
+        logging.warning("Given path does not point to a .json, .npos or .nrun file! Exiting...")
         sys.exit(1)
 
-    objects = []
+# Calculate MSD data for each object in each file, each segment of a virtual dataset is processed like a separate file.
+# Sums and counts of squared displacements per tau are added up file by file
+msd_acc = MSDAccumulator()
+for path, data in iter_segments(args['path']):
     canvas = {}
     # Read position data from file
     logging.info("Reading position data from '{0}'...".format(os.path.split(path)[-1]))
-    with open(path) as fp:
-        data = json.load(fp)
-        objects = data['objects']
-        canvas = data['canvas']
+    canvas = data['canvas']
 
     logging.info("Calculating squared displacements from '{0}'".format(os.path.split(path)[-1]))
 
-    # Calculate squared displacements
-    for i, obj in enumerate(objects):
-        if len(objects_msd) < (i + 1):
-            # 'New' object
-            o = { 'tau': [], 'msd': [] }
-            tau = range(1, int(len(obj['X']) / 2))
-            for t in tau:
-                # Pull out X and Y coordinate lists
-                tau_x = obj['X']
-                tau_y = obj['Y']
-
-                # Calculate distance between points apart by interval tau, then square displacement
-                tau_dist = [dist(tau_x[i], tau_y[i], tau_x[i+t], tau_y[i+t]) for i in range(len(tau_x) - t)]
-                tau_dist = [math.pow(i, 2) for i in tau_dist]
-
-                # Average the displacement of those intervals
-                #msd = sum(tau_dist) / len(tau_dist)
-                msd = tau_dist
+    # Sum squared displacements between known points apart by interval tau (every tau, or the given schedule), for all
+    # objects at once. Each object only looks at tau up to half its own length
+    sums, counts = msd_sums(unit_positions(data), lag_schedule(data.frames(), args['lags_per_decade'], args['lags']))
+    msd_acc.add(sums, counts, [int(n / 2) for n in data.lengths])
 
-                # Add to object's tau and msd list
-                o['tau'].append(t)
-                o['msd'].append(msd)
-            objects_msd.append(o)
-        else:
-            # Object seen in previous file
-            o = objects_msd[i]
-            tau = range(1, int(len(obj['X']) / 2))
-            for t in tau:
-                # Pull out X and Y coordinate lists
-                tau_x = obj['X']
-                tau_y = obj['Y']
-
-                # Calculate distance between points apart by interval tau, then square displacement
-                tau_dist = [dist(tau_x[i], tau_y[i], tau_x[i+t], tau_y[i+t]) for i in range(len(tau_x) - t)]
-                tau_dist = [math.pow(i, 2) for i in tau_dist]
-
-                # Average the displacement of those intervals
-                #msd = sum(tau_dist) / len(tau_dist)
-                msd = tau_dist
-
-                # Add to object's tau and msd list
-                o['tau'].append(t)
-                o['msd'].append(msd)
-            objects_msd[i] = o
-        
-
-# Merge tau entries for each object
+# Convert sums to MSD for each object
 logging.info("Merging squared displacements into MSD...")
-for obj in objects_msd:
-    tau = []
-    msd = []
-    for t in range(1, max(obj['tau'])):
-        sd = []
-        for i, u in enumerate(obj['tau']):
-            if t == u:
-               sd.extend(obj['msd'][i]) 
-        if len(sd) > 0:
-            msd_val = sum(sd) / len(sd)
-            tau.append(t)
-            msd.append(msd_val)
-    obj['tau'] = tau
-    obj['msd'] = msd
+objects_msd = []
+for i in range(msd_acc.objects()):
+    tau, msd = msd_acc.msd(i)
+    objects_msd.append({ 'tau': tau, 'msd': msd })
 
 # Set up plots
 logging.info("Setting up plots...")
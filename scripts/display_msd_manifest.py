@@ -5,13 +5,16 @@ from random import random
 from matplotlib import pyplot as plt
 from matplotlib import rcParams as rcp
 from scipy import stats
+from msd import file_msd, ensemble_msd, object_msds
+from cache import ResultCache
 
+# --------- UTILITY METHODS ---------
 
-# --------- UTILITY METHODS --------- 
-
-# Returns distance between points
-def dist(x1, y1, x2, y2):
-    return math.sqrt(math.pow(x2 - x1, 2) + math.pow(y2 - y1, 2))
+# Returns tau (in seconds) and MSD of an object within the tau limit of its set
+def limit_tau(set, obj):
+    tau = [t * (1 / set['fps']) for t in obj['tau']]
+    keep = [k for k in range(len(tau)) if set['tau_limit'] <= 0 or tau[k] <= set['tau_limit']]
+    return [tau[k] for k in keep], [obj['msd'][k] for k in keep]
 
 # -----------------------------------
 
@@ -20,6 +23,9 @@ parser = argparse.ArgumentParser(description="Display mean-squared displacement
 parser.add_argument("path", help="Path to manifest file, contains paths to data files and properties associated")
 parser.add_argument("-ns", "--no-scatter", action='store_true', help="Disables showing scatter plots")
 parser.add_argument("-l", "--legend", action='store_true', help='Show legend on resulting plot')
+parser.add_argument("-nc", "--no-cache", action="store_true", help="Recompute results of every file instead of reading them from the cache of earlier runs")
+parser.add_argument("-lp", "--lags-per-decade", type=int, help="Computes MSD at given number of log-spaced tau values per decade instead of every tau")
+parser.add_argument("-lg", "--lags", type=int, nargs='+', help="Computes MSD at given tau values (in frames) only instead of every tau")
 parser.add_argument("-d", "--debug", action="store_true", help="Show debug information")
 args = vars(parser.parse_args())
 
@@ -49,6 +55,11 @@ datasets.sort()
 logging.debug("Datasets: {0}".format(datasets))
 logging.debug("Number of datasets: {0}".format(len(datasets)))
 
+cache = ResultCache(enabled=not args['no_cache'])
+
+# Lags are part of the parameters, so results of every lag schedule are cached apart
+msd_params = { 'objects': 'all', 'per_decade': args['lags_per_decade'], 'lags': args['lags'] }
+
 sets_msd = []
 for set in datasets:
     logging.info("Processing set '{0}'...".format(set))
@@ -58,40 +69,15 @@ for set in datasets:
     fps = set_files[0]['fps']
     tau_lim = set_files[0]['tau_limit']
 
-    # Calculate squared displacements
-    set_msd = { 'set': set, 'fps': fps, 'tau_limit': tau_lim, 'tau': [], 'msd': [] }
-    for f in set_files:
-        logging.info("    Processing file '{0}'...".format(os.path.split(f['path'])[-1]))
-        set_data = {}
-        with open(f['path']) as fp:
-            set_data = json.load(fp)
-        tau = range(1, int(len(set_data['objects'][0]['X']) / 2))
-        for t in tau:
-            # Pull out X and Y coordinate lists
-            tau_x = set_data['objects'][0]['X']
-            tau_y = set_data['objects'][0]['Y']
-
-            # Calculate distance between points apart by interval tau, then square displacement
-            tau_dist = [dist(tau_x[i], tau_y[i], tau_x[i+t], tau_y[i+t]) for i in range(len(tau_x) - t)]
-            tau_dist = [i**2 for i in tau_dist]
-
-            set_msd['tau'].append(t)
-            set_msd['msd'].append(tau_dist)
-
-    # Merge squared displacements and convert to mean squared displacement
-    tau = []
-    msd = []
-    for t in range(1, max(set_msd['tau'])):
-        sd = []
-        for i, u in enumerate(set_msd['tau']):
-            if t == u:
-                sd.extend(set_msd['msd'][i])
-        if len(sd) > 0:
-            msd_val = sum(sd) / len(sd)
-            tau.append(t)
-            msd.append(msd_val)
-    set_msd['tau'] = tau
-    set_msd['msd'] = msd
+    # Calculate sums and counts of squared displacements. Sums of the set are kept between runs, so only files
+    # added to (or removed from) the set since are processed
+    set_msd = { 'set': set, 'fps': fps, 'tau_limit': tau_lim, 'tau': [], 'msd': [], 'objects': [] }
+    sums, file_sums = cache.update_set(args['path'], set_files, "msd", msd_params, lambda f, data: file_msd(f, data, args['lags_per_decade'], args['lags']), files=True)
+
+    # Convert sums and counts of squared displacements to mean squared displacement of the ensemble of all objects of
+    # the set, and of every object of every file on its own
+    set_msd['tau'], set_msd['msd'] = ensemble_msd(sums['sums'], sums['counts'])
+    set_msd['objects'] = object_msds(set_files, file_sums)
 
     sets_msd.append(set_msd)
 
@@ -156,6 +142,13 @@ with plt.style.context('science'):
         res = stats.linregress(log_lim_tau, log_lim_msd)
         fit_line = np.poly1d([res.slope, res.intercept])
         print(f'{set["set"]} : {res.slope}')
+
+        # Report slope of every object next to the slope of the ensemble
+        for obj in set['objects']:
+            obj_tau, obj_msd = limit_tau(set, obj)
+            if len(obj_tau) > 1:
+                obj_res = stats.linregress(np.log10(obj_tau), np.log10(obj_msd))
+                print(f'{set["set"]} {os.path.split(obj["path"])[-1]} object {obj["object"]} : {obj_res.slope}')
         msd_slopes.append(res.slope)
         msd_errs.append(res.stderr)
         plt.plot(np.power(10, log_lim_tau), np.power(10, fit_line(log_lim_tau)), line_type, label='{0} : Slope {1:.2f}'.format(set['set'], res.slope), color=color)
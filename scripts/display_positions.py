@@ -8,6 +8,8 @@ from random import random
 from random import uniform
 import math
 import pickle
+from posdata import load_positions, is_pos_data
+from msd import unit_positions
 
 # Setting up argument parser
 parser = argparse.ArgumentParser(description="Display position from json position data files")
@@ -24,30 +26,19 @@ if args.get("debug"):
     logging.getLogger().setLevel(logging.DEBUG)
 logging.debug("ARGS: {0}".format(args))
 
-# Check that file at path exists and ends in .json
+# Check that file at path exists and is a position data file
 if not os.path.exists(args["path"]):
     logging.warning("Given path does not exist! Exiting...")
     sys.exit(1)
-if not os.path.split(args["path"])[-1].endswith(".json"):
-    logging.warning("Given path does not point to a .json file! Exiting...")
+if not is_pos_data(args["path"]):
+    logging.warning("Given path does not point to a .json, .npos or .nrun file! Exiting...")
     sys.exit(1)
 
-# Read position data from file, move into correct format to display frames
-frames = []
+# Read position data from file as one objects x frames x 2 array in units, NaN where an object is missing
 canvas = {}
-with open(args['path']) as fp:
-    data = json.load(fp)
-    objects = data['objects']
-    canvas = data['canvas']
-    frames = [{ 'X': [], 'Y': [] } for i in range(len(objects[0]['X']))]
-    for obj in objects:
-        for frame in range(len(min([obj['X'], obj['Y']]))):
-            frames[frame]['X'].append(obj['X'][frame])
-            frames[frame]['Y'].append(obj['Y'][frame])
-
-# Adding frame number to frames
-for i in range(len(frames)):
-    frames[i]["number"] = i + 1
+data = load_positions(args['path'])
+canvas = data['canvas']
+positions = unit_positions(data)
 
 # Setting up plots
 #rcp.update({'font.size': 20})
@@ -62,19 +53,18 @@ if args.get("cumulative"):
     #color = (random(), random(), random())
     #color = (uniform(0.0, 0.5), uniform(0.0, 0.5), uniform(0.0, 0.5))
     color = (0, 0, 0)
-    for i in range(len(frames) - 1):
-        logging.info("Loading position frame {0}...".format(i))
-        for o in range(len(frames[i]['X'])):
-            plt.plot([frames[i]['X'][o], frames[i + 1]['X'][o]], [frames[i]['Y'][o], frames[i+1]['Y'][o]], color=color)
+    # Lines are broken where an object is missing
+    for o in range(len(positions)):
+        logging.info("Loading positions of object {0}...".format(o))
+        plt.plot(positions[o, :, 0], positions[o, :, 1], color=color)
 
-    # Move x and y limits
+    # Move x and y limits around first object, ignoring missing frames
     logging.info("Calculating x and y limits...")
-    x_pos = [f['X'][0] for f in frames]
-    y_pos = [f['Y'][0] for f in frames]
-    dist_pos = [math.sqrt(x_pos[i]**2 + y_pos[i]**2) for i in range(len(x_pos))]
-    dist_stdev = np.std(dist_pos) * 2
-    ax.set_xlim(min(x_pos) - dist_stdev, max(x_pos) + dist_stdev)
-    ax.set_ylim(max(y_pos) + dist_stdev, min(y_pos) - dist_stdev)
+    x_pos = positions[0, :, 0]
+    y_pos = positions[0, :, 1]
+    dist_stdev = np.nanstd(np.hypot(x_pos, y_pos)) * 2
+    ax.set_xlim(np.nanmin(x_pos) - dist_stdev, np.nanmax(x_pos) + dist_stdev)
+    ax.set_ylim(np.nanmax(y_pos) + dist_stdev, np.nanmin(y_pos) - dist_stdev)
     #ax.set_xlim(0, 27.94)
     #ax.set_ylim(21.59, 0)
 
@@ -92,10 +82,10 @@ else:
     plot = plt.scatter([], [])
     logging.info("Setting up animation...")
     def update_anim(i):
-        plot.set_offsets(np.array((i['X'], i['Y'])).T)
-        ax.set_title("Jumping Bean Coordinates ({1}), Frame {0}".format(i["number"], canvas['units']))
+        plot.set_offsets(positions[:, i])
+        ax.set_title("Jumping Bean Coordinates ({1}), Frame {0}".format(i + 1, canvas['units']))
         return plot
-    anim = animation.FuncAnimation(fig, update_anim, frames=frames)
+    anim = animation.FuncAnimation(fig, update_anim, frames=positions.shape[1])
 
     plt.show()
 
@@ -0,0 +1,72 @@
+#! python3
+import math
+import numpy as np
+
+# --------- UTILITY METHODS ---------
+
+# Finds jumps of an object from its runs of repeated positions ({ 'start', 'length', 'X', 'Y' }, see PositionData.runs).
+# Frames inside a run did not move, so only the steps between runs are looked at: a step of at least threshold after
+# at least min_frames frames of rest is a jump, and a missing frame ends the rest so delays never span it.
+# Returns lists of the 'delay' (frames) before each jump, its 'disp', the 'frame' it starts from, its 'dx'/'dy', and
+# 'gap' if a frame was missing since the last jump
+def find_jumps(runs, threshold, min_frames):
+    lengths = np.asarray(runs['length'])
+    starts = np.asarray(runs['start'])
+    x = np.asarray(runs['X'], dtype=float)
+    y = np.asarray(runs['Y'], dtype=float)
+    if threshold <= 0:
+        # Steps of zero inside runs count as jumps too, so every frame is looked at
+        x = np.repeat(x, lengths)
+        y = np.repeat(y, lengths)
+        starts = np.arange(len(x)) + (starts[0] if len(starts) > 0 else 0)
+        lengths = np.ones(len(x), dtype=np.int64)
+    dx = np.diff(x)
+    dy = np.diff(y)
+    steps = np.hypot(dx, dy)
+    missing = np.isnan(x)
+
+    jumps = { 'delay': [], 'disp': [], 'frame': [], 'dx': [], 'dy': [], 'gap': [] }
+    d = 1
+    gap = False
+    for k in range(len(lengths)):
+        # Steps inside a run are zero, or missing for a run of missing frames
+        if lengths[k] > 1:
+            if missing[k]:
+                d = 1
+                gap = True
+            else:
+                d += int(lengths[k]) - 1
+        if k == len(lengths) - 1:
+            break
+        step = steps[k]
+        if np.isnan(step):
+            d = 1
+            gap = True
+        elif step < threshold:
+            d += 1
+        elif d >= min_frames:
+            jumps['delay'].append(d)
+            jumps['disp'].append(float(step))
+            jumps['frame'].append(int(starts[k + 1]) - 1)
+            jumps['dx'].append(float(dx[k]))
+            jumps['dy'].append(float(dy[k]))
+            jumps['gap'].append(gap)
+            d = 1
+            gap = False
+    return jumps
+
+# Returns angular displacements (0 to 2 pi) between consecutive jumps found by find_jumps, using the dot product of
+# their vectors. Turns to the right are reflected, and jumps after a missing frame have no angle to the one before
+def jump_angles(jumps):
+    dx = np.array(jumps['dx'], dtype=float)
+    dy = np.array(jumps['dy'], dtype=float)
+    if len(dx) < 2:
+        return []
+    ax, ay, bx, by = dx[:-1], dy[:-1], dx[1:], dy[1:]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        theta = np.arccos(np.clip((ax * bx + ay * by) / (np.hypot(ax, ay) * np.hypot(bx, by)), -1, 1))
+    # If dot(last_v, rot90CCW(v)) > 0, change is to the right and theta must be reflected
+    theta = np.where((ax * -by + ay * bx) > 0, (2 * math.pi) - theta, theta)
+    return theta[~np.array(jumps['gap'][1:], dtype=bool)].tolist()
+
+# -----------------------------------
@@ -5,6 +5,9 @@ import json
 from random import random
 import numpy as np
 from scipy import stats
+from posdata import load_positions
+from msd import file_msd, ensemble_msd
+from cache import ResultCache
 
 
 # ---------------------------------- POSITIONS ----------------------------------
@@ -14,27 +17,26 @@ pos_path = "../experiments/fig-test/pos_data_8000-8600.json"
 # Read position data from file, move into correct format to display frames
 frames = []
 canvas = {}
-with open(pos_path) as fp:
-    data = json.load(fp)
-    objects = data['objects']
-    canvas = data['canvas']
-    frames = [{ 'X': [], 'Y': [] } for i in range(len(objects[0]['X']))]
-    for obj in objects:
-        for frame in range(len(min([obj['X'], obj['Y']]))):
-            frames[frame]['X'].append(obj['X'][frame])
-            frames[frame]['Y'].append(obj['Y'][frame])
+data = load_positions(pos_path)
+objects = data['objects']
+canvas = data['canvas']
+frames = [{ 'X': [], 'Y': [] } for i in range(len(objects[0]['X']))]
+for obj in objects:
+    for frame in range(min(len(obj['X']), len(obj['Y']))):
+        frames[frame]['X'].append(obj['X'][frame])
+        frames[frame]['Y'].append(obj['Y'][frame])
 
 # Adding frame number to frames
 for i in range(len(frames)):
     frames[i]["number"] = i + 1
 
-# ---------------------------------- MSD ----------------------------------
+cache = ResultCache()
 
-# Returns distance between points
-def dist(x1, y1, x2, y2):
-    return math.sqrt(math.pow(x2 - x1, 2) + math.pow(y2 - y1, 2))
+# ---------------------------------- MSD ----------------------------------
 
 msd_path = "../experiments/manifests/simulations-ang-fixed.json"
+msd_lags_per_decade = None # Log-spaced tau values per decade to compute MSD at, every tau if None
+msd_params = { 'objects': 'all', 'per_decade': msd_lags_per_decade, 'lags': None }
 
 manifest = []
 with open(msd_path) as fp:
@@ -50,40 +52,13 @@ for set in datasets:
     fps = set_files[0]['fps']
     tau_lim = set_files[0]['tau_limit']
 
-    # Calculate squared displacements
+    # Calculate sums and counts of squared displacements. Sums of the set are kept between runs, so only files
+    # added to (or removed from) the set since are processed
     set_msd = { 'set': set, 'fps': fps, 'tau_limit': tau_lim, 'tau': [], 'msd': [] }
-    for f in set_files:
-        print("    Processing file '{0}'...".format(os.path.split(f['path'])[-1]))
-        set_data = {}
-        with open(f['path']) as fp:
-            set_data = json.load(fp)
-        tau = range(1, int(len(set_data['objects'][0]['X']) / 2))
-        for t in tau:
-            # Pull out X and Y coordinate lists
-            tau_x = set_data['objects'][0]['X']
-            tau_y = set_data['objects'][0]['Y']
-
-            # Calculate distance between points apart by interval tau, then square displacement
-            tau_dist = [dist(tau_x[i], tau_y[i], tau_x[i+t], tau_y[i+t]) for i in range(len(tau_x) - t)]
-            tau_dist = [i**2 for i in tau_dist]
-
-            set_msd['tau'].append(t)
-            set_msd['msd'].append(tau_dist)
-
-    # Merge squared displacements and convert to mean squared displacement
-    tau = []
-    msd = []
-    for t in range(1, max(set_msd['tau'])):
-        sd = []
-        for i, u in enumerate(set_msd['tau']):
-            if t == u:
-                sd.extend(set_msd['msd'][i])
-        if len(sd) > 0:
-            msd_val = sum(sd) / len(sd)
-            tau.append(t)
-            msd.append(msd_val)
-    set_msd['tau'] = tau
-    set_msd['msd'] = msd
+    sums = cache.update_set(msd_path, set_files, "msd", msd_params, lambda f, data: file_msd(f, data, msd_lags_per_decade))
+
+    # Convert sums and counts of squared displacements to mean squared displacement of the ensemble of all objects
+    set_msd['tau'], set_msd['msd'] = ensemble_msd(sums['sums'], sums['counts'])
 
     sets_msd.append(set_msd)
 
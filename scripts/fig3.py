@@ -5,6 +5,9 @@ from matplotlib import pyplot as plt
 from matplotlib import rcParams as rcp
 from scipy import stats as st
 import numpy as np
+from posdata import is_pos_data
+from events import find_jumps, jump_angles
+from cache import ResultCache
 
 DEFAULT_THRESHOLD = 0.1
 MINIMUM_DELAY_FRAMES = 1.0
@@ -23,6 +26,27 @@ def mag(x):
 def clamp(n, min_val, max_val):
     return max(min(n, max_val), min_val)
 
+# Returns delays (in seconds), displacements and angular displacements between jumps of the first object of a file,
+# and its units. A jump is a step of at least threshold after at least mdf * fps frames of rest
+def file_events(f, data, threshold, mdf):
+    logging.info("    Processing file '{0}'...".format(os.path.split(f['path'])[-1]))
+    canvas = data['canvas']
+    fps = canvas['fps']
+
+    # Calculating delays and associated displacements
+    logging.info("    Calculating delays & displacements...")
+    # Jumps and the angles between them are found from runs of rest, without scanning every frame
+    jumps = find_jumps(data.runs(0), threshold, int(mdf * fps))
+    delays = jumps['delay']
+    disps = jumps['disp']
+    ang_disps = jump_angles(jumps)
+
+    logging.info("    Found {} delays, {} displacements, and {} angular displacements.".format(len(delays), len(disps), len(ang_disps)))
+
+    # Convert all delays into seconds so clips w/ varying FPS values can be compared
+    delays = [int(d / fps) for d in delays]
+    return { 'delay': delays, 'disp': disps, 'angle': ang_disps, 'units': [canvas['units']] }
+
 # -----------------------------------
 
 # Setting up argument parser
@@ -32,6 +56,7 @@ parser.add_argument("-t", "--threshold", type=float, help="Threshold of activity
 parser.add_argument("-mdf", "--min-delay-frames", type=float, help="Coefficient for minimum threshold for number of frames between delays to be plotted, usually 1.0, so minimum delay frames is 1.0 * CLIP_FPS")
 parser.add_argument("-g", "--gen-individual", action="store_true", help="Generate individual delay and displacement plots for each dataset, saved in separate folders")
 parser.add_argument("-hd", "--hardcoded-dist", action="store_true", help="Use the hard-coded distribution for delay/displacement")
+parser.add_argument("-nc", "--no-cache", action="store_true", help="Recompute results of every file instead of reading them from the cache of earlier runs")
 parser.add_argument("-d", "--debug", action="store_true", help="Show debug information")
 args = vars(parser.parse_args())
 
@@ -62,6 +87,12 @@ datasets = list(set([f['set'] for f in manifest]))
 datasets.sort()
 logging.debug("Datasets: {0}".format(datasets))
 
+threshold = args['threshold']
+if threshold is None:
+    threshold = DEFAULT_THRESHOLD
+
+cache = ResultCache(enabled=not args['no_cache'])
+
 if args.get("gen_individual"):
     if not os.path.exists("saved-delays"):
         os.mkdir("saved-delays")
@@ -80,120 +111,22 @@ for set in datasets:
     set_disps = []
     set_ang_disps = []
     for f in set_files:
-        logging.info("    Processing file '{0}'...".format(os.path.split(f['path'])[-1]))
         if not os.path.exists(f['path']):
             logging.warning("Given path does not exist! Exiting...")
             sys.exit(1)
-        if not os.path.split(f['path'])[-1].endswith('.json'):
-            logging.warning("Given path does not point to a .json file! Exiting...")
+        if not is_pos_data(f['path']):
+            logging.warning("Given path does not point to a .json, .npos or .nrun file! Exiting...")
             sys.exit(1)
-
-        objects = []
-        canvas = {}
-        with open(f['path']) as fp:
-            data = json.load(fp)
-            objects = data['objects']
-            canvas = data['canvas']
-        fps = canvas['fps']
-        if units is None:
-            units = canvas['units']
-
-        # Calculating delays and associated displacements
-        logging.info("    Calculating delays & displacements...")
-        threshold = args['threshold']
-        if threshold is None:
-            threshold = DEFAULT_THRESHOLD
-        delays = []
-        disps = []
-        ang_disps = []
-        x = objects[0]['X']
-        y = objects[0]['Y']
-        last_v = None
-        d = 1
-        for i in range(len(x) - 1):
-            disp = dist(x[i], y[i], x[i+1], y[i+1])
-            if disp < threshold:
-                d += 1
-            else:
-                if d >= int(mdf * fps):
-                    v = [x[i+1] - x[i], y[i+1] - y[i]]
-                    if last_v is None:
-                        last_v = v
-                    else:
-                        # Use dot product to calculate angular disp
-                        theta = math.acos(clamp(np.dot(last_v, v) / (mag(last_v)*mag(v)), -1, 1))
-                        # If dot(last_v, rot90CCW(v)) > 0, change is to the right and theta must be reflected
-                        if (last_v[0] * -v[1] + last_v[1] * v[0]) > 0:
-                            theta = (2 * math.pi) - theta
-                        ang_disps.append(theta)
-                        last_v = v
-                    delays.append(d)
-                    disps.append(disp)
-                    d = 1
-        
-        '''
-        # Calculating angular displacements
-        for i in range(len(x) - 2):
-            # Calculating lengths of AB, BC, CA
-            a = dist(x[i], y[i], x[i+1], y[i+1])
-            b = dist(x[i+1], y[i+1], x[i+2], y[i+2])
-            c = dist(x[i+2], y[i+2], x[i], y[i])
-            if a > 0 and b > 0 and c > 0:
-                # Law of cosines: theta = acos( ( a^2 + b^2 - c^2 ) / ( 2ab ))
-                theta = math.acos(round((a**2 + b**2 - c**2) / (2 * a * b), 4))
-
-                # Checking slopes for displacement changes
-                sab = 0
-                sac = 0
-                # Set defined value for undefined slope
-                if x[i+1] - x[i] != 0:
-                    sab = (y[i+1] - y[i]) / (x[i+1] - x[i])
-                else:
-                    sab = 10000000
-                if x[i+2] - x[i+1] != 0:
-                    sbc = (y[i+2] - y[i+1]) / (x[i+2] - x[i+1])
-                else:
-                    sbc = 10000000
-
-                # If slope change is negative, angle should be reflected
-                if sbc < sab:
-                    theta = (2 * math.pi) - theta
-
-                total_ang_disps.append(theta)
-        '''
-        '''
-        # Calculating angular displacements (with delay/disp thresholding)
-        last_v_i = 0
-        last_v = None
-        for i in range(len(x) - 1):
-            # Take jump as 2D vector centered on origin
-            v = [x[i+1] - x[i], y[i+1] - y[i]]
-            # Check if jump passes displacement and delay threshold
-            if mag(v) > threshold and (i - last_v_i + 1) >= int(mdf * fps):
-                if last_v is None:
-                    # If no previous jump recorded, save
-                    last_v = v
-                    last_v_i = i
-                else:
-                    # If previous jump recorded, use dot product to calculate angular disp
-                    theta = math.acos(clamp(np.dot(last_v, v) / (mag(last_v)*mag(v)), -1, 1))
-                    # If dot(last_v, rot90CCW(v)) > 0, change is to the right and theta must be reflected
-                    if (last_v[0] * -v[1] + last_v[1] * v[0]) > 0:
-                        theta = (2 * math.pi) - theta
-                    total_ang_disps.append(theta)
-                    # Update last jump
-                    last_v = v
-                    last_v_i = i
-        '''
-
-        logging.info("    Found {} delays, {} displacements, and {} angular displacements.".format(len(delays), len(disps), len(ang_disps)))
-        
-        # Convert all delays into seconds so clips w/ varying FPS values can be compared
-        delays = [int(d / fps) for d in delays]
-
-        set_delays.extend(delays)
-        set_disps.extend(disps)
-        set_ang_disps.extend(ang_disps)
+    # Delays, displacements and angles of the set are kept between runs, so only files added to (or removed from) the
+    # set since are processed. Each segment of a virtual dataset is processed like a separate file, so delays never
+    # span a gap
+    events = cache.update_set(args['path'], set_files, "events", { 'object': 0, 'threshold': threshold, 'mdf': mdf }, lambda f, data: file_events(f, data, threshold, mdf))
+    if units is None and len(events.get('units', [])) > 0:
+        units = events['units'][0]
+
+    set_delays.extend(events.get('delay', []))
+    set_disps.extend(events.get('disp', []))
+    set_ang_disps.extend(events.get('angle', []))
         
     
     if args.get("gen_individual"):
@@ -0,0 +1,253 @@
+#! python3
+import os, logging, time, threading
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import cv2
+
+IMAGE_ENDINGS = ("jpg", "bmp", "jpeg", "png")
+IMAGE_PREFIX = "Image"
+DEFAULT_PREFETCH = 8
+SYNTHETIC_RADIUS_PER = 0.02 # Percentage of width used as radius of synthetic beans
+SYNTHETIC_JUMP_PROB = 0.05 # Chance a synthetic bean jumps in a frame
+SYNTHETIC_JUMP_PER = 0.03 # Percentage of width a synthetic bean jumps by at most
+
+# --------- UTILITY METHODS ---------
+
+# Returns number of frame, for sorting image files
+def strip_frame_number(im_prefix, im_path):
+    im_path = im_path.lstrip(im_prefix).split(".")[0]
+    if im_path == "":
+        return 0
+    else:
+        return int(im_path)
+
+# Lists image files in folder, sorted by frame number in file name
+def list_frames(frames_path, im_prefix=IMAGE_PREFIX):
+    frames_list = os.listdir(frames_path)
+    frames_list = list(filter(lambda f : any([f.endswith(e) for e in IMAGE_ENDINGS]), frames_list))
+    frames_list.sort(key = lambda x : strip_frame_number(im_prefix, x))
+    return frames_list
+
+# -----------------------------------
+
+# Reads an image sequence folder through the same interface as cv2.VideoCapture,
+# decoding upcoming frames on a thread pool (cv2.imread releases the GIL)
+class FolderCapture:
+    def __init__(self, path, fps=1, prefetch=DEFAULT_PREFETCH, im_prefix=IMAGE_PREFIX):
+        self.path = path
+        self.fps = fps
+        self.prefetch = max(1, prefetch)
+        self.frames = list_frames(path, im_prefix)
+        self.pos = 0
+        self.shape = None
+        self.pool = ThreadPoolExecutor(max_workers=self.prefetch)
+        self.pending = deque()
+        self.next_i = 0
+        logging.debug("Found {0} frames in '{1}'".format(len(self.frames), path))
+
+    # Queues reads until prefetch window is full
+    def _fill(self):
+        while len(self.pending) < self.prefetch and self.next_i < len(self.frames):
+            im_path = os.path.join(self.path, self.frames[self.next_i])
+            self.pending.append(self.pool.submit(cv2.imread, im_path))
+            self.next_i += 1
+
+    def isOpened(self):
+        return self.pool is not None and len(self.frames) > 0
+
+    # Returns next frame that can be read, unreadable images are skipped so the rest of the folder is still read
+    def read(self):
+        if self.pool is None:
+            return False, None
+        while True:
+            self._fill()
+            if len(self.pending) == 0:
+                return False, None
+            frame = self.pending.popleft().result()
+            self.pos += 1
+            if frame is not None:
+                break
+            logging.warning("Could not read frame '{0}', skipping...".format(self.frames[self.pos - 1]))
+        self._fill()
+        self.shape = frame.shape
+        return True, frame
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return self.pos
+        elif prop == cv2.CAP_PROP_FRAME_COUNT:
+            return len(self.frames)
+        elif prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        elif prop in (cv2.CAP_PROP_FRAME_WIDTH, cv2.CAP_PROP_FRAME_HEIGHT):
+            if self.shape is None and len(self.frames) > 0:
+                self.shape = cv2.imread(os.path.join(self.path, self.frames[0])).shape
+            if self.shape is None:
+                return 0
+            return self.shape[1] if prop == cv2.CAP_PROP_FRAME_WIDTH else self.shape[0]
+        return 0
+
+    def set(self, prop, value):
+        if prop != cv2.CAP_PROP_POS_FRAMES:
+            return False
+        # Drop queued reads and restart prefetching from the given frame
+        for f in self.pending:
+            f.cancel()
+        self.pending.clear()
+        self.pos = int(value)
+        self.next_i = int(value)
+        return True
+
+    def release(self):
+        if self.pool is not None:
+            for f in self.pending:
+                f.cancel()
+            self.pending.clear()
+            self.pool.shutdown(wait=True)
+            self.pool = None
+
+# Live frame source, reads frames on a background thread and keeps only the newest one,
+# so a consumer that falls behind skips (drops) frames instead of building up latency
+class LiveSource(ABC):
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.frame = None
+        self.stamp = None
+        self.index = 0
+        self.last = 0
+        self.dropped = 0
+        self.ended = False
+        self.stopped = False
+        self.thread = None
+
+    # Returns (ret, frame) for the next frame of the underlying source, blocking at its frame rate
+    @abstractmethod
+    def grab(self):
+        pass
+
+    def fps(self):
+        return 0
+
+    def close(self):
+        pass
+
+    def _run(self):
+        while not self.stopped:
+            ret, frame = self.grab()
+            stamp = time.perf_counter()
+            with self.cond:
+                if not ret:
+                    self.ended = True
+                    self.cond.notify_all()
+                    return
+                self.index += 1
+                self.frame = frame
+                self.stamp = stamp
+                self.cond.notify_all()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    # Returns (ret, frame, frame number, capture time) of newest frame not yet read, waiting for one if needed
+    def read(self):
+        with self.cond:
+            self.cond.wait_for(lambda : self.index > self.last or self.ended or self.stopped)
+            if self.index == self.last:
+                return False, None, None, None
+            self.dropped += self.index - self.last - 1
+            self.last = self.index
+            return True, self.frame, self.index, self.stamp
+
+    def release(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+        self.close()
+
+# Live frames from a camera
+class CameraSource(LiveSource):
+    def __init__(self, index=0):
+        super().__init__()
+        self.vs = cv2.VideoCapture(index)
+
+    def grab(self):
+        return self.vs.read()
+
+    def fps(self):
+        return self.vs.get(cv2.CAP_PROP_FPS)
+
+    def close(self):
+        self.vs.release()
+
+# Frames from a video file, replayed at wall-clock rate as if it came from a camera
+class ReplaySource(LiveSource):
+    def __init__(self, path):
+        super().__init__()
+        self.vs = cv2.VideoCapture(path)
+        self.rate = self.vs.get(cv2.CAP_PROP_FPS) or 30
+        self.n = 0
+        self.t0 = None
+
+    def grab(self):
+        ret, frame = self.vs.read()
+        if self.t0 is None:
+            self.t0 = time.perf_counter()
+        # Wait until frame is due
+        delay = self.t0 + self.n / self.rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        self.n += 1
+        return ret, frame
+
+    def fps(self):
+        return self.rate
+
+    def close(self):
+        self.vs.release()
+
+# Synthetic frames of dark beans on a white canvas that rest and occasionally jump, for testing without a camera
+class SyntheticSource(LiveSource):
+    def __init__(self, width=640, height=480, objects=4, rate=30, frames=None, seed=None):
+        super().__init__()
+        self.width = width
+        self.height = height
+        self.rate = rate
+        self.frames = frames
+        self.rng = np.random.RandomState(seed)
+        self.radius = max(2, int(SYNTHETIC_RADIUS_PER * width))
+        # Starting beans spread on a grid, away from the borders where centroids are ignored
+        margin = 0.15
+        cols = int(np.ceil(np.sqrt(objects)))
+        rows = int(np.ceil(objects / cols))
+        grid = [((c + 0.5) / cols, (r + 0.5) / rows) for r in range(rows) for c in range(cols)][:objects]
+        self.pos = np.array([(margin * width + gx * (1 - 2 * margin) * width, margin * height + gy * (1 - 2 * margin) * height) for gx, gy in grid], float)
+        self.low = np.array([margin * width, margin * height])
+        self.high = np.array([(1 - margin) * width, (1 - margin) * height])
+        self.n = 0
+        self.t0 = None
+
+    def grab(self):
+        if self.frames is not None and self.n >= self.frames:
+            return False, None
+        if self.t0 is None:
+            self.t0 = time.perf_counter()
+        jumps = self.rng.uniform(size=len(self.pos)) < SYNTHETIC_JUMP_PROB
+        self.pos[jumps] += self.rng.uniform(-1, 1, (jumps.sum(), 2)) * SYNTHETIC_JUMP_PER * self.width
+        self.pos = np.clip(self.pos, self.low, self.high)
+        frame = np.full((self.height, self.width, 3), 255, np.uint8)
+        for x, y in self.pos:
+            cv2.circle(frame, (int(x), int(y)), self.radius, (0, 0, 0), -1)
+        delay = self.t0 + self.n / self.rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        self.n += 1
+        return True, frame
+
+    def fps(self):
+        return self.rate
@@ -0,0 +1,202 @@
+#! python3
+import cv2
+import numpy as np
+import sys, os, argparse, logging, json, time, random, tempfile
+from collections import deque
+from frame_source import CameraSource, ReplaySource, SyntheticSource
+from detection import CENTROID_MAX_RADIUS_PER, detect_centroids, filter_centroids
+from tracker import CentroidTracker
+from posdata import MISSING_PIXEL
+
+WINDOW = 'Live Tracking - OpenCV'
+WINDOW_SIZE = (1300, 900)
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+STREAM_NAME = "pos_stream.jsonl"
+POS_NAME = "pos_data.json"
+PERCENTILES = (50, 90, 99)
+LATENCY_WINDOW = 1000 # Latest latencies periodic reports are computed from
+LATENCY_SAMPLES = 10000 # Latencies sampled evenly over the whole session for the final report
+
+# --------- UTILITY METHODS ---------
+
+# Opens frame source: camera index, 'synthetic' for generated frames, or path to a video replayed at wall-clock rate
+def open_source(source, args):
+    if source.isdigit():
+        logging.info("Opening camera {0}...".format(source))
+        return CameraSource(int(source))
+    elif source == "synthetic":
+        logging.info("Generating synthetic frames...")
+        return SyntheticSource(objects=args['objects'], rate=args['fps'] or 30, frames=args['frames'], seed=args['seed'])
+    elif os.path.isfile(source):
+        logging.info("Replaying '{0}' at wall-clock rate...".format(source))
+        return ReplaySource(source)
+    return None
+
+# Returns latency percentiles in milliseconds as a string
+def latency_str(latencies, max_latency):
+    if len(latencies) == 0:
+        return "no frames"
+    values = np.percentile(np.array(latencies) * 1000, PERCENTILES)
+    parts = ["p{0} {1:.1f}ms".format(p, v) for p, v in zip(PERCENTILES, values)]
+    return ", ".join(parts + ["max {0:.1f}ms".format(max_latency * 1000)])
+
+# Adds the count-th value to a reservoir of at most LATENCY_SAMPLES values, so it stays an even sample of every value
+# seen so far
+def sample(reservoir, count, value):
+    if len(reservoir) < LATENCY_SAMPLES:
+        reservoir.append(value)
+    else:
+        k = random.randrange(count)
+        if k < LATENCY_SAMPLES:
+            reservoir[k] = value
+
+# Converts streamed positions into frame-aligned position data, frames dropped between streamed frames are filled with
+# missing positions. The file is written through a temporary file, so an interrupted conversion leaves no half-written
+# file behind. Returns False if the stream has no canvas line
+def stream_to_pos_data(stream_path, pos_path):
+    pos_data, last_frame = None, None
+    with open(stream_path) as fp:
+        for line in fp:
+            entry = json.loads(line)
+            if 'canvas' in entry:
+                pos_data = { 'objects': [], 'canvas': entry['canvas'] }
+                continue
+            if pos_data is None:
+                return False
+            if len(pos_data['objects']) == 0:
+                pos_data['objects'] = [{ 'X': [], 'Y': [] } for x in entry['X']]
+            gap = 0 if last_frame is None else entry['frame'] - last_frame - 1
+            for obj, x, y in zip(pos_data['objects'], entry['X'], entry['Y']):
+                obj['X'].extend([MISSING_PIXEL] * gap + [x])
+                obj['Y'].extend([MISSING_PIXEL] * gap + [y])
+            last_frame = entry['frame']
+    if pos_data is None:
+        return False
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.split(os.path.abspath(pos_path))[0])
+    with os.fdopen(fd, "w") as fp:
+        json.dump(pos_data, fp)
+    os.replace(tmp_path, pos_path)
+    return True
+
+# -----------------------------------
+
+# Setting up argument parser
+parser = argparse.ArgumentParser(description="Live multi-object tracking from a camera, a replayed video or synthetic frames, streaming positions to disk")
+parser.add_argument("source", help="Camera index (i.e., 0), 'synthetic', or path to a video replayed at wall-clock rate")
+parser.add_argument("-o", "--output", help="Folder to write positions to, defaults to the folder of a replayed video or the current folder")
+parser.add_argument("-rw", "--real-width", type=float, help="Real width of canvas, defaults to image width")
+parser.add_argument("-rh", "--real-height", type=float, help="Real height of canvas, defaults to image height")
+parser.add_argument("-u", "--units", help="Units for canvas, defaults to 'pixels'")
+parser.add_argument("-t", "--threshold", type=int, default=128, help="Image thresholding value, from 0 to 255, defaults to 128")
+parser.add_argument("-dur", "--duration", type=float, help="Seconds to track for, defaults to until the source ends or 'q'/Ctrl+C")
+parser.add_argument("-ri", "--report-interval", type=float, default=10, help="Seconds between frame rate and latency reports, defaults to 10")
+parser.add_argument("-s", "--show", action="store_true", help="Show tracked frames in a window")
+parser.add_argument("-f", "--fps", type=int, help="Frame rate of synthetic frames, defaults to 30")
+parser.add_argument("-n", "--objects", type=int, default=4, help="Number of synthetic objects, defaults to 4")
+parser.add_argument("-fr", "--frames", type=int, help="Number of synthetic frames, defaults to unlimited")
+parser.add_argument("-sd", "--seed", type=int, help="Random seed for synthetic frames")
+parser.add_argument("-d", "--debug", action="store_true", help="Show debug information")
+args = vars(parser.parse_args())
+
+# Setting up logger
+format = "%(levelname)s : %(message)s"
+logging.basicConfig(format=format, level=logging.INFO, datefmt="%H:%M:%S")
+if args.get("debug"):
+    logging.getLogger().setLevel(logging.DEBUG)
+logging.debug("ARGS: {0}".format(args))
+
+source = open_source(args['source'], args)
+if source is None:
+    logging.warning("Given source is not a camera index, 'synthetic' or an existing video! Exiting...")
+    sys.exit(1)
+
+# Positions are written next to a replayed video, or to the current folder
+out_dir = args['output'] if args['output'] else (os.path.split(args['source'])[0] if isinstance(source, ReplaySource) else ".")
+os.makedirs(out_dir or ".", exist_ok=True)
+stream_path = os.path.relpath(os.path.join(out_dir, STREAM_NAME))
+pos_path = os.path.relpath(os.path.join(out_dir, POS_NAME))
+
+if args['show']:
+    cv2.namedWindow(WINDOW, cv2.WINDOW_NORMAL)
+    cv2.resizeWindow(WINDOW, WINDOW_SIZE[0], WINDOW_SIZE[1])
+
+tracker = None
+recent = deque(maxlen=LATENCY_WINDOW)
+reservoir = []
+max_latency = 0
+processed = 0
+fp = open(stream_path, "w+")
+logging.info("Streaming positions to '{0}'...".format(stream_path))
+source.start()
+t0 = time.perf_counter()
+last_report = t0
+last_processed = 0
+try:
+    while True:
+        # Waits for newest frame, frames arriving while the last one was processed are dropped
+        ret, frame, frame_num, stamp = source.read()
+        if not ret:
+            logging.info("Frame source ended...")
+            break
+        height, width = frame.shape[:2]
+        if tracker is None:
+            tracker = CentroidTracker(width, height, args['real_width'], args['real_height'], args['units'], source.fps(), history=False)
+            fp.write(json.dumps({ 'canvas': tracker.pos_data['canvas'] }) + "\n")
+
+        # Detect centroids, remove oversized and border centroids, match to objects
+        framegray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        centroids, contours = detect_centroids(framegray, args['threshold'])
+        filtered_centroids = filter_centroids(centroids, framegray.shape, CENTROID_MAX_RADIUS_PER * width)
+        if not tracker.update([c for (c, a) in filtered_centroids], processed + 1):
+            logging.warning("Could not match centroid to object in frame {0}, skipping...".format(frame_num))
+            continue
+        processed += 1
+
+        # Stream positions of this frame to disk
+        objects = tracker.pos_data['objects']
+        fp.write(json.dumps({ 'frame': frame_num, 'time': round(stamp - t0, 4), 'X': [o['X'][-1] for o in objects], 'Y': [o['Y'][-1] for o in objects] }) + "\n")
+        fp.flush()
+        now = time.perf_counter()
+        recent.append(now - stamp)
+        sample(reservoir, processed, now - stamp)
+        max_latency = max(max_latency, now - stamp)
+
+        if args['show']:
+            cv2.drawContours(frame, contours, -1, (0, 255, 0), 3)
+            for i, pos in enumerate(tracker.last_positions()):
+                cv2.circle(frame, (pos['X'], pos['Y']), 5, (255, 0, 0), -1)
+                cv2.putText(frame, "object {0}".format(i), (pos['X'] - 50, pos['Y'] - 50), FONT, 1, (255, 0, 0), 2)
+            cv2.putText(frame, "Frame {0}, dropped {1}".format(frame_num, source.dropped), (0, height - 10), FONT, 1, (0, 0, 255), 2)
+            cv2.imshow(WINDOW, frame)
+            if cv2.waitKey(1) & 0xFF == ord("q"):
+                logging.info("Quitting...")
+                break
+
+        # Reporting frame rate and latency
+        if now - last_report >= args['report_interval']:
+            logging.info("Tracked {0} frames ({1:.1f} fps), dropped {2}, latency {3}".format(processed, (processed - last_processed) / (now - last_report), source.dropped, latency_str(recent, max(recent))))
+            last_report = now
+            last_processed = processed
+        if args['duration'] is not None and now - t0 >= args['duration']:
+            logging.info("Duration reached...")
+            break
+except KeyboardInterrupt:
+    logging.info("Interrupted...")
+source.release()
+fp.close()
+elapsed = time.perf_counter() - t0
+logging.info("Tracked {0} frames in {1:.1f}s, dropped {2} ({3:.1f}%)".format(processed, elapsed, source.dropped, 100 * source.dropped / max(1, processed + source.dropped)))
+logging.info("End-to-end latency: {0}".format(latency_str(reservoir, max_latency)))
+
+# Saving position data from the closed stream
+if tracker is not None:
+    logging.info("Saving position data to '{0}'...".format(pos_path))
+    try:
+        if stream_to_pos_data(stream_path, pos_path):
+            logging.info("Position data saved.")
+        else:
+            logging.warning("Stream '{0}' has no canvas line, positions are only kept there".format(stream_path))
+    except KeyboardInterrupt:
+        logging.warning("Interrupted, positions are only kept in '{0}'".format(stream_path))
+if args['show']:
+    cv2.destroyAllWindows()
@@ -0,0 +1,172 @@
+#! python3
+import os, logging, math
+import numpy as np
+from posdata import add_arrays
+
+FFT_MIN_FRAMES = 2048 # Tracks at least this long use the FFT method by default
+FFT_MIN_LAGS = 64 # Unless only a few lags are asked for, which the direct method computes faster
+
+# --------- UTILITY METHODS ---------
+
+# Returns objects x frames x 2 array of positions of objects (all by default) in canvas units, NaN where an object
+# is missing and as padding after shorter objects
+def unit_positions(data, objects=None):
+    objects = range(len(data.lengths)) if objects is None else objects
+    frames = max([data.lengths[i] for i in objects]) if len(objects) > 0 else 0
+    positions = np.full((len(objects), frames, 2), np.nan)
+    for k, i in enumerate(objects):
+        obj = data.object(i)
+        positions[k, :len(obj)] = obj
+    return positions
+
+# Returns default lags of a track, every tau from 1 up to (not including) half its number of frames
+def default_lags(frames):
+    return np.arange(1, int(frames / 2))
+
+# Returns taus below tau_max spaced evenly on a log scale, per_decade of them in every decade (rounded, so the first
+# decades have fewer)
+def log_lags(tau_max, per_decade):
+    if tau_max <= 1:
+        return np.zeros(0, dtype=np.int64)
+    exponents = np.arange(math.ceil(math.log10(tau_max) * per_decade)) / per_decade
+    lags = np.unique(np.rint(np.power(10, exponents)).astype(np.int64))
+    return lags[lags < tau_max]
+
+# Returns lags of a track: every tau up to half its length by default, per_decade log-spaced taus, or the given
+# taus. As in the default schedule, every schedule ends at the largest tau of the track, int(frames / 2) - 1, which
+# only bounds the taus the MSD is given for (see mean_squared_displacements)
+def lag_schedule(frames, per_decade=None, lags=None):
+    tau_max = int(frames / 2) - 1
+    if (per_decade is None and lags is None) or tau_max < 1:
+        return default_lags(frames)
+    lags = log_lags(tau_max, per_decade) if lags is None else np.unique(np.asarray(lags, dtype=np.int64))
+    return np.append(lags[(lags >= 1) & (lags < tau_max)], tau_max)
+
+# Returns correlations sum(a[i] * b[i + t]) of rows of a and b for every lag t below their length, through FFT
+def correlate(a, b):
+    n = a.shape[1]
+    n_fft = 1 << max(2 * n - 1, 1).bit_length()
+    return np.fft.irfft(np.conj(np.fft.rfft(a, n_fft)) * np.fft.rfft(b, n_fft), n_fft)[:, :n]
+
+# Returns sums and counts of squared displacements of objects x frames x 2 positions for every lag in lags, as
+# objects x (largest lag + 1) arrays indexed by lag (lags not given are 0). Displacements are squared without taking
+# a root, for all objects at once, and pairs with a missing frame are skipped. Sums of files are added up to get
+# the mean over all of them. The FFT method (see fft_msd_sums) is used by default for long tracks, "direct"
+# computes every lag by slicing
+def msd_sums(positions, lags, method=None):
+    positions = np.asarray(positions, dtype=float)
+    if method is None:
+        method = "fft" if positions.shape[1] >= FFT_MIN_FRAMES and len(lags) >= FFT_MIN_LAGS else "direct"
+    if method == "fft":
+        return fft_msd_sums(positions, lags)
+    size = int(max(lags)) + 1 if len(lags) > 0 else 1
+    sums = np.zeros((len(positions), size))
+    counts = np.zeros((len(positions), size), dtype=np.int64)
+    for t in lags:
+        t = int(t)
+        if t >= positions.shape[1]:
+            continue
+        d = positions[:, t:] - positions[:, :positions.shape[1] - t]
+        sd = (d * d).sum(axis=-1)
+        valid = ~np.isnan(sd)
+        sums[:, t] = np.where(valid, sd, 0).sum(axis=1)
+        counts[:, t] = valid.sum(axis=1)
+    return sums, counts
+
+# Returns the same sums and counts as msd_sums for every lag at once in O(N log N). With w marking known frames and
+# r positions (0 where missing), the sum of |r[i + t] - r[i]|^2 over pairs of known frames expands to
+# sum(w[i] |r[i + t]|^2) + sum(|r[i]|^2 w[i + t]) - 2 sum(r[i] . r[i + t]), correlations computed through FFT (for a
+# track without missing frames, the first two are cumulative sums of squares). Positions are centered first, so the
+# terms stay small and the sums match the direct method to floating-point precision
+def fft_msd_sums(positions, lags):
+    positions = np.asarray(positions, dtype=float)
+    size = int(max(lags)) + 1 if len(lags) > 0 else 1
+    sums = np.zeros((len(positions), size))
+    counts = np.zeros((len(positions), size), dtype=np.int64)
+    lags = np.asarray(lags, dtype=np.int64)
+    lags = lags[lags < positions.shape[1]]
+    if len(lags) == 0 or len(positions) == 0:
+        return sums, counts
+    w = (~np.isnan(positions).any(axis=-1)).astype(float)
+    known = w.sum(axis=1)
+    center = np.nansum(positions * w[:, :, None], axis=1) / np.maximum(known, 1)[:, None]
+    r = np.where(w[:, :, None] > 0, positions - center[:, None, :], 0)
+    q = (r * r).sum(axis=-1)
+    s = correlate(w, q) + correlate(q, w) - 2 * (correlate(r[:, :, 0], r[:, :, 0]) + correlate(r[:, :, 1], r[:, :, 1]))
+    n = np.rint(correlate(w, w)).astype(np.int64)
+    sums[:, lags] = np.where(n[:, lags] > 0, np.maximum(s[:, lags], 0), 0)
+    counts[:, lags] = n[:, lags]
+    return sums, counts
+
+# Returns tau (with known pairs, below the largest tau summed) and mean squared displacement from sums and counts of
+# squared displacements of an object indexed by tau, in O(T)
+def mean_squared_displacements(sums, counts):
+    tau = np.flatnonzero(np.asarray(counts)[1:len(sums) - 1] > 0) + 1
+    return tau.tolist(), (np.asarray(sums)[tau] / np.asarray(counts)[tau]).tolist()
+
+# Returns sums and counts (see msd_sums) with every object limited to tau below half its own length
+def limit_lags(sums, counts, lengths):
+    keep = np.arange(sums.shape[1]) < (np.asarray(lengths, dtype=np.int64) // 2)[:, None]
+    return np.where(keep, sums, 0), np.where(keep, counts, 0)
+
+# Returns tau and MSD of the ensemble of all objects, pooling the pairs of every object, from objects x tau sums and
+# counts of squared displacements (i.e., added up over the files of a set)
+def ensemble_msd(sums, counts):
+    return mean_squared_displacements(np.sum(sums, axis=0), np.sum(counts, axis=0))
+
+# Returns { 'path', 'object', 'tau', 'msd' } of every object of every manifest entry on its own, from the objects x tau
+# sums and counts of each file. Objects are only told apart within a file: object i of one recording is a different
+# bean than object i of another, so they are never pooled (segments of one recording, or a file listed twice, are)
+def object_msds(entries, results):
+    objects = {}
+    for f, result in zip(entries, results):
+        for i in range(len(result['sums'])):
+            obj = objects.setdefault((f['path'], i), { 'sums': None, 'counts': None })
+            obj['sums'] = add_arrays(obj['sums'], result['sums'][i])
+            obj['counts'] = add_arrays(obj['counts'], result['counts'][i])
+    objects_msd = []
+    for (path, i), obj in objects.items():
+        tau, msd = mean_squared_displacements(obj['sums'], obj['counts'])
+        objects_msd.append({ 'path': path, 'object': i, 'tau': tau, 'msd': msd })
+    return objects_msd
+
+# Returns objects x tau sums and counts of squared displacements of every object of a manifest file, between known
+# points apart by interval tau (every tau up to half the object's length, or per_decade log-spaced or given taus),
+# skipping missing frames. All objects are computed at once
+def file_msd(f, data, per_decade=None, lags=None):
+    logging.info("    Processing file '{0}'...".format(os.path.split(f['path'])[-1]))
+    sums, counts = msd_sums(unit_positions(data), lag_schedule(data.frames(), per_decade, lags))
+    sums, counts = limit_lags(sums, counts, data.lengths)
+    return { 'sums': sums, 'counts': counts }
+
+# -----------------------------------
+
+# Running per-tau sums and counts of squared displacements of objects, updated file by file with the sums of every
+# file (see msd_sums). Memory stays O(T) per object however many files are added, instead of keeping the squared
+# displacements themselves, and accumulators merge in O(T)
+class MSDAccumulator:
+    def __init__(self):
+        self.sums = []
+        self.counts = []
+
+    # Adds objects x lags sums and counts of a file, optionally only the first lengths[i] lags of each object
+    def add(self, sums, counts, lengths=None):
+        for i in range(len(sums)):
+            n = len(sums[i]) if lengths is None else lengths[i]
+            if i == len(self.sums):
+                self.sums.append(None)
+                self.counts.append(None)
+            self.sums[i] = add_arrays(self.sums[i], sums[i][:n])
+            self.counts[i] = add_arrays(self.counts[i], counts[i][:n])
+
+    # Adds sums and counts of another accumulator
+    def merge(self, other):
+        self.add(other.sums, other.counts)
+
+    # Returns number of objects
+    def objects(self):
+        return len(self.sums)
+
+    # Returns tau and mean squared displacement of object, see mean_squared_displacements
+    def msd(self, i):
+        return mean_squared_displacements(self.sums[i], self.counts[i])
@@ -1,38 +1,22 @@
 import cv2
 import numpy as np
 import sys, os, argparse, logging, math, json, time
+from frame_source import FolderCapture
+from concurrent.futures import ThreadPoolExecutor
+from calibration import scale_sidecar, load_scale
+from detection import CENTROID_MAX_RADIUS_PER, detect_centroids, detect_centroids_tiled, filter_centroids, parse_tiles
+from tracker import CentroidTracker, flow_positions, FLOW_MAX_ERROR, FLOW_MAX_JUMP_PER
+from arenas import arenas_sidecar, load_arenas
+from posdata import binary_path, write_pos_data
 
 WINDOW = 'Contour and Centroid Calculation - OpenCV'
 WINDOW_SIZE = (1300, 900)
 TRACKBAR_NAME = "Frame"
 FONT = cv2.FONT_HERSHEY_SIMPLEX 
-CENTROID_MAX_RADIUS_PER = 0.05 # Percentage of width two centroids must be within to be combined
 FOURCC = cv2.VideoWriter_fourcc(*'mp4v')
 
 # --------- UTILITY METHODS --------- 
 
-# Returns scalar distance between centroid positions
-def centroid_dist(cp1, cp2):
-    return math.sqrt(math.pow(cp1['X'] - cp2['X'], 2) + math.pow(cp1['Y'] - cp2['Y'], 2))
-
-# Returns weighted centroid using area as weight of given centroids
-def centroid_avg(cntrds):
-    w_x = sum([i[0]['X']*i[1] for i in cntrds])
-    w_y = sum([i[0]['Y']*i[1] for i in cntrds])
-    areas = sum([i[1] for i in cntrds])
-    if areas > 0:
-        return ({'X': round(w_x / areas), 'Y': round(w_y / areas)}, areas)
-    else:
-        return ({'X': cntrds[0][0]['X'], 'Y': cntrds[0][0]['Y']}, 0)
-# Returns true if c is within factor percent of image borders
-def centroid_border(c, factor, shape):
-    height, width, _ = shape
-    if c[0]['X'] <= factor*width or c[0]['X'] >= (1 - factor)*width:
-        return True
-    elif c[0]['Y'] <= factor*height or c[0]['Y'] >= (1 - factor)*height:
-        return True
-    return False
-
 # Kills execution with error message, closes video handle and cv2 windows
 def kill_execution(errormsg, videohandle=None, spin=True):
     logging.warning(errormsg)
@@ -46,19 +30,56 @@ def kill_execution(errormsg, videohandle=None, spin=True):
     cv2.destroyAllWindows()
     sys.exit(1)
 
-# Converts units from pixels to given units
-def convert_units(pix, pix_dim, real_dim):
-    return round(pix * (real_dim/pix_dim), 3)
+# Detects centroids in arena region of grayscale frame and matches them to the arena's objects, run on the arena's own worker
+def track_arena(job, framegray, frame_num):
+    region = job['arena'].crop(framegray) if job['arena'] else framegray
+    width = region.shape[1]
+    radius = CENTROID_MAX_RADIUS_PER * width
+
+    # Between full detections, move known objects with optical flow, falling back to detection when flow fails
+    prev, job['prev'] = job['prev'], region
+    if args['flow_interval'] > 1 and prev is not None and frame_num - job['last_detect'] < args['flow_interval']:
+        max_jump = args['flow_max_jump'] if args['flow_max_jump'] is not None else FLOW_MAX_JUMP_PER * width
+        positions = flow_positions(prev, region, job['tracker'].last_positions(), max_jump, args['flow_max_error'])
+        if positions is not None:
+            job['tracker'].update_positions(positions)
+            return [], [], radius, True
+        logging.debug("Optical flow lost objects in frame {0}, detecting...".format(frame_num))
+    job['last_detect'] = frame_num
+
+    # Apply a threshold filter, find contours and calculate their centroids
+    if tiles:
+        overlap = args['tile_overlap'] if args['tile_overlap'] is not None else int(radius)
+        centroids, contours = detect_centroids_tiled(region, threshold, tiles, overlap, pool)
+    else:
+        centroids, contours = detect_centroids(region, threshold)
+
+    # Removing oversized and border centroids, combining those within radius
+    filtered_centroids = filter_centroids(centroids, region.shape, radius)
+
+    # Removing area data from centroids, matching to objects
+    matched = job['tracker'].update([c for (c, a) in filtered_centroids], frame_num)
+    return centroids, contours, radius, matched
 
 # -----------------------------------
 
 # Setting up argument parser
 parser = argparse.ArgumentParser(description="Multi-object tracking using OpenCV contour detection, centroid calculation, and tracking algorithms")
-parser.add_argument("path", help="Path to video, ending in .avi or .mp4")
+parser.add_argument("path", help="Path to video, ending in .avi or .mp4, or to a folder of image frames")
 parser.add_argument("-rw", "--real-width", type=float, help="Real width of canvas, defaults to image height")
 parser.add_argument("-rh", "--real-height", type=float, help="Real height of canvas, defaults to image height")
 parser.add_argument("-u", "--units",  help="Units for canvas, defaults to 'pixels'")
 parser.add_argument("-t", "--threshold", type=int, help="Image thresholding value, from 0 to 255, defaults to 128")
+parser.add_argument("-f", "--fps", type=int, default=1, help="FPS of image frames when tracking from a folder, defaults to 1")
+parser.add_argument("-tl", "--tiles", help="Split frames into tiles detected in parallel, either 'N' for N x N tiles or 'COLSxROWS'")
+parser.add_argument("-to", "--tile-overlap", type=int, help="Overlap between tiles in pixels, should be larger than the biggest object, defaults to the centroid combining radius")
+parser.add_argument("-w", "--workers", type=int, help="Number of threads used for tiled detection, defaults to number of cores")
+parser.add_argument("-a", "--arenas", help="Path to json file with arena definitions, each tracked as its own canvas (defaults to '<video>.arenas.json' if present)")
+parser.add_argument("-fi", "--flow-interval", type=int, default=1, help="Run full detection every given number of frames and follow objects with optical flow in between, defaults to 1 (always detect)")
+parser.add_argument("-fe", "--flow-max-error", type=float, default=FLOW_MAX_ERROR, help="Optical flow error above which detection is used instead, defaults to {0}".format(FLOW_MAX_ERROR))
+parser.add_argument("-fj", "--flow-max-jump", type=float, help="Distance in pixels an object may move by optical flow before detection is used instead, defaults to {0}%% of width".format(FLOW_MAX_JUMP_PER * 100))
+parser.add_argument("-pf", "--prefetch", type=int, default=8, help="Number of upcoming image frames read in parallel when tracking from a folder, defaults to 8")
+parser.add_argument("-of", "--output-format", choices=["json", "binary", "both"], default="both", help="Format of saved position data, json, binary (.npos) or both, defaults to both")
 parser.add_argument("-d", "--debug", action="store_true", help="Show debug information")
 args = vars(parser.parse_args())
 
@@ -75,18 +96,51 @@ if not os.path.exists(args['path']):
     logging.warning("Given path does not exist! Exiting...")
     sys.exit(1)
 
-# Checking that given path points to an avi or mp4 file
-if not os.path.split(args['path'])[-1].endswith(".avi") and not os.path.split(args['path'])[-1].endswith(".mp4"):
-    logging.warning("Given path does not point to a .avi or .mp4 file! Exiting...")
+# Checking that given path points to an avi or mp4 file, or a folder of frames
+from_folder = os.path.isdir(args['path'])
+if not from_folder and not os.path.split(args['path'])[-1].endswith(".avi") and not os.path.split(args['path'])[-1].endswith(".mp4"):
+    logging.warning("Given path does not point to a .avi or .mp4 file or a folder! Exiting...")
     sys.exit(1)
 
-pos_data = {"objects": [], "canvas": {}}
-raw_data = []
+# Use canvas scale recorded when warping to real units, if real dimensions are not given
+scale_path = scale_sidecar(args['path'])
+if args['real_width'] is None and args['real_height'] is None and os.path.exists(scale_path):
+    scale = load_scale(scale_path)
+    args['real_width'] = scale['width']
+    args['real_height'] = scale['height']
+    if args['units'] is None:
+        args['units'] = scale['units']
+    logging.info("Using canvas scale from '{0}': {1} x {2} {3}".format(scale_path, scale['width'], scale['height'], scale['units']))
+
+# Output files are written next to the video, or inside the frames folder
+out_dir = args['path'] if from_folder else os.path.split(args['path'])[0]
+
+tiles = parse_tiles(args['tiles']) if args['tiles'] else None
+pool = ThreadPoolExecutor(max_workers=args['workers']) if tiles else None
+threshold = args['threshold'] if args['threshold'] is not None else 128
+
+# Load arenas, each one is cropped from the frame and tracked on its own worker
+arenas = []
+arenas_path = args['arenas'] if args['arenas'] else arenas_sidecar(args['path'])
+if os.path.exists(arenas_path):
+    arenas = load_arenas(arenas_path)
+    logging.info("Tracking {0} arenas from '{1}': {2}".format(len(arenas), arenas_path, ", ".join([a.name for a in arenas])))
+elif args['arenas']:
+    logging.warning("Given arena file does not exist! Exiting...")
+    sys.exit(1)
+jobs = []
+
 times = []
 est_total = 0
 quit = False
 vw = None
-vs = cv2.VideoCapture(args['path'])
+if from_folder:
+    vs = FolderCapture(args['path'], fps=args['fps'], prefetch=args['prefetch'])
+    if not vs.isOpened():
+        logging.warning("No image frames found in given folder! Exiting...")
+        sys.exit(1)
+else:
+    vs = cv2.VideoCapture(args['path'])
 cv2.namedWindow(WINDOW, cv2.WINDOW_NORMAL)
 cv2.resizeWindow(WINDOW, WINDOW_SIZE[0], WINDOW_SIZE[1])
 key = cv2.waitKey(1) & 0xFF
@@ -104,108 +158,56 @@ while True:
     frame_num = int(vs.get(cv2.CAP_PROP_POS_FRAMES))
     frame_total = int(vs.get(cv2.CAP_PROP_FRAME_COUNT))
 
-    # Grab video frame dimensions, update canvas size
+    # Grab video frame dimensions, set up canvas for whole frame or each arena
     height, width, _ = frame.shape
-    if not pos_data['canvas']:
-        pos_data['canvas']['width'] = args.get("real_width", width)
-        pos_data['canvas']['height'] = args.get("real_height", height)
-        pos_data['canvas']['units'] = args.get("units", "pixels")
-        pos_data['canvas']['fps'] = int(vs.get(cv2.CAP_PROP_FPS))
+    if not jobs:
+        fps = int(vs.get(cv2.CAP_PROP_FPS))
+        if arenas:
+            for a in arenas:
+                tracker = CentroidTracker(a.w, a.h, a.real_width, a.real_height, a.units, fps)
+                jobs.append({ 'name': a.name, 'arena': a, 'tracker': tracker, 'worker': ThreadPoolExecutor(max_workers=1), 'prev': None, 'last_detect': 0 })
+        else:
+            tracker = CentroidTracker(width, height, args['real_width'], args['real_height'], args['units'], fps)
+            jobs.append({ 'name': None, 'arena': None, 'tracker': tracker, 'worker': None, 'prev': None, 'last_detect': 0 })
 
     # Create VideoWriter if not created already
     if not vw:
-        vw_fname = list(os.path.split(args['path']))
-        vw_fname[-1] = "track-output.mp4"
-        vw_fname = os.path.relpath(os.path.join(*vw_fname))
-        vw = cv2.VideoWriter(vw_fname, FOURCC, int(frame_total / 60), (width, height))
+        vw_fname = os.path.relpath(os.path.join(out_dir, "track-output.mp4"))
+        vw = cv2.VideoWriter(vw_fname, FOURCC, max(int(frame_total / 60), 1), (width, height))
 
-    # Convert frame to gray colorspace
+    # Convert frame to gray colorspace once, then detect and match centroids in every arena in parallel
     framegray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    # Apply a threshold filter
-    #ret, threshold = cv2.threshold(framegray, 128, 255, 0)
-    #threshold = cv2.adaptiveThreshold(framegray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY, 11, 2)
-    #ret, threshold = cv2.threshold(framegray, 128, 255, cv2.THRESH_TRUNC+cv2.THRESH_OTSU)
-    ret, threshold = cv2.threshold(framegray, args.get("threshold", 128), 255, cv2.THRESH_BINARY)
-    # Find and draw contours using cv2 simple chain approximation
-    contours, hierarchy = cv2.findContours(threshold, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-    cv2.drawContours(frame, contours, -1, (0, 255, 0), 3)
-
-    # DEBUG 
-    #if frame_num == 1:
-        #cv2.namedWindow("THRESHOLD DEBUG", cv2.WINDOW_NORMAL)
-        #cv2.imshow("THRESHOLD DEBUG", threshold)
-
-    # Calculate centroids
-    centroids = []
-    for (i, c) in enumerate(contours):
-        M = cv2.moments(c)
-        if M["m00"] != 0: # Ignores erroring centroids, potentially worth tracking those
-            cX = int(M["m10"] / M["m00"])
-            cY = int(M["m01"] / M["m00"])
-            centroids.append(({'X': cX, 'Y': cY}, int(M['m00'])))
-
-    # Drawing deleted points, ranges, and size/coords if debug is on
-    if args.get("debug"):
-        for c in centroids:
-            cv2.circle(frame, (c[0]['X'], c[0]['Y']), 5, (0, 0, 255), -1)
-            cv2.circle(frame, (c[0]['X'], c[0]['Y']), int(CENTROID_MAX_RADIUS_PER * width), (0, 255, 255), 2)
-            cv2.putText(frame, "{0}\n{1}".format(c[1], (c[0]['X'], c[0]['Y'])), (c[0]['X'] + 25, c[0]['Y'] + 25), FONT, 0.5, (0, 0, 255), 2)
-        
-    # Removing first centroid, formed by borders of image
-    centroids = centroids[1:]
-
-    # Removing centroids over size threshold
-    centroids = [c for c in centroids if c[1] < 1000000]
+    if len(jobs) == 1 and jobs[0]['worker'] is None:
+        results = [track_arena(jobs[0], framegray, frame_num)]
+    else:
+        futures = [job['worker'].submit(track_arena, job, framegray, frame_num) for job in jobs]
+        results = [f.result() for f in futures]
 
-    # Removing centroids within 1% of border of image
-    centroids = [c for c in centroids if not centroid_border(c, 0.05, frame.shape)]
+    for job, (centroids, contours, radius, matched) in zip(jobs, results):
+        if not matched:
+            kill_execution("Error: Could not match centroid to object!", vs)
+        ox, oy = job['arena'].offset() if job['arena'] else (0, 0)
 
-    # Pass over centroids, combine those within set radius into their weighted average centroid
-    filtered_centroids = []
-    while len(centroids) > 0:
-        # Average together all points within radius of selected point, update centroid list to all points not near selected point
-        near = [centroids[0]] + [i for i in centroids[1:] if centroid_dist(centroids[0][0], i[0]) <= (CENTROID_MAX_RADIUS_PER * width)]
-        centroids = [i for i in centroids[1:] if centroid_dist(centroids[0][0], i[0]) > (CENTROID_MAX_RADIUS_PER * width)]
-        filtered_centroids.append(centroid_avg(near))
+        # Draw arena outline and contours
+        if job['arena']:
+            cv2.polylines(frame, [job['arena'].polygon], True, (255, 0, 255), 2)
+            cv2.putText(frame, "arena {0}".format(job['name']), (ox + 10, oy + 30), FONT, 1, (255, 0, 255), 2)
+        cv2.drawContours(frame, contours, -1, (0, 255, 0), 3, offset=(ox, oy))
 
-    # Removing area data from centroids
-    centroids = [c for (c, a) in filtered_centroids] 
+        # Drawing deleted points, ranges, and size/coords if debug is on
+        if args.get("debug"):
+            for c in centroids:
+                cX, cY = c[0]['X'] + ox, c[0]['Y'] + oy
+                cv2.circle(frame, (cX, cY), 5, (0, 0, 255), -1)
+                cv2.circle(frame, (cX, cY), int(radius), (0, 255, 255), 2)
+                cv2.putText(frame, "{0}\n{1}".format(c[1], (c[0]['X'], c[0]['Y'])), (cX + 25, cY + 25), FONT, 0.5, (0, 0, 255), 2)
 
-    if frame_num == 1:
-        # Creating structure on first frame (converting units if necessary)
-        raw_data = [{'X': [c['X']], 'Y': [c['Y']]} for c in centroids]
-        pos_data['objects'] = [{'X': [convert_units(c['X'], width, args.get("real_width", width))], 'Y': [convert_units(c['Y'], height, args.get("real_height", height))]} for c in centroids]
-    else:
-        for c in centroids: 
-            # Grabbing positions of all objects from last frame
-            last_pos = [{'X': o['X'][-1], 'Y': o['Y'][-1]} for o in raw_data]
-            # Find last frame object closest to current point
-            min_i = -1
-            min_dist = max([height, width]) + 1
-            for (i, pos) in enumerate(last_pos):
-                if centroid_dist(c, pos) < min_dist:
-                    min_i = i
-                    min_dist = centroid_dist(c, pos)
-            if min_i == -1:
-                kill_execution("Error: Could not match centroid to object!", vs)
-            else:
-                #  Writing positions to position data (converting if necessary)
-                raw_data[min_i]['X'].append(c['X'])
-                raw_data[min_i]['Y'].append(c['Y'])
-                pos_data["objects"][min_i]['X'].append(convert_units(c['X'], width, args.get("real_width", width)))
-                pos_data["objects"][min_i]['Y'].append(convert_units(c['Y'], height, args.get("real_height", height)))
-        # Fill in any failed tracks for an object with -1 x/y
-        '''for obj in raw_data:
-            if len(obj['X']) < frame_num:
-                obj['X'].append(-1)
-                obj['Y'].append(-1)'''
-
-    # Draw resulting centroids
-    for i in range(len(raw_data)):
-        x = raw_data[i]['X'][-1]
-        y = raw_data[i]['Y'][-1]
-        cv2.circle(frame, (x, y), 5, (255, 0, 0), -1)
-        cv2.putText(frame, "object {0}".format(i), (x - 50, y - 50), FONT, 1, (255, 0, 0), 2)
+        # Draw resulting centroids
+        for i, pos in enumerate(job['tracker'].last_positions()):
+            x = pos['X'] + ox
+            y = pos['Y'] + oy
+            cv2.circle(frame, (x, y), 5, (255, 0, 0), -1)
+            cv2.putText(frame, "object {0}".format(i), (x - 50, y - 50), FONT, 1, (255, 0, 0), 2)
 
     # Label frame, write to video output
     cv2.putText(frame, "Frame {0} of {1}".format(frame_num, frame_total), (0, height - 10), FONT, 1, (0, 0, 255), 2)
@@ -242,21 +244,31 @@ while True:
         cv2.destroyAllWindows()
         sys.exit(0)
 logging.info("Releasing video read stream...")
-vs.release()         
+vs.release()
+if pool:
+    pool.shutdown()
+for job in jobs:
+    if job['worker']:
+        job['worker'].shutdown()         
 logging.info("Releasing video write stream...")
 vw.release()
 logging.info("Processing complete.")
 
-logging.info("Position Data Info: ( objects: {0}, xlen: {1}, ylen: {2} )".format(len(pos_data['objects']), len(pos_data['objects'][0]['X']), len(pos_data['objects'][0]['Y'])))
-
-# Saving position data to pos_data.json
-pos_path = list(os.path.split(args['path']))
-pos_path[-1] = 'pos_data.json'
-pos_path = os.path.relpath(os.path.join(*pos_path))
-logging.info("Saving position data to '{0}'...".format(pos_path))
-with open(pos_path, "w+") as fp:
-    json.dump(pos_data, fp)
-logging.info("Position data saved.")
+# Saving position data to pos_data.json/.npos, or pos_data_<arena>.json/.npos for each arena
+for job in jobs:
+    pos_data = job['tracker'].pos_data
+    if len(pos_data['objects']) > 0:
+        logging.info("Position Data Info: ( objects: {0}, xlen: {1}, ylen: {2} )".format(len(pos_data['objects']), len(pos_data['objects'][0]['X']), len(pos_data['objects'][0]['Y'])))
+    pos_name = 'pos_data.json' if job['name'] is None else 'pos_data_{0}.json'.format(job['name'])
+    pos_path = os.path.relpath(os.path.join(out_dir, pos_name))
+    if args['output_format'] in ("json", "both"):
+        logging.info("Saving position data to '{0}'...".format(pos_path))
+        with open(pos_path, "w+") as fp:
+            json.dump(pos_data, fp)
+    if args['output_format'] in ("binary", "both"):
+        logging.info("Saving position data to '{0}'...".format(binary_path(pos_path)))
+        write_pos_data(binary_path(pos_path), pos_data)
+    logging.info("Position data saved.")
 logging.info("Quitting...")
 
 # Print bell character upon completion
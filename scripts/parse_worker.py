@@ -0,0 +1,18 @@
+#! python3
+import posdata
+
+# Worker processes parsing json position data (see posdata.parse_pool) run this module as their main module rather than
+# the running script. Scripts run everything at the top level, so a spawned worker importing the script would run it
+# again
+
+# Waits until every worker process of the pool is started
+def start(barrier):
+    barrier.wait()
+
+# Returns once a worker process is running, submitted once per worker to start them all
+def ready(i):
+    return i
+
+# Returns positions, frame count of each object and canvas of json position data file (see posdata.read_json_positions)
+def read_file(path):
+    return posdata.read_json_positions(path)
@@ -2,22 +2,21 @@
 import cv2
 import numpy as np
 import sys, os, argparse, logging, time, math
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from frame_source import list_frames
+from calibration import order_points, save_corners, corners_sidecar, resolve_corners, transform_matrix
 
-IMAGE_ENDINGS = ("jpg", "bmp", "jpeg", "png")
 IMAGE_PREFIX = "Image"
 WINDOW = 'Perspective Transformation - OpenCV'
 WINDOW_SIZE = (1500, 1100)
 FONT = cv2.FONT_HERSHEY_SIMPLEX
+DEFAULT_PNG_COMPRESSION = 3
+DEFAULT_JPEG_QUALITY = 95
+DEFAULT_PROGRESS_INTERVAL = 100
+QUEUE_PER_WORKER = 2 # Images submitted ahead per worker
 
-# --------- UTILITY METHODS --------- 
-
-# Returns number of frame, for sorting image files
-def strip_frame_number(im_prefix, im_path):
-    im_path = im_path.lstrip(im_prefix).split(".")[0]
-    if im_path == "":
-        return 0
-    else:
-        return int(im_path)
+# --------- UTILITY METHODS ---------
 
 # Callback method for cv2 mouse event
 def click_points(event, x, y, flags, params):
@@ -31,21 +30,106 @@ def click_points(event, x, y, flags, params):
             logging.debug("Coordinate Array: {0}".format(params))
             if (len(params) == 4):
                 # Called on last coordinate selection
-                shape_coords = np.array(params, np.int32).reshape((-1, 1, 2))
+                shape_coords = np.array(order_points(params, draw=True), np.int32).reshape((-1, 1, 2))
                 cv2.polylines(image, [shape_coords], True, (255, 0, 0), 3)
                 cv2.imshow(WINDOW, image)
 
-# Orders coordinate points to top left, bottom left, top right, bottom right
-def order_points(coords):
-    output_coords = [[], [], [], []]
-    # NOT IMPLEMENTED YET, CLICK IN RIGHT ORDER FOR NOW
-    return coords
+# Returns output file name for image, with extension replaced if an output format is given
+def output_name(im, fmt=None):
+    if fmt:
+        return os.path.splitext(im)[0] + "." + fmt
+    return im
+
+# Returns cv2.imwrite parameters for the encoding of the given file name
+def encode_params(name, png_compression, jpeg_quality):
+    ext = os.path.splitext(name)[1].lower()
+    if ext == ".png":
+        return [cv2.IMWRITE_PNG_COMPRESSION, png_compression]
+    elif ext in (".jpg", ".jpeg"):
+        return [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]
+    return []
+
+# Reads, warps and writes a single image, run on worker threads (OpenCV releases the GIL). Returns whether the image
+# could be read, and the warped image if keep is set
+def warp_image(path, im, matrix, size, fmt, png_compression, jpeg_quality, keep=False):
+    image = cv2.imread(os.path.join(path, im))
+    if image is None:
+        return False, None
+    image = cv2.warpPerspective(image, matrix, size)
+    name = output_name(im, fmt)
+    cv2.imwrite(os.path.join(path, "transformed", name), image, encode_params(name, png_compression, jpeg_quality))
+    if keep:
+        return True, image
+    return True, None
+
+# Warps every image with the given corners into transformed/ using a pool of workers, returns False if user quit while processing.
+# Only a window of workers * QUEUE_PER_WORKER images is submitted at a time, and when shown only the first image of every
+# window is kept for display, so memory does not grow with the number of images
+def transform_images(path, im_files, coords, show=False, workers=None, fmt=None, png_compression=DEFAULT_PNG_COMPRESSION, jpeg_quality=DEFAULT_JPEG_QUALITY, progress=DEFAULT_PROGRESS_INTERVAL):
+    if not os.path.exists(os.path.join(path, "transformed")):
+        os.mkdir(os.path.join(path, "transformed"))
+
+    # Create transform matrix once, frames in a sequence share their dimensions
+    height, width, channels = cv2.imread(os.path.join(path, im_files[0])).shape
+    matrix = transform_matrix(coords, width, height)
+
+    start = time.time()
+    completed = True
+    skipped = []
+    workers = workers or os.cpu_count()
+    window = workers * QUEUE_PER_WORKER
+    pool = ThreadPoolExecutor(max_workers=workers)
+    pending = deque()
+    next_i = 0
+    for i in range(len(im_files)):
+        # Keep window of images submitted ahead
+        while len(pending) < window and next_i < len(im_files):
+            keep = show and next_i % window == 0
+            pending.append(pool.submit(warp_image, path, im_files[next_i], matrix, (width, height), fmt, png_compression, jpeg_quality, keep))
+            next_i += 1
+        read, image = pending.popleft().result()
+        if not read:
+            logging.warning("Could not read image '{0}', skipping...".format(im_files[i]))
+            skipped.append(im_files[i])
+
+        # Estimating time to process from overall rate
+        elapsed = time.time() - start
+        est_total = (elapsed / (i + 1)) * len(im_files)
+        est_str = "{0}:{1} elapsed of {2}:{3}".format(str(math.floor(elapsed / 60)).zfill(2), str(math.floor(elapsed % 60)).zfill(2), str(math.floor(est_total / 60)).zfill(2), str(math.floor(est_total % 60)).zfill(2))
+
+        if show:
+            # Showing most recently kept image
+            if image is not None:
+                cv2.putText(image, "Processed image {0} out of {1}".format(i + 1, len(im_files)), (0, height - 10), FONT, 1, (0, 0, 255), 2)
+                cv2.putText(image, est_str, (0, height - 50), FONT, 1, (0, 0, 255), 2)
+                cv2.imshow(WINDOW, image)
+
+            # Checking if user quitting
+            key = cv2.waitKey(1) & 0xFF
+            if key == ord("q"):
+                logging.info("Stopping processing...")
+                completed = False
+                break
+        elif progress and (i + 1) % progress == 0:
+            logging.info("Processed image {0} of {1}, {2}".format(i + 1, len(im_files), est_str))
+    pool.shutdown(wait=True, cancel_futures=True)
+    if len(skipped) > 0:
+        logging.warning("Skipped {0} unreadable images: {1}".format(len(skipped), ", ".join(skipped)))
+    return completed
 
 # -----------------------------------
 
 # Setting up argument parser
 parser = argparse.ArgumentParser(description="Perspective transform image sequences using OpenCV")
 parser.add_argument("path", help="Path to folder with frames")
+parser.add_argument("-c", "--corners", help="Path to json file with the four canvas corners, skips clicking corners")
+parser.add_argument("-a", "--auto", action="store_true", help="Detect canvas corners automatically when no corner file is found")
+parser.add_argument("-hl", "--headless", action="store_true", help="Run without any window, corners are taken from corner files or detected")
+parser.add_argument("-w", "--workers", type=int, help="Number of images warped and written in parallel, defaults to number of cores")
+parser.add_argument("-fmt", "--format", choices=["png", "jpg", "bmp"], help="Output image format, defaults to format of input images")
+parser.add_argument("-pc", "--png-compression", type=int, default=DEFAULT_PNG_COMPRESSION, help="PNG compression level for output, from 0 to 9, defaults to {0}".format(DEFAULT_PNG_COMPRESSION))
+parser.add_argument("-jq", "--jpeg-quality", type=int, default=DEFAULT_JPEG_QUALITY, help="JPEG quality for output, from 0 to 100, defaults to {0}".format(DEFAULT_JPEG_QUALITY))
+parser.add_argument("-pi", "--progress-interval", type=int, default=DEFAULT_PROGRESS_INTERVAL, help="Log progress every given number of images when headless, 0 disables, defaults to {0}".format(DEFAULT_PROGRESS_INTERVAL))
 parser.add_argument("-d", "--debug", action="store_true", help="Show debug information")
 args = vars(parser.parse_args())
 
@@ -63,10 +147,7 @@ if not os.path.exists(args['path']) or not os.path.isdir(args['path']):
     sys.exit(1)
 
 # Ignore all files that are not images
-im_files = os.listdir(args['path'])
-logging.debug("Files in folder: {0}".format(", ".join(im_files)))
-im_files = list(filter(lambda i : any([i.endswith(e) for e in IMAGE_ENDINGS]), im_files))
-im_files.sort(key = lambda x : strip_frame_number(IMAGE_PREFIX, x))
+im_files = list_frames(args['path'], IMAGE_PREFIX)
 logging.debug("Image files in folder: {0}".format(", ".join(im_files)))
 
 # Checking that folder still contains image files after filtering
@@ -75,7 +156,19 @@ if len(im_files) == 0:
     sys.exit(1)
 
 image = cv2.imread(os.path.join(args['path'], im_files[0]))
-coords = []    
+encoding = { 'workers': args['workers'], 'fmt': args['format'], 'png_compression': args['png_compression'], 'jpeg_quality': args['jpeg_quality'], 'progress': args['progress_interval'] }
+
+# Headless processing, no window is created
+if args['headless'] or args['corners'] or args['auto']:
+    coords = resolve_corners(args['path'], image, args['corners'], args['auto'])
+    if coords is None:
+        logging.warning("No corners found for given folder! Exiting...")
+        sys.exit(1)
+    transform_images(args['path'], im_files, coords, **encoding)
+    logging.info("Processing complete.")
+    sys.exit(0)
+
+coords = []
 
 # Create OpenCV window, register function to handle mouse clicks
 cv2.namedWindow(WINDOW, cv2.WINDOW_NORMAL)
@@ -86,63 +179,27 @@ while True:
     cv2.imshow(WINDOW, image)
     # Wait for either 'r' or 'p' key
     key = cv2.waitKey(1) & 0xFF
+    height, width, channels = image.shape
     if key == ord("r"):
         # Reset coordinates on R key
         coords.clear()
-        height, width, channels = image.shape
         image = cv2.imread(os.path.join(args['path'], im_files[0]))
         cv2.putText(image, "ROI reset.", (0, height - 10), FONT, 1, (0, 0, 255), 2)
     elif key == ord("p"):
         # Process image frames
         if len(coords) == 4:
-            if not os.path.exists(os.path.join(args['path'], "transformed")):
-                os.mkdir(os.path.join(args['path'], "transformed"))
-            times = []
-            est_total = 0
-            for i, im in enumerate(im_files):
-                # Start time for processing frame
-                start = time.time()
-                image = cv2.imread(os.path.join(args['path'], im))
-                height, width, channels = image.shape
-                image_coords = np.float32([[0, 0], [0, height], [width, 0], [width, height]])
-                transform_coords = np.float32(order_points(coords))
-                
-                # Create transform matrix and apply to image
-                matrix = cv2.getPerspectiveTransform(transform_coords, image_coords)
-                image = cv2.warpPerspective(image, matrix, (width, height))
-                image = cv2.resize(image, (width, height))
-
-                # Writing transformed image to transformed/
-                cv2.imwrite(os.path.join(args['path'], "transformed", im), image)
-                cv2.putText(image, "Processing image {0} out of {1}".format(i + 1, len(im_files)), (0, height - 10), FONT, 1, (0, 0, 255), 2)
-                
-                # Estimating time to process
-                end = time.time()
-                times.append(end - start)
-                elapsed = sum(times)
-                if i % 4 == 0:
-                    est_total = (sum(times) / len(times)) * (len(im_files) - i) + elapsed
-                est_str = "{0}:{1} elapsed of {2}:{3}".format(str(math.floor(elapsed / 60)).zfill(2), str(math.floor(elapsed % 60)).zfill(2), str(math.floor(est_total / 60)).zfill(2), str(math.floor(est_total % 60)).zfill(2))
-                cv2.putText(image, est_str, (0, height - 50), FONT, 1, (0, 0, 255), 2)
-
-                # Showing processed image
-                cv2.imshow(WINDOW, image)
-
-                # Checking if user quitting
-                key = cv2.waitKey(1) & 0xFF
-                if key == ord("q"):
-                    logging.info("Stopping processing...")
-                    coords.clear()
-                    image = cv2.imread(os.path.join(args['path'], im_files[0]))
-                    cv2.putText(image, "Processing stopped.", (0, height - 5), FONT, 1, (0, 0, 255), 2)
-                    cv2.imshow(WINDOW, image)
-                    break
-            # Display original image when completed
+            # Save clicked corners so the folder can be reprocessed headless
+            save_corners(corners_sidecar(args['path']), coords)
+            completed = transform_images(args['path'], im_files, coords, show=True, **encoding)
             image = cv2.imread(os.path.join(args['path'], im_files[0]))
-            cv2.putText(image, "Processing complete.", (0, height - 10), FONT, 1, (0, 0, 255), 2)
+            if completed:
+                # Display original image when completed
+                cv2.putText(image, "Processing complete.", (0, height - 10), FONT, 1, (0, 0, 255), 2)
+            else:
+                coords.clear()
+                cv2.putText(image, "Processing stopped.", (0, height - 5), FONT, 1, (0, 0, 255), 2)
     elif key == ord("q"):
         # Quit program on Q key
         logging.info("Quitting...")
         break
 cv2.destroyAllWindows()
-
@@ -2,13 +2,19 @@
 import cv2
 import numpy as np
 import sys, os, argparse, logging, time, math
+from calibration import order_points, save_corners, corners_sidecar, resolve_corners, sample_frame, transform_matrix, output_size, save_scale, scale_sidecar
 
 WINDOW = 'Perspective Transformation (video) - OpenCV'
 WINDOW_SIZE = (1300, 900)
 FONT = cv2.FONT_HERSHEY_SIMPLEX
 FOURCC = cv2.VideoWriter_fourcc(*'mp4v')
+DEFAULT_REAL_WIDTH = 27.94
+DEFAULT_REAL_HEIGHT = 21.59
+DEFAULT_UNITS = "cm"
+OUTPUT_NAME = 'perspective-output.mp4'
+SKIP_ENDINGS = (OUTPUT_NAME, 'track-output.mp4')
 
-# --------- UTILITY METHODS --------- 
+# --------- UTILITY METHODS ---------
 
 # Callback method for cv2 mouse event
 def click_points(event, x, y, flags, params):
@@ -31,23 +37,100 @@ def click_points(event, x, y, flags, params):
 def dist(x1, y1, x2, y2):
     return math.sqrt(math.pow(x2 - x1, 2) + math.pow(y2 - y1, 2))
 
-# Orders coordinate points to top left, bottom left, top right, bottom right
-def order_points(coords, draw=False):
-    sortx = sorted(coords)
-    left = sortx[:2]
-    right = sortx[2:]
-    tl, bl = sorted(left, key=lambda k: [k[1], k[0]])
-    tr, br = sorted(right, key=lambda k: [k[1], k[0]])
-    if draw:
-        return [tl, tr, br, bl]
-    else:
-        return [tl, bl, tr, br]
+# Lists videos to transform in folder and its subfolders, skipping previous outputs
+def list_videos(folder):
+    videos = []
+    for root, dirs, files in os.walk(folder):
+        for f in sorted(files):
+            if f.endswith('.mp4') and not f.endswith(SKIP_ENDINGS):
+                videos.append(os.path.join(root, f))
+    return videos
+
+# Returns output path for transformed video, prefixed with video name if its folder holds several videos
+def output_path(path, videos):
+    folder, name = os.path.split(path)
+    siblings = [v for v in videos if os.path.split(v)[0] == folder]
+    if len(siblings) > 1:
+        return os.path.join(folder, "{0}-{1}".format(os.path.splitext(name)[0], OUTPUT_NAME))
+    return os.path.join(folder, OUTPUT_NAME)
+
+# Warps every frame of video with the given corners, returns False if user quit while processing.
+# Output is sized to the real canvas at given pixels per unit, or to the input resolution if not given
+def transform_video(path, coords, outname, show=False, pixels_per_unit=None, real_width=DEFAULT_REAL_WIDTH, real_height=DEFAULT_REAL_HEIGHT, units=DEFAULT_UNITS):
+    vs = cv2.VideoCapture(path)
+    frame_total = int(vs.get(cv2.CAP_PROP_FRAME_COUNT))
+    vs_fps = int(vs.get(cv2.CAP_PROP_FPS))
+    vw = None
+    matrix = None
+    times = []
+    est_total = 0
+    completed = True
+    while True:
+        # Read new frame
+        ret, frame = vs.read()
+        if not ret:
+            logging.info("Video stream ended...")
+            break
+        # Start timer
+        start = time.time()
+
+        # Grab frame number
+        frame_num = int(vs.get(cv2.CAP_PROP_POS_FRAMES))
+
+        # Create transform matrix and video writer on first frame, recording the output scale
+        if matrix is None:
+            height, width, _ = frame.shape
+            if pixels_per_unit:
+                width, height = output_size(real_width, real_height, pixels_per_unit)
+                save_scale(scale_sidecar(outname), real_width, real_height, units, width, height)
+                logging.info("Warping to {0}x{1} pixels ({2} pixels per {3})".format(width, height, pixels_per_unit, units))
+            matrix = transform_matrix(coords, width, height)
+            vw = cv2.VideoWriter(outname, FOURCC, vs_fps, (width, height))
+
+        logging.debug("Processing frame {0}...".format(frame_num))
+
+        # Apply transform matrix to image and write to videowriter stream
+        frame = cv2.warpPerspective(frame, matrix, (width, height))
+        vw.write(frame)
+
+        # Est remaining time
+        end = time.time()
+        times.append(end - start)
+        elapsed = sum(times)
+        if (frame_num - 1) % 4 == 0:
+            est_total = (sum(times) / len(times)) * (frame_total - frame_num) + elapsed
+        est_str = "{0}:{1} elapsed of {2}:{3}".format(str(math.floor(elapsed / 60)).zfill(2), str(math.floor(elapsed % 60)).zfill(2), str(math.floor(est_total / 60)).zfill(2), str(math.floor(est_total % 60)).zfill(2))
+
+        if show:
+            # Displaying frame progress and showing processed image
+            cv2.putText(frame, "Processing image {0} out of {1}".format(frame_num, frame_total), (0, height - 10), FONT, 1, (0, 0, 255), 2)
+            cv2.putText(frame, est_str, (0, height - 50), FONT, 1, (0, 0, 255), 2)
+            cv2.imshow(WINDOW, frame)
+
+            # Checking if user quitting
+            key = cv2.waitKey(1) & 0xFF
+            if key == ord('q'):
+                completed = False
+                break
+        elif (frame_num - 1) % 100 == 0:
+            logging.info("Processing frame {0} of {1}, {2}".format(frame_num, frame_total, est_str))
+    vs.release()
+    if vw:
+        vw.release()
+    return completed
 
 # -----------------------------------
 
 # Setting up argument parser
 parser = argparse.ArgumentParser(description="Perspective transform videos using OpenCV")
-parser.add_argument("path", help="Path to video, ending in .mp4")
+parser.add_argument("path", help="Path to video, ending in .mp4, or (headless) a folder of videos")
+parser.add_argument("-c", "--corners", help="Path to json file with the four canvas corners, skips clicking corners")
+parser.add_argument("-a", "--auto", action="store_true", help="Detect canvas corners automatically when no corner file is found")
+parser.add_argument("-hl", "--headless", action="store_true", help="Run without any window, corners are taken from corner files or detected")
+parser.add_argument("-ppu", "--pixels-per-unit", type=float, help="Warp canvas to this many pixels per real unit instead of the input resolution")
+parser.add_argument("-rw", "--real-width", type=float, default=DEFAULT_REAL_WIDTH, help="Real width of canvas, defaults to {0}".format(DEFAULT_REAL_WIDTH))
+parser.add_argument("-rh", "--real-height", type=float, default=DEFAULT_REAL_HEIGHT, help="Real height of canvas, defaults to {0}".format(DEFAULT_REAL_HEIGHT))
+parser.add_argument("-u", "--units", default=DEFAULT_UNITS, help="Units for canvas, defaults to '{0}'".format(DEFAULT_UNITS))
 parser.add_argument("-d", "--debug", action="store_true", help="Show debug information")
 args = vars(parser.parse_args())
 
@@ -59,28 +142,50 @@ if args.get("debug"):
     logging.getLogger().setLevel(logging.DEBUG)
 logging.debug("ARGS: {0}".format(args))
 
-# Check that path exists and ends in .mp4:
+# Check that path exists and ends in .mp4 (or is a folder):
 if not os.path.exists(args['path']):
     logging.warning("Given path does not exist! Exiting...")
     sys.exit(1)
-if not os.path.split(args['path'])[-1].endswith('.mp4'):
-    logging.warning("Given path does not point to a .mp4 file! Exiting...")
+from_folder = os.path.isdir(args['path'])
+if not from_folder and not os.path.split(args['path'])[-1].endswith('.mp4'):
+    logging.warning("Given path does not point to a .mp4 file or a folder! Exiting...")
     sys.exit(1)
 
+scaling = { 'pixels_per_unit': args['pixels_per_unit'], 'real_width': args['real_width'], 'real_height': args['real_height'], 'units': args['units'] }
+
+# Headless processing, no window is created
+if args['headless'] or args['corners'] or args['auto'] or from_folder:
+    videos = list_videos(args['path']) if from_folder else [args['path']]
+    if len(videos) == 0:
+        logging.warning("No videos found at given folder! Exiting...")
+        sys.exit(1)
+    failed = []
+    for i, path in enumerate(videos):
+        logging.info("Transforming video {0} of {1}: '{2}'...".format(i + 1, len(videos), path))
+        frame = None
+        if not args['corners'] and not os.path.exists(corners_sidecar(path)):
+            frame = sample_frame(path)
+        coords = resolve_corners(path, frame, args['corners'], args['auto'])
+        if coords is None:
+            logging.warning("No corners found for '{0}', skipping...".format(path))
+            failed.append(path)
+            continue
+        transform_video(path, coords, output_path(path, videos), **scaling)
+    logging.info("Transformed {0} of {1} videos.".format(len(videos) - len(failed), len(videos)))
+    if len(failed) > 0:
+        logging.warning("Videos without corners: {0}".format(", ".join(failed)))
+    sys.exit(0)
+
 # Set up globals for processing loop
 vs = cv2.VideoCapture(args['path'])
 ret, frame = vs.read()
+vs.release()
 if not ret:
     logging.warning("Error occurred reading video file! Exiting...")
     sys.exit(1)
 first_frame = frame.copy()
 height, width, _ = frame.shape
-frame_total = int(vs.get(cv2.CAP_PROP_FRAME_COUNT))
-vs_fps = int(vs.get(cv2.CAP_PROP_FPS))
-outname = list(os.path.split(args['path']))
-outname[-1] = 'perspective-output.mp4'
-outname = os.path.join(*outname)
-vw = cv2.VideoWriter(outname, FOURCC, vs_fps, (width, height))
+outname = os.path.join(os.path.split(args['path'])[0], OUTPUT_NAME)
 coords = []
 quit = False
 in_progress = True
@@ -104,59 +209,10 @@ while in_progress:
     elif key == ord('p'):
         # Process frames
         if len(coords) == 4:
-            #frame = first_frame.copy()
-            vs.set(cv2.CAP_PROP_POS_FRAMES, 0)
-            times = []
-            est_total = 0
-            while True:
-                
-                # Read new frame
-                ret, frame = vs.read()
-                if not ret:
-                    logging.info("Video stream ended...")
-                    in_progress = False
-                    break
-                # Start timer
-                start = time.time()
-
-                # Grab frame number and frame dims
-                frame_num = int(vs.get(cv2.CAP_PROP_POS_FRAMES))
-                height, width, _ = frame.shape
-
-                logging.info("Processing frame {0}...".format(frame_num))
-                
-                # Set up coords for transformation
-                image_coords = np.float32([[0, 0], [0, height], [width, 0], [width, height]])
-                transform_coords = np.float32(order_points(coords))
-
-                # Create transform matrix and apply to image
-                matrix = cv2.getPerspectiveTransform(transform_coords, image_coords)
-                frame = cv2.warpPerspective(frame, matrix, (width, height))
-                frame = cv2.resize(frame, (width, height))
-
-                # Writing transformed image to videowriter stream
-                vw.write(frame)
-
-                # Displaying frame progress
-                cv2.putText(frame, "Processing image {0} out of {1}".format(frame_num, frame_total), (0, height - 10), FONT, 1, (0, 0, 255), 2)
-
-                # Est remaining time and showing on frame
-                end = time.time()
-                times.append(end - start)
-                elapsed = sum(times)
-                if (frame_num - 1) % 4 == 0:
-                    est_total = (sum(times) / len(times)) * (frame_total - frame_num) + elapsed
-                est_str = "{0}:{1} elapsed of {2}:{3}".format(str(math.floor(elapsed / 60)).zfill(2), str(math.floor(elapsed % 60)).zfill(2), str(math.floor(est_total / 60)).zfill(2), str(math.floor(est_total % 60)).zfill(2))
-                cv2.putText(frame, est_str, (0, height - 50), FONT, 1, (0, 0, 255), 2)
-
-                # Showing processed image
-                cv2.imshow(WINDOW, frame)
-
-                # Checking if user quitting
-                key = cv2.waitKey(1) & 0xFF
-                if key == ord('q'):
-                    quit = True
-                    break
+            # Save clicked corners so the video can be reprocessed headless
+            save_corners(corners_sidecar(args['path']), coords)
+            quit = not transform_video(args['path'], coords, outname, show=True, **scaling)
+            in_progress = False
 
     elif key == ord('q') or quit:
         # Quit program on Q key
@@ -164,6 +220,4 @@ while in_progress:
         break
 # Print bell character upon completion
 print('\a')
-vs.release()
-vw.release()
 cv2.destroyAllWindows()
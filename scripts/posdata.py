@@ -0,0 +1,706 @@
+#! python3
+import os, sys, re, copy, json, struct, mmap, warnings, hashlib, multiprocessing
+from collections import deque
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import parse_worker
+
+# Binary position data file: magic, header length (uint32), json header with canvas/dtype/shape,
+# then positions as one C-ordered array of objects x frames x 2 (X, Y), aligned so it can be memory-mapped.
+# Positions are either in canvas units (floats, NaN when missing), or integer pixel coordinates (MISSING_PIXEL when
+# missing) if the canvas has a 'scale' of [units per pixel in X, units per pixel in Y], in json files as well
+MAGIC = b"POSDATA\x00"
+VERSION = 1
+BINARY_EXT = ".npos"
+RUNS_EXT = ".nrun"
+JSON_EXT = ".json"
+DATASET_SUFFIX = ".dataset.json"
+ALIGN = 64
+DEFAULT_DTYPE = "float64"
+CHUNK_FRAMES = 65536 # Frames copied at a time when writing views of other files
+HASH_CHUNK = 1 << 20 # Bytes read at a time when hashing files
+PREFETCH_FILES = 2 # Files parsed ahead per worker while earlier files of a manifest are processed
+MISSING_PIXEL = -1 # Pixel position of an object that was not found in a frame
+FIXED_POINT_STEP = 0.001 # Units per step of fixed-point positions, tracked positions in units were rounded to 3 decimals
+JSON_WHITESPACE = b" \t\r\n"
+JSON_KEY = re.compile(rb'\s*"((?:[^"\\]|\\.)*)"\s*:\s*')
+JSON_TOKEN = re.compile(rb'"(?:[^"\\]|\\.)*"|[\[\]{}]')
+JSON_SCALAR = re.compile(rb'"(?:[^"\\]|\\.)*"|[^,}\]]*')
+
+# --------- UTILITY METHODS ---------
+
+# Returns path of binary position data file next to given json file (or the other way around)
+def binary_path(path):
+    return os.path.splitext(path)[0] + BINARY_EXT
+
+def json_path(path):
+    return os.path.splitext(path)[0] + JSON_EXT
+
+# Returns true if path points to a binary position data file
+def is_binary(path):
+    return path.endswith(BINARY_EXT)
+
+# Returns path of run-length encoded position data file next to given file
+def runs_path(path):
+    return os.path.splitext(path)[0] + RUNS_EXT
+
+# Returns true if path points to a run-length encoded position data file
+def is_runs(path):
+    return path.endswith(RUNS_EXT)
+
+# Returns path of file read for position data at path, an up to date binary file next to a json file if there is one
+def source_path(path):
+    bin_path = binary_path(path)
+    if not is_binary(path) and os.path.exists(bin_path) and os.path.getmtime(bin_path) >= os.path.getmtime(path):
+        return bin_path
+    return path
+
+# Returns true if path points to a json, binary or run-length encoded position data file (or a virtual dataset)
+def is_pos_data(path):
+    return path.endswith(JSON_EXT) or is_binary(path) or is_runs(path)
+
+# Returns true if path points to a virtual dataset descriptor
+def is_dataset(path):
+    return path.endswith(DATASET_SUFFIX)
+
+# Returns sha1 hex digest of the content of a file, read in chunks
+def file_hash(path):
+    sha = hashlib.sha1()
+    with open(path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(HASH_CHUNK), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+# Parses frame range, either "SEEK-TO" (as in trimmed file names) or [seek, to], into a [start, stop) range
+# of frame indices, matching the frames trim_positions.py keeps
+def parse_range(frames):
+    if isinstance(frames, str):
+        seek, to = [int(v) for v in frames.split("-")]
+    else:
+        seek, to = frames
+    return (seek - 1, to - 1)
+
+# Returns value marking missing positions in an array of given dtype, NaN for floats and MISSING_PIXEL for pixels
+def missing_value(dtype):
+    return np.nan if np.dtype(dtype).kind == 'f' else MISSING_PIXEL
+
+# Returns smallest integer dtype that holds pixel coordinates up to max_pixel
+def pixel_dtype(max_pixel):
+    return "int16" if max_pixel <= np.iinfo(np.int16).max else "int32"
+
+# Converts (objects x) frames x 2 pixel positions to canvas units in one step, missing positions become NaN
+def to_units(positions, scale):
+    units = positions * np.asarray(scale, dtype=np.float64)
+    units[(positions == MISSING_PIXEL).any(axis=-1)] = np.nan
+    return units
+
+# Encodes frames x 2 positions as runs of repeated positions (a resting bean), returns run starts, run lengths and the
+# position of every run (runs x 2). Consecutive missing frames form one run with a missing position
+def encode_runs(positions):
+    positions = np.asarray(positions)
+    if len(positions) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), positions[:0]
+    valid = valid_mask(positions)
+    same = (positions[1:] == positions[:-1]).all(axis=1) | (~valid[1:] & ~valid[:-1])
+    starts = np.flatnonzero(np.concatenate(([True], ~same)))
+    lengths = np.diff(np.append(starts, len(positions)))
+    return starts, lengths, positions[starts]
+
+# Expands runs (lengths, positions) back to frames x 2 positions
+def expand_runs(lengths, positions):
+    return np.repeat(positions, lengths, axis=0)
+
+# Returns starts, lengths and positions of runs clipped to a [start, stop) frame range, with starts relative to it
+def clip_runs(starts, lengths, positions, start, stop):
+    first = max(0, np.searchsorted(starts, start, side='right') - 1)
+    last = np.searchsorted(starts, stop, side='left')
+    ends = np.minimum(starts[first:last] + lengths[first:last], stop)
+    clipped = np.maximum(starts[first:last], start)
+    return clipped - start, ends - clipped, positions[first:last]
+
+# Converts positions in units to fixed-point integers of FIXED_POINT_STEP, stored like pixel positions with a scale
+# of FIXED_POINT_STEP. Returns positions and scale, or None if positions are negative and can not be stored this way
+def to_fixed(positions, step=FIXED_POINT_STEP):
+    valid = valid_mask(positions)
+    if (positions[valid] < 0).any():
+        return None, None
+    fixed = np.full(positions.shape, MISSING_PIXEL, dtype=np.int64)
+    fixed[valid] = np.round(positions[valid] / step)
+    max_pixel = int(fixed.max()) if fixed.size > 0 else 0
+    return fixed.astype(pixel_dtype(max_pixel)), [step, step]
+
+# Builds objects x frames x 2 array from json objects, shorter objects are padded with NaN (or MISSING_PIXEL)
+def objects_to_array(objects, dtype=DEFAULT_DTYPE):
+    frames = max([len(o['X']) for o in objects]) if len(objects) > 0 else 0
+    positions = np.full((len(objects), frames, 2), missing_value(dtype), dtype=dtype)
+    for i, o in enumerate(objects):
+        positions[i, :len(o['X']), 0] = o['X']
+        positions[i, :len(o['Y']), 1] = o['Y']
+    return positions
+
+# Returns number of frames of each object in objects x frames x 2 array, ignoring NaN padding at the end
+def array_lengths(positions):
+    lengths = []
+    for obj in positions:
+        valid = np.flatnonzero(valid_mask(obj))
+        lengths.append(int(valid[-1]) + 1 if len(valid) > 0 else 0)
+    return lengths
+
+# Builds json objects from objects x frames x 2 array, dropping padding at the end of each object
+def array_to_objects(positions, lengths=None):
+    if lengths is None:
+        lengths = array_lengths(positions)
+    return [{ 'X': obj[:n, 0].tolist(), 'Y': obj[:n, 1].tolist() } for obj, n in zip(positions, lengths)]
+
+# Returns objects x frames mask of frames where an object's position is known, i.e. not missing (NaN or
+# MISSING_PIXEL) or padding
+def valid_mask(positions):
+    positions = np.asarray(positions)
+    if positions.dtype.kind != 'f':
+        return (positions != MISSING_PIXEL).all(axis=-1)
+    return ~np.isnan(positions).any(axis=-1)
+
+# Returns distances moved between consecutive frames of an object, NaN where either frame is missing
+def step_displacements(x, y):
+    return np.hypot(np.diff(np.asarray(x, dtype=float)), np.diff(np.asarray(y, dtype=float)))
+
+# Returns squared displacements between frames lag apart of an object, only for pairs where both frames are known
+def squared_displacements(x, y, lag):
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    dx = x[lag:] - x[:len(x) - lag]
+    dy = y[lag:] - y[:len(y) - lag]
+    sd = dx * dx + dy * dy
+    return sd[~np.isnan(sd)]
+
+# Returns sum of arrays of possibly different shapes (but the same number of dimensions), the smaller one padded with
+# zeros
+def add_arrays(a, b):
+    if a is None:
+        return np.array(b)
+    a = np.asarray(a)
+    b = np.asarray(b)
+    total = np.zeros(np.maximum(a.shape, b.shape), dtype=np.result_type(a, b))
+    total[tuple(slice(0, n) for n in a.shape)] += a
+    total[tuple(slice(0, n) for n in b.shape)] += b
+    return total
+
+# Returns position of next non-whitespace character in json buffer
+def skip_whitespace(buf, pos):
+    while pos < len(buf) and buf[pos] in JSON_WHITESPACE:
+        pos += 1
+    return pos
+
+# Returns end of json value starting at pos in buffer, jumping between brackets and strings only
+def value_end(buf, pos):
+    if buf[pos:pos + 1] not in (b"[", b"{"):
+        return JSON_SCALAR.match(buf, pos).end()
+    depth = 0
+    for m in JSON_TOKEN.finditer(buf, pos):
+        token = m.group()
+        if token in (b"[", b"{"):
+            depth += 1
+        elif token in (b"]", b"}"):
+            depth -= 1
+            if depth == 0:
+                return m.end()
+    raise ValueError("Unterminated json value")
+
+# Finds byte ranges of the X and Y number arrays of every object in a json position data buffer, and loads
+# every other top level value (i.e., canvas). Returns [{ 'X': (start, end), 'Y': (start, end) }, ...] and the other values
+def scan_json(buf):
+    pos = skip_whitespace(buf, 0)
+    if buf[pos:pos + 1] != b"{":
+        raise ValueError("Position data is not a json object")
+    pos += 1
+    spans = None
+    values = {}
+    while True:
+        pos = skip_whitespace(buf, pos)
+        if buf[pos:pos + 1] == b"}":
+            break
+        m = JSON_KEY.match(buf, pos)
+        if m is None:
+            raise ValueError("Expected key at byte {0}".format(pos))
+        key = m.group(1).decode()
+        pos = m.end()
+        if key == "objects":
+            spans, pos = scan_objects(buf, pos)
+        else:
+            end = value_end(buf, pos)
+            values[key] = json.loads(buf[pos:end])
+            pos = end
+        pos = skip_whitespace(buf, pos)
+        if buf[pos:pos + 1] == b",":
+            pos += 1
+    if spans is None:
+        raise ValueError("Position data has no objects")
+    return spans, values
+
+# Scans list of objects starting at pos, returns byte ranges of their arrays and end of list
+def scan_objects(buf, pos):
+    if buf[pos:pos + 1] != b"[":
+        raise ValueError("Expected list of objects at byte {0}".format(pos))
+    pos += 1
+    spans = []
+    while True:
+        pos = skip_whitespace(buf, pos)
+        c = buf[pos:pos + 1]
+        if c == b"]":
+            return spans, pos + 1
+        elif c == b",":
+            pos += 1
+            continue
+        elif c != b"{":
+            raise ValueError("Expected object at byte {0}".format(pos))
+        pos += 1
+        obj = {}
+        while True:
+            pos = skip_whitespace(buf, pos)
+            c = buf[pos:pos + 1]
+            if c == b"}":
+                pos += 1
+                break
+            elif c == b",":
+                pos += 1
+                continue
+            m = JSON_KEY.match(buf, pos)
+            if m is None or buf[m.end():m.end() + 1] != b"[":
+                raise ValueError("Expected array at byte {0}".format(pos))
+            # Number arrays can not contain brackets, so the array ends at the next one
+            end = buf.find(b"]", m.end())
+            if end == -1:
+                raise ValueError("Unterminated array at byte {0}".format(m.end()))
+            obj[m.group(1).decode()] = (m.end() + 1, end)
+            pos = end + 1
+        if 'X' not in obj or 'Y' not in obj:
+            raise ValueError("Object without X and Y positions")
+        spans.append(obj)
+
+# Returns number of values in json number array between start and end of buffer
+def count_values(buf, start, end):
+    text = buf[start:end]
+    return text.count(b",") + 1 if text.strip() else 0
+
+# Returns given float positions, raising ValueError if any of them (ignoring NaN) is not a whole pixel
+def whole_pixels(values):
+    values = np.asarray(values, dtype="float64")
+    if np.any(np.mod(values[~np.isnan(values)], 1) != 0):
+        raise ValueError("Pixel position data has positions that are not whole pixels")
+    return values
+
+# Reads json position data in one pass straight into a preallocated objects x frames x 2 array, without
+# building Python lists of floats. The file is memory-mapped and only the array bounds are scanned before
+# each array is parsed directly into its place. Falls back to json.load for files it does not understand.
+# Pixel position data is parsed as floats and read as integers, in the smallest dtype that holds them,
+# so positions that are not whole pixels raise ValueError instead of being truncated.
+# Returns positions, frame count of each object and canvas
+def read_json_positions(path, dtype=DEFAULT_DTYPE):
+    try:
+        with open(path, "rb") as fp, mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            spans, values = scan_json(buf)
+            parse_dtype = dtype
+            if 'scale' in values.get('canvas', {}):
+                dtype, parse_dtype = "int32", "float64"
+            counts = [(count_values(buf, *o['X']), count_values(buf, *o['Y'])) for o in spans]
+            frames = max([max(c) for c in counts]) if len(counts) > 0 else 0
+            positions = np.full((len(spans), frames, 2), missing_value(dtype), dtype=dtype)
+            for i, (o, c) in enumerate(zip(spans, counts)):
+                for k, key in enumerate(('X', 'Y')):
+                    with warnings.catch_warnings():
+                        warnings.simplefilter("ignore", DeprecationWarning)
+                        values_k = np.fromstring(buf[o[key][0]:o[key][1]], dtype=parse_dtype, sep=",") if c[k] > 0 else []
+                    if len(values_k) != c[k]:
+                        raise ValueError("Could not parse positions of object {0}".format(i))
+                    if parse_dtype != dtype:
+                        values_k = whole_pixels(values_k)
+                    positions[i, :c[k], k] = values_k
+            return compact(positions, values.get('canvas', {})), [c[0] for c in counts], values.get('canvas', {})
+    except ValueError:
+        with open(path) as fp:
+            data = json.load(fp)
+        lengths = [len(o['X']) for o in data['objects']]
+        if 'scale' not in data['canvas']:
+            return objects_to_array(data['objects'], dtype), lengths, data['canvas']
+        positions = whole_pixels(objects_to_array(data['objects'], "float64"))
+        positions = np.where(np.isnan(positions), MISSING_PIXEL, positions).astype("int32")
+        return compact(positions, data['canvas']), lengths, data['canvas']
+
+# Returns pixel positions in the smallest integer dtype that holds them, positions in units are returned as they are
+def compact(positions, canvas):
+    if 'scale' not in canvas or positions.dtype.kind == 'f':
+        return positions
+    max_pixel = int(positions.max()) if positions.size > 0 else 0
+    return positions.astype(pixel_dtype(max_pixel), copy=False)
+
+# -----------------------------------
+
+# Writes binary position data header for positions of given shape and dtype
+def write_header(fp, canvas, dtype, shape, lengths=None, extra=None):
+    header = { 'version': VERSION, 'canvas': canvas, 'dtype': np.dtype(dtype).str, 'shape': [int(n) for n in shape] }
+    if lengths is not None and any([n != shape[1] for n in lengths]):
+        header['lengths'] = [int(n) for n in lengths]
+    if extra is not None:
+        header.update(extra)
+    header_bytes = json.dumps(header).encode()
+    # Padding header so positions start on an aligned offset
+    header_bytes += b" " * (-(len(MAGIC) + 4 + len(header_bytes)) % ALIGN)
+    fp.write(MAGIC)
+    fp.write(struct.pack("<I", len(header_bytes)))
+    fp.write(header_bytes)
+
+# Writes positions and canvas to binary position data file, with frame count of each object if they differ
+def write_positions(path, positions, canvas, dtype=None, lengths=None):
+    positions = np.ascontiguousarray(positions, dtype=dtype)
+    with open(path, "wb") as fp:
+        write_header(fp, canvas, positions.dtype, positions.shape, lengths)
+        fp.write(memoryview(positions).cast("B"))
+
+# Writes objects, each given as a list of (frames x 2) blocks that are joined, to a binary, run-length encoded or json
+# position data file (by extension). Blocks are copied CHUNK_FRAMES at a time, so views of memory-mapped files are
+# written without loading them, and each object ends up as one contiguous block in binary files. Run-length encoded
+# files are encoded one joined object at a time
+def write_blocks(path, objects, canvas, dtype=DEFAULT_DTYPE):
+    lengths = [sum([len(b) for b in blocks]) for blocks in objects]
+    frames = max(lengths) if len(lengths) > 0 else 0
+    if is_runs(path):
+        runs = [encode_runs(np.concatenate(blocks).astype(dtype, copy=False) if len(blocks) > 0 else np.empty((0, 2), dtype=dtype)) for blocks in objects]
+        write_encoded_runs(path, runs, canvas, dtype, (len(objects), frames, 2), lengths)
+    elif is_binary(path):
+        with open(path, "wb") as fp:
+            write_header(fp, canvas, dtype, (len(objects), frames, 2), lengths)
+            for blocks, n in zip(objects, lengths):
+                for b in blocks:
+                    for k in range(0, len(b), CHUNK_FRAMES):
+                        fp.write(memoryview(np.ascontiguousarray(b[k:k + CHUNK_FRAMES], dtype=dtype)).cast("B"))
+                # Padding shorter objects up to the frame count of the file
+                for k in range(n, frames, CHUNK_FRAMES):
+                    fp.write(memoryview(np.full((min(CHUNK_FRAMES, frames - k), 2), missing_value(dtype), dtype=dtype)).cast("B"))
+    else:
+        with open(path, "w+") as fp:
+            fp.write('{"objects": [')
+            for i, blocks in enumerate(objects):
+                obj = np.concatenate(blocks) if len(blocks) > 0 else np.empty((0, 2))
+                fp.write((", " if i > 0 else "") + json.dumps({ 'X': obj[:, 0].tolist(), 'Y': obj[:, 1].tolist() }))
+            fp.write('], "canvas": ' + json.dumps(canvas) + '}')
+
+# Reads header of binary position data file, returns header and offset of positions
+def read_header(path):
+    with open(path, "rb") as fp:
+        if fp.read(len(MAGIC)) != MAGIC:
+            raise ValueError("'{0}' is not a binary position data file".format(path))
+        length = struct.unpack("<I", fp.read(4))[0]
+        header = json.loads(fp.read(length).decode())
+    return header, len(MAGIC) + 4 + length
+
+# Reads positions (objects x frames x 2) from binary position data file, memory-mapped if mmap is set.
+# Returns positions and header
+def read_array(path, mmap=False):
+    header, offset = read_header(path)
+    shape = tuple(header['shape'])
+    if mmap and np.prod(shape) > 0:
+        positions = np.memmap(path, dtype=np.dtype(header['dtype']), mode='r', offset=offset, shape=shape)
+    else:
+        positions = np.fromfile(path, dtype=np.dtype(header['dtype']), count=int(np.prod(shape)), offset=offset).reshape(shape)
+    return positions, header
+
+# Writes objects of position data (i.e., PositionData) to a run-length encoded position data file. Same header as binary
+# files, with the number of runs of every object, then the lengths of all runs (int32) and their positions
+# (runs x 2, stored dtype), each aligned so they can be memory-mapped
+def write_runs(path, data):
+    runs = [encode_runs(data.raw(i)) for i in range(len(data.lengths))]
+    return write_encoded_runs(path, runs, data.canvas, data.positions.dtype, (len(data.lengths), data.frames(), 2), data.lengths)
+
+# Writes runs (starts, lengths, positions) of every object to a run-length encoded position data file, see write_runs.
+# Returns number of runs written
+def write_encoded_runs(path, runs, canvas, dtype, shape, lengths):
+    counts = [len(r[1]) for r in runs]
+    with open(path, "wb") as fp:
+        write_header(fp, canvas, dtype, shape, lengths, { 'encoding': "runs", 'runs': counts })
+        for starts, run_lengths, positions in runs:
+            fp.write(memoryview(np.ascontiguousarray(run_lengths, dtype=np.int32)).cast("B"))
+        fp.write(b"\x00" * (-(4 * sum(counts)) % ALIGN))
+        for starts, run_lengths, positions in runs:
+            fp.write(memoryview(np.ascontiguousarray(positions, dtype=dtype)).cast("B"))
+    return sum(counts)
+
+# Reads run-length encoded position data file, memory-mapped if mmap is set. Returns positions, as a RunArray that
+# expands runs only when they are accessed, and header
+def read_runs(path, mmap=False):
+    header, offset = read_header(path)
+    counts = header['runs']
+    total = sum(counts)
+    dtype = np.dtype(header['dtype'])
+    pos_offset = offset + 4 * total + (-(4 * total) % ALIGN)
+    if mmap and total > 0:
+        lengths = np.memmap(path, dtype=np.int32, mode='r', offset=offset, shape=(total,))
+        positions = np.memmap(path, dtype=dtype, mode='r', offset=pos_offset, shape=(total, 2))
+    else:
+        lengths = np.fromfile(path, dtype=np.int32, count=total, offset=offset)
+        positions = np.fromfile(path, dtype=dtype, count=2 * total, offset=pos_offset).reshape((total, 2))
+    bounds = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+    table = []
+    for i in range(len(counts)):
+        obj_lengths = lengths[bounds[i]:bounds[i + 1]]
+        starts = np.concatenate(([0], np.cumsum(obj_lengths[:-1], dtype=np.int64))).astype(np.int64)
+        table.append((starts, obj_lengths, positions[bounds[i]:bounds[i + 1]]))
+    return RunArray(table, header['shape'][1], dtype), header
+
+# Reads positions (objects x frames x 2) and canvas from binary position data file, memory-mapped if mmap is set
+def read_positions(path, mmap=False):
+    positions, header = read_array(path, mmap)
+    return positions, header['canvas']
+
+# Writes position data dict ({ 'objects', 'canvas' }) to binary position data file, pixel position data is
+# written in the smallest integer dtype that holds it
+def write_pos_data(path, pos_data, dtype=DEFAULT_DTYPE):
+    if 'scale' in pos_data['canvas']:
+        dtype = "int32"
+    positions = compact(objects_to_array(pos_data['objects'], dtype), pos_data['canvas'])
+    write_positions(path, positions, pos_data['canvas'], lengths=[len(o['X']) for o in pos_data['objects']])
+
+# Reads position data dict ({ 'objects', 'canvas' }) from json, binary or run-length encoded position data file
+def read_pos_data(path):
+    if is_runs(path):
+        return PositionData(path, False).to_dict()
+    if is_binary(path):
+        positions, header = read_array(path)
+        return { 'objects': array_to_objects(positions, header.get('lengths')), 'canvas': header['canvas'] }
+    with open(path) as fp:
+        return json.load(fp)
+
+# Opens position data for lazy reading, see PositionData. A virtual dataset opens the frames of its source
+# recording from the start of its first segment to the end of its last one
+def load_positions(path, mmap=True):
+    if is_dataset(path):
+        segments = load_dataset(path, mmap)
+        return segments[0].source_data.view(segments[0].start, segments[-1].start + segments[-1].frames())
+    return PositionData(path, mmap)
+
+# Loads virtual dataset descriptor, { "source": <position data file>, "segments": ["SEEK-TO", ...] }, as zero-copy
+# views of the source recording, one per valid frame range
+def load_dataset(path, mmap=True, parsed=None):
+    with open(path) as fp:
+        desc = json.load(fp)
+    data = PositionData(os.path.join(os.path.dirname(path), desc['source']), mmap, parsed)
+    ranges = [parse_range(r) for r in desc.get('segments', [])]
+    if len(ranges) == 0:
+        ranges = [(0, data.frames())]
+    return [data.view(start, stop) for start, stop in ranges]
+
+# Returns path of the source recording of a virtual dataset descriptor
+def dataset_source(path):
+    with open(path) as fp:
+        return os.path.join(os.path.dirname(path), json.load(fp)['source'])
+
+# Saves virtual dataset descriptor for source file (relative to the descriptor) and frame ranges ("SEEK-TO")
+def save_dataset(path, source, segments):
+    with open(path, "w+") as fp:
+        json.dump({ 'source': os.path.relpath(source, os.path.dirname(os.path.abspath(path))), 'segments': segments }, fp, indent=4)
+
+# Returns segments of position data, one view per valid frame range of a virtual dataset, or the whole file.
+# Analyses treat every segment like a separate file, so frames are never paired across a gap. Positions already
+# parsed from the json file (see read_json_positions) can be given
+def load_segments(path, mmap=True, parsed=None):
+    if is_dataset(path):
+        return load_dataset(path, mmap, parsed)
+    return [PositionData(path, mmap, parsed)]
+
+# Returns path of json file that has to be parsed to load position data at path (the source recording of a virtual
+# dataset), or None if it is read from a binary file
+def parsed_path(path):
+    if not os.path.exists(path):
+        return None
+    source = source_path(dataset_source(path) if is_dataset(path) else path)
+    return source if os.path.exists(source) and not is_binary(source) and not is_runs(source) else None
+
+# Returns pool of worker processes parsing json files with parse_worker.read_file. Processes are forked where forking
+# is available (and safe, not on macOS). Elsewhere they are spawned, which imports the main module in every worker, and
+# scripts run everything at the top level, so parse_worker stands in as the main module until every worker is started.
+# Workers wait for each other before taking tasks, so none is idle (and reused instead of starting one more) too early
+def parse_pool(workers):
+    if "fork" in multiprocessing.get_all_start_methods() and sys.platform != "darwin":
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"))
+    context = multiprocessing.get_context("spawn")
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=parse_worker.start, initargs=(context.Barrier(workers),))
+    main = sys.modules['__main__']
+    sys.modules['__main__'] = parse_worker
+    try:
+        list(pool.map(parse_worker.ready, range(workers)))
+    finally:
+        sys.modules['__main__'] = main
+    return pool
+
+# Yields (index, segment) for every segment of every given position data file, in order. Json files are parsed in a
+# pool of worker processes (parsing holds the GIL), PREFETCH_FILES per worker ahead of the file being processed, so
+# loading later files overlaps with processing earlier ones. Binary files are memory-mapped as they are reached.
+# Defaults to a worker for every core but the one processing, workers=0 (or a single json file) loads files in turn
+def load_ahead(paths, mmap=True, workers=None):
+    parse = [parsed_path(p) for p in paths]
+    workers = max((os.cpu_count() or 1) - 1, 0) if workers is None else workers
+    if workers == 0 or len([p for p in parse if p is not None]) < 2:
+        for i, path in enumerate(paths):
+            for segment in load_segments(path, mmap):
+                yield i, segment
+        return
+    with parse_pool(workers) as pool:
+        pending = deque()
+        next_i = 0
+        for i, path in enumerate(paths):
+            # Queue parsing of upcoming json files until prefetch window is full
+            while len(pending) < workers * PREFETCH_FILES and next_i < len(paths):
+                pending.append(pool.submit(parse_worker.read_file, parse[next_i]) if parse[next_i] is not None else None)
+                next_i += 1
+            parsed = pending.popleft()
+            for segment in load_segments(path, mmap, parsed.result() if parsed is not None else None):
+                yield i, segment
+
+# Yields (path, segment) for every segment of every given position data file, in order, parsing later json files
+# while earlier ones are processed (see load_ahead)
+def iter_segments(paths, mmap=True, workers=None):
+    paths = list(paths)
+    for i, segment in load_ahead(paths, mmap, workers):
+        yield paths[i], segment
+
+# Yields (entry, segment) for every segment of the position data file of every manifest entry, in manifest order,
+# parsing json files of later entries while earlier ones are processed (see load_ahead)
+def iter_manifest(entries, mmap=True, workers=None):
+    entries = list(entries)
+    for i, segment in load_ahead([f['path'] for f in entries], mmap, workers):
+        yield entries[i], segment
+
+# -----------------------------------
+
+# Position data read lazily, used the same way as a loaded json file (data['objects'][i]['X'], data['canvas']).
+# Binary files are memory-mapped, so only the objects and frame ranges that are accessed are read from disk.
+# For a json file, an up to date binary file next to it is used instead if there is one. Objects are always in
+# canvas units, pixel position data is converted as objects are accessed
+class PositionData:
+    def __init__(self, path, mmap=True, parsed=None):
+        self.path = path
+        self.source = source_path(path)
+        if is_binary(self.source) or is_runs(self.source):
+            self.positions, header = read_runs(self.source, mmap) if is_runs(self.source) else read_array(self.source, mmap)
+            self.canvas = header['canvas']
+            self.lengths = header.get('lengths', [self.positions.shape[1]] * self.positions.shape[0])
+        elif parsed is not None:
+            self.positions, self.lengths, self.canvas = parsed
+        else:
+            self.positions, self.lengths, self.canvas = read_json_positions(self.source)
+        # Pixel positions stay compact in memory and are converted to units one object at a time
+        self.scale = self.canvas.get('scale') if self.positions.dtype.kind != 'f' else None
+        self.start = 0
+        self.source_data = self
+        self.objects = ObjectList(self)
+
+    def __getitem__(self, key):
+        if key == 'objects':
+            return self.objects
+        elif key == 'canvas':
+            return self.canvas
+        raise KeyError(key)
+
+    # Returns number of frames (of the longest object)
+    def frames(self):
+        return self.positions.shape[1]
+
+    # Returns objects x frames mask of known positions, missing frames and padding are False
+    def mask(self):
+        return valid_mask(self.positions)
+
+    # Returns stored positions of object (pixels for pixel position data) as a frames x 2 view, optionally limited
+    # to a frame range
+    def raw(self, i, start=0, stop=None):
+        stop = self.lengths[i] if stop is None else min(stop, self.lengths[i])
+        return self.positions[i, start:stop]
+
+    # Returns positions of object in canvas units as frames x 2, optionally limited to a frame range. A view
+    # for position data in units, pixel position data is converted in one vectorized step
+    def object(self, i, start=0, stop=None):
+        positions = self.raw(i, start, stop)
+        return to_units(positions, self.scale) if self.scale is not None else positions
+
+    # Returns runs of repeated positions of object in canvas units as { 'start', 'length', 'X', 'Y' }, straight from
+    # a run-length encoded file or encoded from its frames
+    def runs(self, i):
+        if isinstance(self.positions, RunArray):
+            starts, lengths, positions = self.positions.runs(i, self.lengths[i])
+        else:
+            starts, lengths, positions = encode_runs(self.raw(i))
+        if self.scale is not None:
+            positions = to_units(positions, self.scale)
+        return { 'start': starts, 'length': lengths, 'X': positions[:, 0], 'Y': positions[:, 1] }
+
+    # Returns a zero-copy view of a [start, stop) frame range, used the same way as the whole file
+    def view(self, start, stop=None):
+        stop = self.frames() if stop is None else max(start, min(stop, self.frames()))
+        view = copy.copy(self)
+        view.positions = self.positions[:, start:stop]
+        view.lengths = [max(0, min(n, stop) - start) for n in self.lengths]
+        view.start = self.start + start
+        view.objects = ObjectList(view)
+        return view
+
+    # Returns position data as a json dict as stored (pixels for pixel position data), reading all objects
+    def to_dict(self):
+        return { 'objects': array_to_objects(self.positions, self.lengths), 'canvas': self.canvas }
+
+    # Drops positions, closing the memory map once no views of it are left
+    def close(self):
+        self.positions = None
+
+# Objects x frames x 2 positions of a run-length encoded file, used like the array of a binary file. Only the runs of
+# the objects and frame ranges that are accessed are expanded, and slicing frames returns another RunArray
+class RunArray:
+    def __init__(self, table, frames, dtype, start=0, stop=None):
+        self.table = table
+        self.dtype = np.dtype(dtype)
+        self.start = start
+        self.stop = frames if stop is None else stop
+        self.shape = (len(table), self.stop - self.start, 2)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __array__(self, dtype=None, copy=None):
+        positions = np.stack([self[i] for i in range(len(self))]) if len(self) > 0 else np.zeros(self.shape, dtype=self.dtype)
+        return positions.astype(dtype, copy=False) if dtype is not None else positions
+
+    # Returns runs of object i clipped to the frame range, and to the first n frames of it if given
+    def runs(self, i, n=None):
+        stop = self.stop if n is None else min(self.stop, self.start + n)
+        return clip_runs(*self.table[i], self.start, stop)
+
+    def __getitem__(self, key):
+        i, frames = key if isinstance(key, tuple) else (key, slice(None))
+        start, stop, step = frames.indices(self.shape[1])
+        if step != 1:
+            raise IndexError("frame slices of runs must be contiguous")
+        if isinstance(i, slice):
+            table = self.table[i]
+            return RunArray(table, 0, self.dtype, self.start + start, self.start + max(start, stop))
+        starts, lengths, positions = clip_runs(*self.table[i], self.start + start, self.start + max(start, stop))
+        return expand_runs(lengths, positions)
+
+# Objects of position data, each one is returned as { 'X', 'Y' } in canvas units only when accessed
+class ObjectList(Sequence):
+    def __init__(self, data):
+        self.data = data
+
+    def __len__(self):
+        return len(self.data.lengths)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if i < 0 or i >= len(self):
+            raise IndexError("object index out of range")
+        positions = self.data.object(i)
+        return { 'X': positions[:, 0], 'Y': positions[:, 1] }
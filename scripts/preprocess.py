@@ -2,6 +2,7 @@
 import sys, os, argparse, logging, time, math
 import numpy as np
 import cv2
+from frame_source import strip_frame_number
 
 # Script constants here
 IMAGE_PREFIX = "Image"
@@ -22,15 +23,6 @@ if args.get("debug"):
     logging.getLogger().setLevel(logging.DEBUG)
 logging.debug("ARGS: {0}".format(args)) # DEBUG
 
-# Strips number from frame filename using image prefix and returns number of frame
-def strip_frame_number(im_prefix, im_path):
-    im_path = im_path.lstrip(im_prefix).split(".")[0]
-    if im_path == "":
-        return 0
-    else:
-        return int(im_path)
-
-
 # Lists frames in order from frames folder
 def list_frames(frames_path):
     # Lists files in frames folder, sorts by frame number in file name
@@ -1,5 +1,6 @@
 #! python3
 import sys, os, argparse, logging, json
+from posdata import load_positions, is_pos_data, is_dataset, write_blocks
 
 # Setting up argument parser
 parser = argparse.ArgumentParser(description="")
@@ -16,32 +17,35 @@ if args.get("debug"):
     logging.getLogger().setLevel(logging.DEBUG)
 logging.debug("ARGS: {0}".format(args)) # DEBUG
 
-# Check that file at path exists and ends in .json
+# Check that file at path exists and is a position data file
 if not os.path.exists(args["path"]):
     logging.warning("Given path does not exist! Exiting...")
     sys.exit(1)
-if not os.path.split(args["path"])[-1].endswith(".json"):
-    logging.warning("Given path does not point to a .json file! Exiting...")
+if not is_pos_data(args["path"]):
+    logging.warning("Given path does not point to a .json, .npos or .nrun file! Exiting...")
+    sys.exit(1)
+# The selection is saved over the given file, which for a virtual dataset is only a descriptor of frame ranges
+if is_dataset(args["path"]):
+    logging.warning("Given path is a virtual dataset, select objects of its source recording instead! Exiting...")
     sys.exit(1)
 
-# Load position data from file
-objects = []
-canvas = {}
-with open(args['path']) as fp:
-    data = json.load(fp)
-    objects = data['objects']
-    canvas = data['canvas']
+# Open position data from file, binary files are memory-mapped and nothing is read yet
+data = load_positions(args['path'])
+canvas = data['canvas']
 
-# Select only objects
+# Select only objects, as views of the stored positions
 obj_i = [int(i) for i in args['objects'].split(",")]
 obj_i.sort()
-selected_objects = []
-for o in obj_i:
-    selected_objects.append(objects[o])
+if any([o < 0 or o >= len(data.lengths) for o in obj_i]):
+    logging.warning("Given object index is out of range, file has {0} objects! Exiting...".format(len(data.lengths)))
+    sys.exit(1)
+selected_objects = [[data.raw(o)] for o in obj_i]
 
-# Saves to same path as given, overwriting initial file
-pos_data = { 'objects': selected_objects, 'canvas': canvas }
-with open(args['path'], 'w+') as fp:
-    json.dump(pos_data, fp)
+# Saves to same path as given, overwriting initial file once the selection is written
+tmp_path = "{0}.tmp{1}".format(*os.path.splitext(args['path']))
+write_blocks(tmp_path, selected_objects, canvas, data.positions.dtype)
+del selected_objects
+data.close()
+os.replace(tmp_path, args['path'])
 logging.info("Saved position data with selected objects to '{0}'.".format(list(os.path.split(args['path']))[-1]))
 logging.info("Exiting...")
\ No newline at end of file
@@ -3,6 +3,7 @@ import sys, os, argparse, logging, json, random, time
 import math as m
 import numpy as np
 from scipy import stats as st
+from posdata import binary_path, write_pos_data
 
 # ----------------- CONSTANTS / GLOBALS -----------------
 
@@ -107,6 +108,7 @@ class Bean:
 parser = argparse.ArgumentParser(description='Simulate motion of beans over period of time, output position data file')
 parser.add_argument("-n", "--num-beans", type=int, required=True, help="Number of beans in simulation")
 parser.add_argument("-l", "--length", required=True, help="Time string representing length of simulation (i.e., '2h30m')")
+parser.add_argument("-of", "--output-format", choices=["json", "binary", "both"], default="both", help="Format of saved position data, json, binary (.npos) or both, defaults to both")
 parser.add_argument("-d", "--debug", action="store_true", help="Show debug information")
 args = vars(parser.parse_args())
 
@@ -155,10 +157,13 @@ for t in range(parse_time_string(args.get("length"))):
         objects[i]["Y"].append(b.pos[1])
         print("    Bean {0} - X: {1} Y: {2} Delay: {3} Disp: {4}".format(i, round(b.pos[0], 2), round(b.pos[1], 2), round(b.delay, 2), round(b.disp, 2)))
 
-pos_files = list(filter(lambda n : n.endswith(".json"), os.listdir("../experiments/simulations/")))
+pos_files = list(filter(lambda n : n.endswith(".json") or n.endswith(".npos"), os.listdir("../experiments/simulations/")))
 pos_files = list(map(lambda n : int(n.split(".")[0].split("_")[-1]), pos_files))
 
 pos_filename = "../experiments/simulations/pos_data_{0}.json".format(max(pos_files) + 1 if len(pos_files) > 0 else 0)
 
-with open(pos_filename, "w+") as fp:
-    json.dump({"canvas": canvas, "objects": objects}, fp)
\ No newline at end of file
+if args['output_format'] in ("json", "both"):
+    with open(pos_filename, "w+") as fp:
+        json.dump({"canvas": canvas, "objects": objects}, fp)
+if args['output_format'] in ("binary", "both"):
+    write_pos_data(binary_path(pos_filename), {"canvas": canvas, "objects": objects})
\ No newline at end of file
@@ -1,9 +1,7 @@
 from matplotlib import pyplot as plt
 import json, math
-
-# Returns distance between points
-def dist(x1, y1, x2, y2):
-    return math.sqrt(math.pow(x2 - x1, 2) + math.pow(y2 - y1, 2))
+from posdata import iter_segments
+from events import find_jumps
 
 set_prefix = "../experiments/"
 sizes = [6.527, 6.722, 7.087, 7.162, 12.017, 12.372, 13.089, 13.483]
@@ -19,50 +17,26 @@ sets = [
 ]
 
 def get_delays(set_files):
-    for f in set_files:
+    for f, data in iter_segments([set_prefix + f for f in set_files]):
         objects = []
         canvas = {}
-        with open(set_prefix + f) as fp:
-            data = json.load(fp)
-            objects = data['objects']
-            canvas = data['canvas']
+        objects = data['objects']
+        canvas = data['canvas']
         fps = int(canvas['fps'])
         units = canvas['units']
-        delays = []
-        x = objects[0]['X']
-        y = objects[0]['Y']
-        d = 1
-        for i in range(len(x) - 1):
-            disp = dist(x[i], y[i], x[i+1], y[i+1])
-            if disp < 0.1:
-                d += 1
-            else:
-                if d >= fps:
-                    delays.append(d)
-                    d = 1
+        # Jumps are found from runs of rest, without scanning every frame
+        delays = find_jumps(data.runs(0), 0.1, fps)['delay']
     return [int(d / fps) for d in delays]
 
 def get_disps(set_files):
-    for f in set_files:
+    for f, data in iter_segments([set_prefix + f for f in set_files]):
         objects = []
         canvas = {}
-        with open(set_prefix + f) as fp:
-            data = json.load(fp)
-            objects = data['objects']
-            canvas = data['canvas']
+        objects = data['objects']
+        canvas = data['canvas']
         fps = int(canvas['fps'])
-        disps = []
-        x = objects[0]['X']
-        y = objects[0]['Y']
-        d = 1
-        for i in range(len(x) - 1):
-            disp = dist(x[i], y[i], x[i+1], y[i+1])
-            if disp < 0.1:
-                d += 1
-            else:
-                if d >= fps:
-                    disps.append(disp)
-                    d = 1
+        # Jumps are found from runs of rest, without scanning every frame
+        disps = find_jumps(data.runs(0), 0.1, fps)['disp']
     return disps
 
 with plt.style.context('science'):
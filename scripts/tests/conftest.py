@@ -0,0 +1,5 @@
+#! python3
+import os, sys
+
+# Scripts are not a package, so tests import them from the scripts folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
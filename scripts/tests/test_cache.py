@@ -0,0 +1,72 @@
+#! python3
+import numpy as np
+from posdata import write_positions
+from cache import SetAccumulator, ResultCache
+
+CANVAS = { 'width': 100, 'height': 100, 'units': "cm", 'fps': 30 }
+
+# Writes binary position data of one object with given positions, returns its path
+def write_file(folder, name, positions):
+    path = str(folder / name)
+    write_positions(path, np.asarray(positions, dtype=float)[None], CANVAS)
+    return path
+
+# Returns compute function for update_set recording the entries it was called for in calls, with an array and a list
+def counting_compute(calls):
+    def compute(f, data):
+        calls.append(f['path'])
+        return { 'sums': np.asarray(data.raw(0)).sum(axis=0), 'frames': [data.frames()] }
+    return compute
+
+def test_set_accumulator_add_remove():
+    acc = SetAccumulator()
+    acc.add("a", { 'sums': np.array([1.0, 2.0]), 'events': [1] })
+    acc.add("b", { 'sums': np.array([3.0, 4.0, 5.0]), 'events': [2, 3] })
+    result = acc.result(["b", "a"])
+    assert result['sums'].tolist() == [4.0, 6.0, 5.0]
+    assert result['events'] == [2, 3, 1]
+    acc.remove("b")
+    result = acc.result(["a"])
+    assert result['sums'].tolist() == [1.0, 2.0]
+    assert result['events'] == [1]
+
+def test_update_set_add_retract_reload(tmp_path):
+    path_a = write_file(tmp_path, "a.npos", [[1, 2], [3, 4], [5, 6]])
+    path_b = write_file(tmp_path, "b.npos", [[10, 20], [30, 40]])
+    entry_a = { 'set': "hot", 'path': path_a }
+    entry_b = { 'set': "hot", 'path': path_b }
+    cache_path = str(tmp_path / "cache")
+    calls = []
+
+    single = ResultCache(cache_path).update_set("m.json", [entry_a], "sum", {}, counting_compute(calls))
+    assert single['sums'].tolist() == [9, 12] and single['frames'] == [3]
+    assert len(calls) == 1
+
+    # The same file listed twice counts twice, its result is taken from the cache rather than computed again
+    double = ResultCache(cache_path).update_set("m.json", [entry_a, entry_a], "sum", {}, counting_compute(calls))
+    assert np.array_equal(double['sums'], 2 * single['sums']) and double['frames'] == [3, 3]
+    assert len(calls) == 1
+
+    # Adding a file only computes the new one, retracting it gives back the totals of the remaining files
+    added, files = ResultCache(cache_path).update_set("m.json", [entry_a, entry_b], "sum", {}, counting_compute(calls), files=True)
+    assert added['sums'].tolist() == [49, 72] and added['frames'] == [3, 2]
+    assert [f['frames'] for f in files] == [[3], [2]]
+    assert calls == [path_a, path_b]
+    retracted = ResultCache(cache_path).update_set("m.json", [entry_a], "sum", {}, counting_compute(calls))
+    assert np.array_equal(retracted['sums'], single['sums']) and retracted['frames'] == [3]
+    assert len(calls) == 2
+
+def test_update_set_keeps_manifests_apart(tmp_path):
+    path_a = write_file(tmp_path, "a.npos", [[1, 2], [3, 4]])
+    path_b = write_file(tmp_path, "b.npos", [[10, 20]])
+    cache_path = str(tmp_path / "cache")
+    calls = []
+    caches = []
+    for i in range(2):
+        caches += [ResultCache(cache_path), ResultCache(cache_path)]
+        first = caches[-2].update_set("first.json", [{ 'set': "hot", 'path': path_a }], "sum", {}, counting_compute(calls))
+        second = caches[-1].update_set("second.json", [{ 'set': "hot", 'path': path_b }], "sum", {}, counting_compute(calls))
+        assert first['sums'].tolist() == [4, 6] and second['sums'].tolist() == [10, 20]
+    # Sets of the same name in both manifests are accumulated apart, so the second round reads no file results at all
+    assert calls == [path_a, path_b]
+    assert sum([c.hits + c.misses for c in caches[2:]]) == 0
@@ -0,0 +1,29 @@
+#! python3
+import numpy as np
+import pytest
+from msd import lag_schedule, msd_sums
+
+# Returns objects x frames x 2 random walks away from the origin, with missing frames and the last object shorter
+def random_walks(objects=3, frames=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    positions = 100 + np.cumsum(rng.normal(0, 0.5, (objects, frames, 2)), axis=1)
+    positions[0, 100:140] = np.nan
+    positions[1, rng.choice(frames, 300, replace=False)] = np.nan
+    positions[-1, frames * 2 // 3:] = np.nan
+    return positions
+
+@pytest.mark.parametrize("lags", [
+    lag_schedule(3000),
+    lag_schedule(3000, per_decade=10),
+    lag_schedule(3000, lags=[1, 2, 3, 7, 50, 333, 999, 1499]),
+    np.array([5, 2999, 4000])
+])
+def test_fft_matches_direct(lags):
+    positions = random_walks()
+    fft_sums, fft_counts = msd_sums(positions, lags, method="fft")
+    direct_sums, direct_counts = msd_sums(positions, lags, method="direct")
+    assert np.array_equal(fft_counts, direct_counts)
+    assert np.allclose(fft_sums, direct_sums, rtol=1e-9, atol=0)
+    # Only the scheduled lags are computed
+    others = np.setdiff1d(np.arange(fft_sums.shape[1]), lags)
+    assert not fft_counts[:, others].any() and not fft_sums[:, others].any()
@@ -0,0 +1,73 @@
+#! python3
+import os, sys, json, time, subprocess
+import numpy as np
+import pytest
+from posdata import MISSING_PIXEL, read_json_positions, load_ahead
+
+SCRIPTS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Writes json position data with given objects to a file in given folder, returning its path
+def write_json(folder, objects, canvas):
+    path = str(folder / "pos_data.json")
+    with open(path, "w") as fp:
+        json.dump({ 'objects': objects, 'canvas': canvas }, fp)
+    return path
+
+# Writes json position data files of random positions in units, returns their paths
+def write_json_files(folder, files, objects=2, frames=100000):
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(files):
+        objs = [{ 'X': rng.random(frames).round(3).tolist(), 'Y': rng.random(frames).round(3).tolist() } for k in range(objects)]
+        paths.append(str(folder / "pos_data_{0}.json".format(i)))
+        with open(paths[-1], "w") as fp:
+            json.dump({ 'objects': objs, 'canvas': { 'width': 1, 'height': 1 } }, fp)
+    return paths
+
+def test_read_json_pixels_are_integers(tmp_path):
+    path = write_json(tmp_path, [{ 'X': [1, 2.0, 3], 'Y': [4, 5, 6] }, { 'X': [7], 'Y': [8] }], { 'width': 10, 'height': 10, 'scale': 2 })
+    positions, lengths, canvas = read_json_positions(path)
+    assert positions.dtype.kind == 'i'
+    assert lengths == [3, 1]
+    assert positions[0].tolist() == [[1, 4], [2, 5], [3, 6]]
+    assert positions[1].tolist() == [[7, 8], [MISSING_PIXEL] * 2, [MISSING_PIXEL] * 2]
+
+def test_read_json_rejects_fractional_pixels(tmp_path):
+    path = write_json(tmp_path, [{ 'X': [1.5, 2], 'Y': [4, 5] }], { 'width': 10, 'height': 10, 'scale': 2 })
+    with pytest.raises(ValueError):
+        read_json_positions(path)
+
+def test_read_json_units_are_floats(tmp_path):
+    path = write_json(tmp_path, [{ 'X': [0.25, 0.5], 'Y': [0.75, None] }], { 'width': 10, 'height': 10 })
+    positions, lengths, canvas = read_json_positions(path)
+    assert positions[0, 0].tolist() == [0.25, 0.75]
+    assert positions[0, 1, 0] == 0.5 and np.isnan(positions[0, 1, 1])
+
+def test_load_ahead_overlaps_compute(tmp_path):
+    paths = write_json_files(tmp_path, 4)
+    start = time.time()
+    sequential = [s.frames() for i, s in load_ahead(paths, workers=0)]
+    parse_time = time.time() - start
+    # Processing each file takes as long as parsing it, without overlap the files would take twice the parse time
+    start = time.time()
+    overlapped = []
+    for i, segment in load_ahead(paths, workers=1):
+        time.sleep(parse_time / len(paths))
+        overlapped.append(segment.frames())
+    assert overlapped == sequential
+    assert time.time() - start < 1.75 * parse_time
+
+def test_load_ahead_spawned_workers(tmp_path):
+    paths = write_json_files(tmp_path, 3, frames=1000)
+    # Script forcing spawned workers, as on Windows and macOS, which must not be run again by the workers it starts
+    script = tmp_path / "script.py"
+    script.write_text("\n".join([
+        "import sys",
+        "sys.path.insert(0, {0!r})".format(SCRIPTS),
+        "sys.platform = 'darwin'",
+        "from posdata import load_ahead",
+        "print('started')",
+        "print([(i, s.frames()) for i, s in load_ahead({0!r}, workers=2)])".format(paths)
+    ]))
+    output = subprocess.run([sys.executable, str(script)], check=True, capture_output=True, text=True).stdout.splitlines()
+    assert output == ["started", "[(0, 1000), (1, 1000), (2, 1000)]"]
@@ -0,0 +1,50 @@
+#! python3
+import os, sys, subprocess
+import numpy as np
+from posdata import MISSING_PIXEL, load_positions, write_positions, write_runs, read_header, is_runs
+
+SCRIPTS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CANVAS = { 'width': 100, 'height': 100, 'scale': 10 }
+
+# Runs script from the scripts folder with given arguments, failing the test if it does not exit cleanly
+def run_script(name, *args, cwd=None):
+    subprocess.run([sys.executable, os.path.join(SCRIPTS, name)] + [str(a) for a in args], cwd=cwd, check=True, capture_output=True)
+
+# Writes run-length encoded pixel position data with repeated and missing positions, returns its path and positions
+def write_nrun(folder, name="pos_data.nrun", objects=3, frames=40, seed=0):
+    rng = np.random.default_rng(seed)
+    positions = np.repeat(rng.integers(0, 100, (objects, frames // 4, 2)), 4, axis=1).astype(np.int16)
+    positions[1, 10:15] = MISSING_PIXEL
+    npos_path = str(folder / (name + ".npos"))
+    write_positions(npos_path, positions, CANVAS)
+    path = str(folder / name)
+    write_runs(path, load_positions(npos_path))
+    os.remove(npos_path)
+    return path, positions
+
+# Returns stored positions of every object of position data file, checking it is still run-length encoded
+def read_nrun(path):
+    header, offset = read_header(path)
+    assert is_runs(path) and header.get('encoding') == "runs"
+    data = load_positions(path)
+    return [np.asarray(data.raw(i)) for i in range(len(data.lengths))]
+
+def test_trim_nrun(tmp_path):
+    path, positions = write_nrun(tmp_path)
+    run_script("trim_positions.py", path, "-ss", 5, "-to", 30, cwd=tmp_path)
+    trimmed = read_nrun(str(tmp_path / "pos_data_5-30.nrun"))
+    assert all([np.array_equal(t, p[4:29]) for t, p in zip(trimmed, positions)])
+
+def test_select_nrun(tmp_path):
+    path, positions = write_nrun(tmp_path)
+    run_script("select_objects.py", path, "-o", "0,2", cwd=tmp_path)
+    selected = read_nrun(path)
+    assert len(selected) == 2
+    assert np.array_equal(selected[0], positions[0]) and np.array_equal(selected[1], positions[2])
+
+def test_append_nrun(tmp_path):
+    path1, positions1 = write_nrun(tmp_path, "first.nrun", seed=1)
+    path2, positions2 = write_nrun(tmp_path, "second.nrun", frames=20, seed=2)
+    run_script("append_positions.py", path1, path2, cwd=tmp_path)
+    appended = read_nrun(str(tmp_path / "pos_data_appended.nrun"))
+    assert all([np.array_equal(a, np.concatenate((p1, p2))) for a, p1, p2 in zip(appended, positions1, positions2)])
@@ -0,0 +1,108 @@
+#! python3
+import numpy as np
+import cv2
+from detection import centroid_dist
+from posdata import MISSING_PIXEL
+
+FLOW_WIN_SIZE = (21, 21)
+FLOW_MAX_LEVEL = 2 # Small pyramids, beans barely move between detections unless they jump
+FLOW_MAX_ERROR = 30.0 # Mean pixel difference in flow window above which a point is considered lost
+FLOW_MAX_JUMP_PER = 0.01 # Percentage of width a point may move by flow before detection is used instead
+
+# --------- UTILITY METHODS ---------
+
+# Moves points from previous to current grayscale frame with pyramidal Lucas-Kanade optical flow.
+# Returns new positions, or None if any point was lost, has high flow error or moved further than max_jump
+def flow_positions(prev_gray, gray, positions, max_jump, max_error=FLOW_MAX_ERROR):
+    if len(positions) == 0:
+        return None
+    points = np.array([[p['X'], p['Y']] for p in positions], np.float32).reshape((-1, 1, 2))
+    new_points, status, err = cv2.calcOpticalFlowPyrLK(prev_gray, gray, points, None, winSize=FLOW_WIN_SIZE, maxLevel=FLOW_MAX_LEVEL)
+    if new_points is None or not status.all() or (err > max_error).any():
+        return None
+    moved = np.sqrt(np.sum((new_points - points) ** 2, axis=2))
+    if (moved > max_jump).any():
+        return None
+    return [{'X': int(round(p[0][0])), 'Y': int(round(p[0][1]))} for p in new_points]
+
+# -----------------------------------
+
+# Associates centroids between frames with the nearest object from the last frame, builds position data for one canvas.
+# Positions are kept as integer pixels, the canvas scale converts them to units when they are loaded. Without history,
+# objects only hold their position in the last frame (i.e., when positions are streamed to disk as they come)
+class CentroidTracker:
+    def __init__(self, width, height, real_width=None, real_height=None, units=None, fps=None, history=True):
+        self.width = width
+        self.height = height
+        self.real_width = real_width if real_width is not None else width
+        self.real_height = real_height if real_height is not None else height
+        self.history = history
+        self.last = []
+        self.pos_data = { 'objects': [], 'canvas': {
+            'width': self.real_width,
+            'height': self.real_height,
+            'units': units if units is not None else "pixels",
+            'fps': fps,
+            'scale': [self.real_width / width, self.real_height / height]
+        }}
+
+    # Returns last known pixel positions of all objects
+    def last_positions(self):
+        return [dict(c) for c in self.last]
+
+    # Writes pixel x and y to object, replacing the last ones without history
+    def push(self, i, x, y):
+        obj = self.pos_data['objects'][i]
+        if not self.history:
+            obj['X'].clear()
+            obj['Y'].clear()
+        obj['X'].append(x)
+        obj['Y'].append(y)
+
+    # Writes pixel position to object
+    def append(self, i, c):
+        self.last[i] = c
+        self.push(i, int(c['X']), int(c['Y']))
+
+    # Marks object as missing in this frame, so all objects stay frame-aligned. Matching uses the last known
+    # position of a missing object
+    def append_missing(self, i):
+        self.push(i, MISSING_PIXEL, MISSING_PIXEL)
+
+    # Updates every object with its own new position, keeping identities (i.e., positions from optical flow)
+    def update_positions(self, positions):
+        for i, c in enumerate(positions):
+            self.append(i, c)
+
+    # Updates objects with centroids from a frame, returns False if a centroid could not be matched to an object
+    def update(self, centroids, frame_num):
+        if frame_num == 1:
+            # Creating structure on first frame
+            self.last = [c for c in centroids]
+            self.pos_data['objects'] = [{'X': [], 'Y': []} for c in centroids]
+            for i, c in enumerate(centroids):
+                self.append(i, c)
+            return True
+        # Grabbing positions of all objects from last frame
+        last_pos = self.last_positions()
+        matches = {}
+        for c in centroids:
+            # Find last frame object closest to current point
+            min_i = -1
+            min_dist = max([self.height, self.width]) + 1
+            for (i, pos) in enumerate(last_pos):
+                if centroid_dist(c, pos) < min_dist:
+                    min_i = i
+                    min_dist = centroid_dist(c, pos)
+            if min_i == -1:
+                return False
+            # Each object takes at most one centroid per frame, the closest one
+            if min_i not in matches or min_dist < matches[min_i][1]:
+                matches[min_i] = (c, min_dist)
+        # Objects without a centroid in this frame are marked missing, so every object has one position per frame
+        for i in range(len(self.last)):
+            if i in matches:
+                self.append(i, matches[i][0])
+            else:
+                self.append_missing(i)
+        return True
@@ -1,11 +1,13 @@
 #! python3
 import sys, os, argparse, logging, json
+from posdata import load_positions, is_pos_data, write_blocks, BINARY_EXT
 
 # Setting up argument parser
 parser = argparse.ArgumentParser(description="Trim position data from file, seeking to specific frame")
 parser.add_argument("path", help="Path to position data file")
 parser.add_argument("-ss", "--seek", type=int, help="Seek to specific frame in position data file")
 parser.add_argument("-to", "--to", type=int, help="Retrieve position data until specific frame")
+parser.add_argument("-b", "--binary", action="store_true", help="Save trimmed position data as binary (.npos), defaults to the format of the given file")
 parser.add_argument("-d", "--debug", action="store_true", help="Show debug information")
 args = vars(parser.parse_args())
 
@@ -17,21 +19,18 @@ if args.get("debug"):
     logging.getLogger().setLevel(logging.DEBUG)
 logging.debug("ARGS: {0}".format(args)) # DEBUG
 
-# Check that file at path exists and ends in .json
+# Check that file at path exists and is a position data file
 if not os.path.exists(args["path"]):
     logging.warning("Given path does not exist! Exiting...")
     sys.exit(1)
-if not os.path.split(args["path"])[-1].endswith(".json"):
-    logging.warning("Given path does not point to a .json file! Exiting...")
+if not is_pos_data(args["path"]):
+    logging.warning("Given path does not point to a .json, .npos or .nrun file! Exiting...")
     sys.exit(1)
 
-# Load position data from file
-objects = []
-canvas = {}
-with open(args['path']) as fp:
-    data = json.load(fp)
-    objects = data['objects']
-    canvas = data['canvas']
+# Open position data from file, binary files are memory-mapped and nothing is read yet
+data = load_positions(args['path'])
+canvas = data['canvas']
+frames = data.lengths[0] if len(data.lengths) > 0 else 0
 
 # Set up seek and to 
 seek = args['seek']
@@ -39,33 +38,27 @@ if not seek:
     seek = 1
 to = args['to']
 if not to:
-    to = len(objects[0]['X'])
+    to = frames
 
 # Check seek and to are correct
 if seek > to:
     logging.warning("Seek should be before to! Exiting...")
     sys.exit(1)
-if seek > len(objects[0]['X']) or to > len(objects[0]['X']):
+if seek > frames or to > frames:
     logging.warning("Seek or to is too far! Exiting...")
     sys.exit(1)
 if seek < 1 or to < 1:
     logging.warning("Seek and to must begin at frame 1! Exiting...")
     sys.exit(1)
 
-# Trim position data
-trimmed_objs = []
-for obj in objects:
-    x = obj['X'][seek-1:to-1]
-    y = obj['Y'][seek-1:to-1]
-    trimmed_objs.append({ 'X': x, 'Y': y })
-objects = trimmed_objs
+# Trim position data, as views of each object's frame range as stored (pixel position data stays in pixels)
+objects = [[data.raw(i, seek - 1, to - 1)] for i in range(len(data.lengths))]
 
-# Reassemble position data file and save to pos_data_XX-XX.json
-pos_data = { 'objects': objects, 'canvas': canvas }
+# Save views to pos_data_XX-XX.json (or .npos/.nrun, as the given file), written one block at a time
+pos_name = "pos_data_{0}-{1}{2}".format(seek, to, BINARY_EXT if args['binary'] else os.path.splitext(args['path'])[1])
 pos_path = list(os.path.split(args['path']))
-pos_path[-1] = "pos_data_{0}-{1}.json".format(seek, to)
+pos_path[-1] = pos_name
 pos_path = os.path.relpath(os.path.join(*pos_path))
-with open(pos_path, "w+") as fp:
-    json.dump(pos_data, fp)
-logging.info("Saved trimmed position data to 'pos_data_{0}-{1}.json'.".format(seek, to))
+write_blocks(pos_path, objects, canvas, data.positions.dtype)
+logging.info("Saved trimmed position data to '{0}'.".format(pos_name))
 logging.info("Exiting...")
\ No newline at end of file